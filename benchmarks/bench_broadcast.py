@@ -0,0 +1,143 @@
+"""Benchmark of broadcasting to every known user.
+
+Registers --recipients contacts in storage (--backend sqlite in a
+temporary database, or memory), a share of whom (--blocked) have blocked
+the bot, and broadcasts a message to them through a fake Bot that answers
+every send after --latency seconds. Half way through, the broadcast is
+stopped and, as after a restart, resumed from the progress in storage
+(with sqlite, by a new storage on the same database file). Reports:
+
+    contacts   time to remember every contact
+    broadcast  messages per second, excluding the restart, and the
+               process's peak memory
+    check      that every user who had not blocked the bot got the message
+               exactly once, that blocked users were pruned, and that a
+               second broadcast leaves them out
+
+There is no rate limit here, so this measures the pipeline; Telegram's
+limit of ~30 messages a second would make a million messages take about
+nine hours.
+
+Usage: python benchmarks/bench_broadcast.py [--recipients 1000000] [--backend sqlite]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.error import Forbidden  # noqa: E402
+
+from broadcast import Broadcaster  # noqa: E402
+from order_store import OrderStore  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+
+class FakeBot:
+    """Counts the messages each chat gets; every ``blocked_every``-th chat has blocked the bot."""
+
+    def __init__(self, recipients: int, blocked_every: int, latency: float):
+        self.received = bytearray(recipients + 1)
+        self.blocked_every = blocked_every
+        self.latency = latency
+        self.calls = 0
+        self.halfway = asyncio.Event()
+        self.stop_after = recipients // 2
+
+    async def send_message(self, chat_id, text, parse_mode=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls += 1
+        if self.calls == self.stop_after:
+            self.halfway.set()
+        if self.blocked_every and chat_id % self.blocked_every == 0:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        self.received[chat_id] = min(255, self.received[chat_id] + 1)
+        return True
+
+
+def peak_memory_mb() -> float:
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run(args, path: str) -> None:
+    storage = create_storage(args.backend, OrderStore(), path)
+    await storage.start()
+    began = time.perf_counter()
+    for user_id in range(1, args.recipients + 1):
+        storage.remember_user(user_id)
+    await storage.flush()
+    contacts_s = time.perf_counter() - began
+    print(f"{args.recipients} contacts ({args.backend}) remembered in {contacts_s:.1f} s, "
+          f"peak memory {peak_memory_mb():.0f} MB")
+
+    bot = FakeBot(args.recipients, round(1 / args.blocked) if args.blocked else 0, args.latency)
+    finished = asyncio.Event()
+
+    async def done(broadcast):
+        finished.set()
+
+    broadcaster = Broadcaster(storage, bot, args.chunk, args.concurrency, done=done)
+    broadcast = await storage.create_broadcast("<b>New promotion</b>: GRAB20")
+    began = time.perf_counter()
+    broadcaster.start(broadcast)
+    await bot.halfway.wait()
+    await broadcaster.stop()
+    first_s = time.perf_counter() - began
+    handled = bot.calls
+
+    # As after a restart: the progress comes back from storage
+    if args.backend == 'sqlite':
+        await storage.close()
+        storage = create_storage(args.backend, OrderStore(), path)
+        await storage.start()
+    broadcaster = Broadcaster(storage, bot, args.chunk, args.concurrency, done=done)
+    unfinished = await storage.unfinished_broadcasts()
+    assert len(unfinished) == 1, unfinished
+    began = time.perf_counter()
+    broadcaster.start(unfinished[0])
+    await finished.wait()
+    second_s = time.perf_counter() - began
+    broadcast = unfinished[0]
+
+    total_s = first_s + second_s
+    print(f"broadcast: {bot.calls / total_s:,.0f} messages/s ({handled} before the restart, "
+          f"{bot.calls - handled} after), peak memory {peak_memory_mb():.0f} MB")
+    print(f"           {broadcast.sent} sent, {broadcast.pruned} pruned, {broadcast.failed} failed")
+
+    blocked = {user_id for user_id in range(1, args.recipients + 1)
+               if bot.blocked_every and user_id % bot.blocked_every == 0}
+    twice = sum(1 for count in bot.received if count > 1)
+    missed = sum(1 for user_id in range(1, args.recipients + 1)
+                 if user_id not in blocked and bot.received[user_id] == 0)
+    print(f"check: {missed} missed, {twice} got it twice, {bot.calls - args.recipients} extra sends")
+    assert missed == 0 and twice == 0 and broadcast.pruned == len(blocked)
+
+    bot.calls = 0
+    finished.clear()
+    broadcaster.start(await storage.create_broadcast("Second"))
+    await finished.wait()
+    print(f"second broadcast: {bot.calls} sends, the {len(blocked)} pruned users left out")
+    assert bot.calls == args.recipients - len(blocked)
+    await storage.close()
+
+
+def main(args) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(args, os.path.join(directory, 'broadcast.db')))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipients', type=int, default=1_000_000)
+    parser.add_argument('--backend', choices=('sqlite', 'memory'), default='sqlite')
+    parser.add_argument('--blocked', type=float, default=0.05, help="share of users who blocked the bot")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per fake send")
+    parser.add_argument('--chunk', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    main(parser.parse_args())
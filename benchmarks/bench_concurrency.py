@@ -0,0 +1,159 @@
+"""Stress test of concurrent update processing.
+
+Every simulated user taps several wallet top-ups and books rides (a
+four-step conversation) while other users do the same. Bot API calls take
+--latency seconds, like a real network round trip. The same stream runs in
+three modes:
+
+    serial     one update at a time (CONCURRENT_UPDATES=1)
+    unordered  python-telegram-bot's plain concurrency, no per-user ordering
+    per-user   KeyedUpdateProcessor: concurrent across users, ordered per user
+
+For each mode it reports updates per second, top-ups lost (final balance
+below RM 50 + the sum of the user's top-ups) and ride bookings that did not
+complete because the conversation saw its messages out of order. Storage is
+SQLite, so a user's first read and every durable top-up write yield to the
+event loop.
+
+It then checks that a busy user does not hold up the others: with a cap of
+4, one user queues 8 slow updates and another user's quick update must
+finish in about its own time, not behind the busy user's queue.
+
+Usage: python benchmarks/bench_concurrency.py [--users 100] [--rounds 2]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '123:fake')
+os.environ.setdefault('METRICS_PORT', '0')
+os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from telegram import Update  # noqa: E402
+from telegram.ext import Application  # noqa: E402
+
+import bot  # noqa: E402
+from load_test import FakeBotAPI, UpdateFactory  # noqa: E402
+from processor import KeyedUpdateProcessor  # noqa: E402
+from wallet import OPENING_BALANCE, to_minor  # noqa: E402
+
+TOPUPS = (20, 50, 100)
+
+
+def user_updates(factory: UpdateFactory, user_id: int, rounds: int):
+    """Return one user's updates: each round tops up and books a ride."""
+    updates = []
+    screen = 0
+    for _ in range(rounds):
+        for amount in TOPUPS:
+            screen += 1
+            updates.append(factory.callback(user_id, 'topup'))
+            updates.append(factory.callback(user_id, f"topup_{amount}_{screen}"))
+        updates.append(factory.callback(user_id, 'book_ride'))
+        updates.append(factory.message(user_id, 'KLCC'))
+        updates.append(factory.message(user_id, 'KL Sentral'))
+        updates.append(factory.callback(user_id, f"ride_{user_id % len(bot.estimator.vehicles)}"))
+    return updates
+
+
+def interleave(per_user):
+    """Round-robin across users, keeping each user's own order."""
+    stream = []
+    for step in range(max(map(len, per_user))):
+        stream.extend(updates[step] for updates in per_user if step < len(updates))
+    return stream
+
+
+async def run_mode(mode: str, factory: UpdateFactory, users: range, rounds: int, latency: float,
+                   concurrency: int) -> dict:
+    stream = interleave([user_updates(factory, user_id, rounds) for user_id in users])
+
+    builder = Application.builder().token(bot.BOT_TOKEN).request(FakeBotAPI(latency)).updater(None)
+    if mode == 'unordered':
+        builder.concurrent_updates(concurrency)
+    elif mode == 'per-user':
+        builder.concurrent_updates(KeyedUpdateProcessor(concurrency))
+    application = bot.build_application(builder)
+
+    async with application:
+        await application.start()
+        start = time.perf_counter()
+        for data in stream:
+            application.update_queue.put_nowait(Update.de_json(data, application.bot))
+        await application.update_queue.join()
+        elapsed = time.perf_counter() - start
+        await application.stop()
+
+        expected_balance = OPENING_BALANCE + to_minor(rounds * sum(TOPUPS))
+        lost = 0
+        broken_rides = 0
+        for user_id in users:
+            balance = await bot.storage.get_balance(user_id)
+            lost += round((expected_balance - balance) / to_minor(min(TOPUPS))) if balance < expected_balance else 0
+            rides = [order for order in bot.orders.for_user(user_id) if order.type == 'Ride']
+            broken_rides += rounds - len(rides)
+            # The lifecycle is not running: free the drivers for the next mode
+            for order in rides:
+                bot.fleet.release(order.id)
+
+    return {
+        'mode': mode,
+        'updates': len(stream),
+        'updates_per_sec': len(stream) / elapsed,
+        'topups': len(users) * rounds * len(TOPUPS),
+        'lost_topups': lost,
+        'broken_rides': broken_rides,
+    }
+
+
+async def head_of_line(cap: int = 4, queued: int = 8, slow: float = 0.2, quick: float = 0.01) -> float:
+    """Seconds until a quick update of one user finishes while another user
+    has ``queued`` slow updates waiting, with ``cap`` updates running at once."""
+    processor = KeyedUpdateProcessor(cap)
+    await processor.initialize()
+    busy = SimpleNamespace(effective_user=SimpleNamespace(id=1))
+    other = SimpleNamespace(effective_user=SimpleNamespace(id=2))
+    backlog = [asyncio.create_task(processor.process_update(busy, asyncio.sleep(slow))) for _ in range(queued)]
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await processor.process_update(other, asyncio.sleep(quick))
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*backlog)
+    return elapsed
+
+
+async def main(args) -> None:
+    logging.getLogger().setLevel(logging.ERROR)
+    print(f"{args.users} users x {args.rounds} rounds, {args.latency * 1000:.0f} ms per API call, "
+          f"cap {args.concurrency}")
+    print(f"{'mode':>10} {'updates':>8} {'updates/s':>10} {'top-ups':>8} {'lost':>6} {'broken rides':>13}")
+    await bot.storage.start()
+    # Shared so callback query ids, the top-ups' idempotency keys, stay unique
+    factory = UpdateFactory()
+    for i, mode in enumerate(('serial', 'unordered', 'per-user')):
+        # Each mode gets its own users so earlier runs don't affect balances
+        users = range(1_000_000 * (i + 1), 1_000_000 * (i + 1) + args.users)
+        result = await run_mode(mode, factory, users, args.rounds, args.latency, args.concurrency)
+        print(f"{result['mode']:>10} {result['updates']:>8} {result['updates_per_sec']:>10.1f} "
+              f"{result['topups']:>8} {result['lost_topups']:>6} {result['broken_rides']:>13}")
+    await bot.storage.close()
+
+    elapsed = await head_of_line()
+    print(f"busy user: another user's 10 ms update took {elapsed * 1000:.0f} ms behind 8 x 200 ms updates, cap 4")
+    assert elapsed < 0.1, "a busy user delays other users"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds per Bot API call")
+    parser.add_argument('--concurrency', type=int, default=64, help="updates running at once")
+    asyncio.run(main(parser.parse_args()))
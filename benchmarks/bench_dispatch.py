@@ -0,0 +1,131 @@
+"""Benchmark of driver dispatch: grid index vs a linear scan of the fleet.
+
+Generates a simulated fleet of --drivers drivers around Kuala Lumpur and
+measures:
+
+    build     adding every driver to the index
+    move      position updates per second (small random steps)
+    nearest   nearest-available-driver query latency, with no drivers busy
+              and with --busy of them on a ride
+    scan      the same queries answered by scanning every driver
+
+Every grid answer is checked against the scan. Finally --bookings bookings
+at the same pickup run as concurrent tasks and the benchmark checks that
+no driver was given to two of them.
+
+Usage: python benchmarks/bench_dispatch.py [--drivers 50000] [--queries 20000] [--busy 0.5]
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dispatch import KM_PER_DEG_LAT, KM_PER_DEG_LON, KUALA_LUMPUR, Fleet, generate_fleet  # noqa: E402
+
+
+def percentiles_us(samples) -> str:
+    samples = sorted(samples)
+    last = len(samples) - 1
+    return (f"p50 {samples[int(last * 0.5)] * 1e6:7.1f} us  p99 {samples[int(last * 0.99)] * 1e6:7.1f} us  "
+            f"max {samples[-1] * 1e6:8.1f} us")
+
+
+def scan(fleet: Fleet, lat: float, lon: float):
+    """Nearest available driver by checking every driver."""
+    x, y = fleet._project(lat, lon)
+    best, best_d2 = None, fleet.max_km ** 2
+    for driver in fleet:
+        if driver.available:
+            d2 = (driver.x - x) ** 2 + (driver.y - y) ** 2
+            if d2 <= best_d2:
+                best, best_d2 = driver, d2
+    return None if best is None else (best, math.sqrt(best_d2))
+
+
+def time_queries(fleet: Fleet, pickups, scans: int):
+    grid = []
+    for lat, lon in pickups:
+        began = time.perf_counter()
+        fleet.nearest(lat, lon)
+        grid.append(time.perf_counter() - began)
+    linear = []
+    for lat, lon in pickups[:scans]:
+        began = time.perf_counter()
+        expected = scan(fleet, lat, lon)
+        linear.append(time.perf_counter() - began)
+        found = fleet.nearest(lat, lon)
+        assert (found is None) == (expected is None), (lat, lon)
+        assert found is None or abs(found[1] - expected[1]) < 1e-9, (lat, lon, found, expected)
+    return grid, linear
+
+
+async def concurrent_bookings(fleet: Fleet, count: int) -> int:
+    """Book ``count`` rides at the same pickup at once. Returns (distinct drivers, bookings that got one)."""
+    async def book(i):
+        # Yield first so every booking is in flight before any is assigned
+        await asyncio.sleep(0)
+        found = fleet.assign(f"C{i}", *KUALA_LUMPUR)
+        return found[0].id if found else None
+
+    drivers = await asyncio.gather(*(book(i) for i in range(count)))
+    assigned = [driver for driver in drivers if driver is not None]
+    for i in range(count):
+        fleet.release(f"C{i}")
+    return len(set(assigned)), len(assigned)
+
+
+def main(args) -> None:
+    rng = random.Random(args.seed)
+    drivers = generate_fleet(args.drivers, radius_km=args.radius, seed=args.seed)
+    fleet = Fleet(cell_km=args.cell_km)
+    began = time.perf_counter()
+    for driver in drivers:
+        fleet.add(driver)
+    build_s = time.perf_counter() - began
+
+    moves = [
+        (rng.choice(drivers).id, rng.uniform(-0.1, 0.1) / KM_PER_DEG_LAT, rng.uniform(-0.1, 0.1) / KM_PER_DEG_LON)
+        for _ in range(args.moves)
+    ]
+    began = time.perf_counter()
+    for driver_id, dlat, dlon in moves:
+        driver = fleet.get(driver_id)
+        fleet.move(driver_id, driver.lat + dlat, driver.lon + dlon)
+    move_s = time.perf_counter() - began
+
+    pickups = [(driver.lat, driver.lon) for driver in generate_fleet(args.queries, radius_km=args.radius,
+                                                                       seed=args.seed + 1)]
+    idle_grid, idle_scan = time_queries(fleet, pickups, args.scans)
+    for i, driver in enumerate(rng.sample(drivers, int(len(drivers) * args.busy))):
+        fleet.assign(f"B{i}", driver.lat, driver.lon)
+    busy_grid, busy_scan = time_queries(fleet, pickups, args.scans)
+    distinct, assigned = asyncio.run(concurrent_bookings(fleet, args.bookings))
+
+    print(f"{args.drivers} drivers within {args.radius:.0f} km, {args.cell_km} km cells")
+    print(f"build    {build_s * 1000:8.1f} ms")
+    print(f"move     {args.moves / move_s:8.0f} updates/s")
+    print(f"nearest  idle  {percentiles_us(idle_grid)}")
+    print(f"         {args.busy:.0%} busy {percentiles_us(busy_grid)}")
+    print(f"scan     idle  {percentiles_us(idle_scan)}")
+    print(f"         {args.busy:.0%} busy {percentiles_us(busy_scan)}")
+    print(f"bookings {assigned} concurrent bookings got {distinct} distinct drivers")
+    assert distinct == assigned
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=50_000)
+    parser.add_argument('--radius', type=float, default=25.0, help="km around the city centre")
+    parser.add_argument('--cell-km', type=float, default=0.25)
+    parser.add_argument('--moves', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=20_000)
+    parser.add_argument('--scans', type=int, default=200, help="queries also answered by a linear scan")
+    parser.add_argument('--busy', type=float, default=0.5, help="fraction of drivers on a ride")
+    parser.add_argument('--bookings', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,160 @@
+"""Benchmark of intent matching for free-text messages.
+
+Generates --messages messages from templates for every intent ("book a
+ride to {place}", "where is my order", "top up {amount}", ...), a share of
+them with a typo in a keyword (--typos), plus small talk that should match
+nothing, and measures:
+
+    classify   per-message latency of IntentMatcher, first uncached and
+               then from the cache, and how many messages get the intent
+               they were generated for
+    scan       the same phrase matching done by testing every phrase
+               against the message
+
+Every phrase set the automaton finds is checked against the scan. The
+matcher is then rebuilt with --phrases extra filler phrases (weight 0, so
+the answers do not change) to show that the automaton's cost does not grow
+with the number of phrases while the scan's does.
+
+Usage: python benchmarks/bench_intents.py [--messages 50000] [--phrases 5000]
+"""
+import argparse
+import gc
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intents import KEYWORDS, IntentMatcher  # noqa: E402
+from places import load_gazetteer, normalize  # noqa: E402
+
+TEMPLATES = {
+    'ride': ("book a ride to {place}", "I need a taxi from {place} to {other}", "take me to {place}",
+             "can I get a grabcar to {place} please", "pick me up at {place}", "ride to {place}"),
+    'food': ("I'm hungry", "order food", "I want pizza", "any sushi for lunch?", "get me some nasi lemak",
+             "what's for dinner"),
+    'track': ("where is my food", "where's my order?", "track my ride", "order status please",
+              "how long until my driver arrives"),
+    'topup': ("top up {amount}", "topup RM{amount}", "reload {amount} please", "I want to top up"),
+    'wallet': ("what's my balance", "show my wallet", "grabpay transactions", "check balance"),
+    'support': ("help", "I was charged twice for my ride", "my driver was rude", "I need a refund",
+                "I lost my phone in the car, please contact the driver"),
+    None: ("good morning", "thank you so much", "ok", "see you later", "what time is it", "lol"),
+}
+
+
+def percentiles_us(samples) -> str:
+    samples = sorted(samples)
+    last = len(samples) - 1
+    return (f"p50 {samples[int(last * 0.5)] * 1e6:7.1f} us  p99 {samples[int(last * 0.99)] * 1e6:7.1f} us  "
+            f"max {samples[-1] * 1e6:8.1f} us")
+
+
+def typo(rng: random.Random, word: str) -> str:
+    """``word`` with one letter deleted, changed or swapped."""
+    i = rng.randrange(len(word) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def generate_messages(count: int, place_names, typos: float, seed: int) -> list:
+    """Return ``count`` ``(message, expected intent)`` pairs."""
+    rng = random.Random(seed)
+    keywords = {word for weighted in KEYWORDS.values() for phrase in weighted for word in phrase.split()
+                if len(word) >= 5}
+    intents = list(TEMPLATES)
+    messages = []
+    for _ in range(count):
+        intent = rng.choice(intents)
+        text = rng.choice(TEMPLATES[intent]).format(
+            place=rng.choice(place_names), other=rng.choice(place_names), amount=rng.choice((20, 50, 100, 30))
+        )
+        if intent is not None and rng.random() < typos:
+            words = text.split(' ')
+            candidates = [i for i, word in enumerate(words) if word.lower() in keywords]
+            if candidates:
+                i = rng.choice(candidates)
+                words[i] = typo(rng, words[i])
+                text = ' '.join(words)
+        messages.append((text, intent))
+    return messages
+
+
+def scan_find(matcher: IntentMatcher, text: str) -> set:
+    """Indexes of the phrases in ``text`` by testing every phrase."""
+    key = ' ' + normalize(text) + ' '
+    return {index for index, phrase in enumerate(matcher._phrases) if ' ' + phrase + ' ' in key}
+
+
+def timed(fn, inputs):
+    samples = []
+    results = []
+    for value in inputs:
+        began = time.perf_counter()
+        results.append(fn(value))
+        samples.append(time.perf_counter() - began)
+    return samples, results
+
+
+def filler_keywords(count: int, seed: int) -> dict:
+    """KEYWORDS plus ``count`` made-up two-word phrases of weight 0."""
+    rng = random.Random(seed)
+    keywords = dict(KEYWORDS)
+    keywords['filler'] = {
+        ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8))) for _ in range(2)): 0
+        for _ in range(count)
+    }
+    return keywords
+
+
+def main(args) -> None:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    gazetteer = load_gazetteer(os.path.join(root, 'data', 'places.csv'))
+    place_names = [gazetteer.get(i).name for i in range(len(gazetteer))]
+    messages = generate_messages(args.messages, place_names, args.typos, args.seed)
+    texts = [text for text, _ in messages]
+
+    print(f"{args.messages} messages, {args.typos:.0%} of requests with a typo")
+    print(f"{'phrases':>8} {'states':>7}  timing")
+    for keywords in (KEYWORDS, filler_keywords(args.phrases, args.seed)):
+        began = time.perf_counter()
+        matcher = IntentMatcher(keywords, cache_size=args.messages)
+        build_s = time.perf_counter() - began
+        # As bot.py does with long-lived indexes, so collections do not walk the automaton
+        gc.collect()
+        gc.freeze()
+
+        cold, found = timed(matcher._classify, texts)
+        timed(matcher.classify, texts)
+        warm, _ = timed(matcher.classify, texts)
+        find, _ = timed(matcher._find, [normalize(text) for text in texts])
+        scan, _ = timed(lambda text: scan_find(matcher, text), texts[:args.scans])
+        for text in texts[:args.scans]:
+            assert matcher._find(normalize(text)) == scan_find(matcher, text), text
+
+        correct = sum((intent.name if intent else None) == expected
+                      for intent, (_, expected) in zip(found, messages))
+        phrases = len(matcher._phrases)
+        print(f"{phrases:>8} {len(matcher._goto):>7}  build {build_s * 1000:.1f} ms, "
+              f"{correct / len(messages):.1%} classified as generated")
+        print(f"{'':>17}classify cold  {percentiles_us(cold)}")
+        print(f"{'':>17}         warm  {percentiles_us(warm)}")
+        print(f"{'':>17}automaton      {percentiles_us(find)}")
+        print(f"{'':>17}scan           {percentiles_us(scan)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=50_000)
+    parser.add_argument('--typos', type=float, default=0.2, help="share of requests with a typo in a keyword")
+    parser.add_argument('--phrases', type=int, default=5000, help="filler phrases for the second run")
+    parser.add_argument('--scans', type=int, default=2000, help="messages also matched by a scan")
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,130 @@
+"""Benchmark of the order lifecycle scheduler.
+
+Places --orders active orders (half food, half rides, one user each)
+spread over --spread seconds of simulated time, then advances the clock in
+1 s ticks until every order is delivered. Reports the cost of scheduling,
+per-tick latency (how long one tick blocks the event loop), status changes
+per tick and the scheduler's memory.
+
+For comparison it also schedules the same steps as one event-loop timer per
+step (``loop.call_at``), the "one job per order" approach, and reports its
+scheduling time and memory.
+
+Usage: python benchmarks/bench_lifecycle.py [--orders 200000] [--spread 600]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lifecycle import STAGES, OrderLifecycle  # noqa: E402
+from order_store import Order, OrderStore  # noqa: E402
+
+
+def make_orders(count: int, spread: float, start: float, seed: int = 1):
+    rng = random.Random(seed)
+    orders = []
+    for i in range(count):
+        created_at = start + rng.random() * spread
+        if i % 2:
+            orders.append(Order(f"R{i}", i, 'Ride', status='On the way', created_at=created_at, destination='KLCC'))
+        else:
+            orders.append(Order(f"F{i}", i, 'Food', created_at=created_at, restaurant='Pizza Express'))
+    return orders
+
+
+def bench_heap(orders, start: float) -> dict:
+    store = OrderStore()
+    for order in orders:
+        store.add(order)
+
+    tracemalloc.start()
+    lifecycle = OrderLifecycle(store)
+    for order in orders:
+        lifecycle.schedule(order)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    began = time.perf_counter()
+    lifecycle = OrderLifecycle(store)
+    for order in orders:
+        lifecycle.schedule(order)
+    schedule_s = time.perf_counter() - began
+    steps = lifecycle.pending
+
+    tick_times = []
+    per_tick = []
+    now = start
+    while lifecycle.pending:
+        now += 1
+        began = time.perf_counter()
+        changed = lifecycle.advance(now)
+        tick_times.append(time.perf_counter() - began)
+        per_tick.append(len(changed))
+    tick_times.sort()
+    return {
+        'steps': steps,
+        'schedule_s': schedule_s,
+        'memory_mb': memory / 1e6,
+        'ticks': len(tick_times),
+        'tick_p50_ms': tick_times[len(tick_times) // 2] * 1000,
+        'tick_p99_ms': tick_times[int(len(tick_times) * 0.99)] * 1000,
+        'tick_max_ms': tick_times[-1] * 1000,
+        'changes_max': max(per_tick),
+        'changed': lifecycle.changed,
+    }
+
+
+async def bench_timers(orders) -> dict:
+    loop = asyncio.get_running_loop()
+    base = loop.time() + 10 ** 6
+
+    def schedule():
+        handles = []
+        for order in orders:
+            for code, after in STAGES[order.type]:
+                if code > order.status_code:
+                    handles.append(loop.call_at(base + order.created_at + after, order.__repr__))
+        return handles
+
+    tracemalloc.start()
+    handles = schedule()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    for handle in handles:
+        handle.cancel()
+
+    began = time.perf_counter()
+    handles = schedule()
+    schedule_s = time.perf_counter() - began
+    for handle in handles:
+        handle.cancel()
+    return {'steps': len(handles), 'schedule_s': schedule_s, 'memory_mb': memory / 1e6}
+
+
+def main(args) -> None:
+    start = 1_700_000_000.0
+    orders = make_orders(args.orders, args.spread, start)
+    heap = bench_heap(orders, start)
+    print(f"{args.orders} orders over {args.spread:.0f} s, {heap['steps']} status changes")
+    print(f"heap:   schedule {heap['schedule_s'] * 1000:.0f} ms, {heap['memory_mb']:.1f} MB")
+    print(f"        {heap['ticks']} ticks: p50 {heap['tick_p50_ms']:.3f} ms, p99 {heap['tick_p99_ms']:.3f} ms, "
+          f"max {heap['tick_max_ms']:.3f} ms; up to {heap['changes_max']} changes per tick, "
+          f"{heap['changed']} applied")
+
+    orders = make_orders(args.orders, args.spread, 0.0)
+    timers = asyncio.run(bench_timers(orders))
+    print(f"timers: schedule {timers['schedule_s'] * 1000:.0f} ms, {timers['memory_mb']:.1f} MB "
+          f"({timers['steps']} loop.call_at handles)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=200_000)
+    parser.add_argument('--spread', type=float, default=600, help="seconds over which orders are placed")
+    main(parser.parse_args())
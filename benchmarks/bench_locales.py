@@ -0,0 +1,159 @@
+"""Benchmark of localized rendering against the English f-strings it replaces.
+
+Loads the message catalogs in data/locales, as bot.py does at startup, and
+renders the screens sent most often in every language. Reports:
+
+    load      time to read, check and compile every catalog
+    lookup    per-update cost of finding a user's language from their code
+    render    time per screen for the inline English f-string the bot used
+              to build it, for ``str.format`` on the template text (how
+              templates were filled before they were compiled) and for the
+              compiled template of each language
+
+Every template of every language is also filled in with both the compiled
+function and ``str.format`` and checked to give the same text.
+
+Usage: python benchmarks/bench_locales.py [--iterations 200000]
+"""
+import argparse
+import gc
+import os
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import render  # noqa: E402
+from locales import load_locales  # noqa: E402
+
+LOCALES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'locales')
+
+
+def legacy_welcome(first_name="Aisyah"):
+    return dict(
+        text=(
+            f"👋 <b>Welcome to Grab, {first_name}!</b>\n\n"
+            f"Your everyday everything app.\n\n"
+            f"🚗 <b>Ride</b> - Book a car or bike\n"
+            f"🍔 <b>Food</b> - Order from restaurants\n"
+            f"📦 <b>Deliveries</b> - Send packages\n"
+            f"💳 <b>Payments</b> - GrabPay wallet\n\n"
+            f"What would you like to do today?"
+        ),
+        reply_markup=render.MAIN_MENU,
+        parse_mode='HTML'
+    )
+
+
+def legacy_wallet(balance="RM 72.50", recent="• Top-up +RM 100.00"):
+    return dict(
+        text=(
+            f"💳 <b>GrabPay Wallet</b>\n\n"
+            f"Balance: <b>{balance}</b>\n\n"
+            f"Recent transactions:\n"
+            f"{recent}\n\n"
+            f"💡 Tip: Top up your wallet for faster checkout!"
+        ),
+        reply_markup=render.WALLET_KEYBOARD,
+        parse_mode='HTML'
+    )
+
+
+def legacy_order_placed(order_id="9F2C1A7B", restaurant="Pizza Express", item="Margherita Pizza",
+                        price="RM 25", delivery="RM 4.00", promos="", total="RM 29.00", eta="25 min"):
+    return dict(
+        text=(
+            f"✅ <b>Order Placed!</b>\n\n"
+            f"Order ID: <b>{order_id}</b>\n"
+            f"Restaurant: {restaurant}\n"
+            f"Item: {item} ({price})\n"
+            f"Delivery: {delivery}\n"
+            f"{promos}"
+            f"Total: <b>{total}</b>\n"
+            f"Status: 👨‍🍳 Preparing\n"
+            f"Estimated delivery: {eta}\n\n"
+            f"You can track your order anytime!"
+        ),
+        reply_markup=render.ORDER_PLACED_KEYBOARD,
+        parse_mode='HTML'
+    )
+
+
+FIELDS = {
+    'WELCOME': dict(first_name="Aisyah"),
+    'WALLET': dict(balance="RM 72.50", recent="• Top-up +RM 100.00"),
+    'ORDER_PLACED': dict(order_id="9F2C1A7B", restaurant="Pizza Express", item="Margherita Pizza", price="RM 25",
+                         delivery="RM 4.00", promos="", total="RM 29.00", eta="25 min"),
+}
+LEGACY = {'WELCOME': legacy_welcome, 'WALLET': legacy_wallet, 'ORDER_PLACED': legacy_order_placed}
+
+
+def time_per_call_us(func, iterations: int) -> float:
+    began = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - began) / iterations * 1e6
+
+
+def str_format(template):
+    """A template filled in the way it was before templates were compiled."""
+    def render_(**fields):
+        return {'text': template.text.format(**fields), 'reply_markup': template.reply_markup,
+                'parse_mode': template.parse_mode}
+    return render_
+
+
+def sample_fields(text: str) -> dict:
+    """A value for every field of ``text``: numbers where a format spec needs one."""
+    return {name: 1.25 if spec else f"<{name}>"
+            for _, name, spec, _ in string.Formatter().parse(text) if name is not None}
+
+
+def check(locales) -> int:
+    """Fill every template of every language both ways; returns how many were compared."""
+    compared = 0
+    for lang in locales:
+        for message in render.MESSAGES:
+            value = getattr(lang, message)
+            values = value.values() if isinstance(value, dict) else (value,)
+            for template in values:
+                if isinstance(template, render.Template):
+                    fields = sample_fields(template.text)
+                    assert template.render(**fields)['text'] == template.text.format(**fields), (lang, message)
+                    compared += 1
+    return compared
+
+
+def main(args) -> None:
+    began = time.perf_counter()
+    locales = load_locales(LOCALES_PATH)
+    load_ms = (time.perf_counter() - began) * 1e3
+    print(f"load    {len(locales)} languages ({', '.join(code for code, _ in locales.languages)}) "
+          f"read, checked and compiled in {load_ms:.1f} ms")
+    print(f"check   {check(locales)} templates give the same text compiled and with str.format")
+    gc.collect()
+    gc.freeze()
+
+    codes = ('ms', 'th-TH', 'id', 'en-US', 'fr')
+    print(f"lookup  {time_per_call_us(lambda: [locales.get(code) for code in codes], args.iterations) / len(codes):.3f}"
+          f" us per user")
+
+    english = locales.default
+    print(f"{'render':<14} {'f-string':>9} {'str.format':>11}" + ''.join(f" {lang.code:>7}" for lang in locales)
+          + "   (us per screen)")
+    for message, fields in FIELDS.items():
+        legacy = LEGACY[message]
+        formatted = str_format(getattr(english, message))
+        row = f"{message:<14} {time_per_call_us(lambda: legacy(**fields), args.iterations):>9.2f}"
+        row += f" {time_per_call_us(lambda: formatted(**fields), args.iterations):>11.2f}"
+        for lang in locales:
+            template = getattr(lang, message)
+            row += f" {time_per_call_us(lambda: template.render(**fields), args.iterations):>7.2f}"
+        print(row)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200_000)
+    main(parser.parse_args())
@@ -0,0 +1,71 @@
+"""Benchmark Track Order lookups: OrderStore vs. the old full scan of `orders`.
+
+Usage: python benchmarks/bench_order_store.py [SIZE ...]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_store import Order, OrderStore  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 1_000_000, 5_000_000]
+LOOKUPS = 100_000
+SCAN_LOOKUPS = 5
+
+
+def build_store(size, users):
+    store = OrderStore()
+    for i in range(size):
+        store.add(Order(id=f"{i:08X}", user_id=i % users, type='Food',
+                        restaurant='Pizza Express', eta='25-30 min'))
+    return store
+
+
+def build_dicts(size, users):
+    now = time.time()
+    return {
+        f"{i:08X}": {'id': f"{i:08X}", 'user_id': i % users, 'type': 'Food',
+                     'restaurant': 'Pizza Express', 'status': 'Preparing',
+                     'eta': '25-30 min', 'created_at': now}
+        for i in range(size)
+    }
+
+
+def measure(builder, size, users):
+    tracemalloc.start()
+    data = builder(size, users)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, used
+
+
+def main(sizes):
+    print(f"{'orders':>10} {'store us/lookup':>16} {'store MB':>9} {'scan us/lookup':>15} {'dict MB':>8}")
+    for size in sizes:
+        users = max(1, size // 4)
+        user_ids = [random.randrange(users) for _ in range(LOOKUPS)]
+
+        store, store_mem = measure(build_store, size, users)
+        start = time.perf_counter()
+        for user_id in user_ids:
+            store.latest_for_user(user_id)
+        store_us = (time.perf_counter() - start) / LOOKUPS * 1e6
+        del store
+
+        orders, dict_mem = measure(build_dicts, size, users)
+        start = time.perf_counter()
+        for user_id in user_ids[:SCAN_LOOKUPS]:
+            user_orders = [o for o in orders.values() if o.get('user_id') == user_id]
+            user_orders[-1] if user_orders else None
+        scan_us = (time.perf_counter() - start) / SCAN_LOOKUPS * 1e6
+        del orders
+
+        print(f"{size:>10} {store_us:>16.3f} {store_mem / 2**20:>9.1f} {scan_us:>15.1f} {dict_mem / 2**20:>8.1f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,121 @@
+"""Benchmark of conversation-state persistence: SQLitePersistence vs PicklePersistence.
+
+Stores --users users, each with a small user_data dict and a ride
+conversation state, then for each backend measures:
+
+    write   one persistence interval in which --active users changed:
+            handing over their data and flushing it to disk
+    start   time from opening the store to having one user's data, i.e.
+            the work before the first reply after a restart
+    size    bytes on disk
+
+python-telegram-bot's PicklePersistence (with on_flush=True, its cheapest
+mode) rewrites the whole file on every flush and reads all of it on
+startup; SQLitePersistence writes only the changed rows and reads a user's
+rows on first contact.
+
+Usage: python benchmarks/bench_persistence.py [--users 100000] [--active 500]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.ext import PersistenceInput, PicklePersistence  # noqa: E402
+
+from persistence import SQLitePersistence  # noqa: E402
+
+STORE = PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False)
+
+
+def user_data(user_id: int, step: int = 0) -> dict:
+    return {'ride_type': 'car', 'pickup': f"Block {user_id % 500}, Jalan Ampang", 'topup_screens': step}
+
+
+class _Context:
+    """Just enough of a CallbackContext for SQLitePersistence.load_user."""
+
+    def __init__(self):
+        self.user_data = {}
+
+
+class _Update:
+    def __init__(self, user_id: int):
+        self.effective_user = type('User', (), {'id': user_id})()
+
+
+def file_size(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+async def bench_pickle(path: str, users: int, active: int) -> dict:
+    persistence = PicklePersistence(path, store_data=STORE, on_flush=True)
+    for user_id in range(users):
+        await persistence.update_user_data(user_id, user_data(user_id))
+        await persistence.update_conversation('ride', (user_id, user_id), 1)
+    await persistence.flush()
+
+    began = time.perf_counter()
+    for user_id in range(active):
+        await persistence.update_user_data(user_id, user_data(user_id, 1))
+        await persistence.update_conversation('ride', (user_id, user_id), None)
+    await persistence.flush()
+    write_s = time.perf_counter() - began
+
+    began = time.perf_counter()
+    restarted = PicklePersistence(path, store_data=STORE, on_flush=True)
+    data = (await restarted.get_user_data())[users - 1]
+    await restarted.get_conversations('ride')
+    start_s = time.perf_counter() - began
+    assert data['topup_screens'] == 0
+    return {'write_s': write_s, 'start_s': start_s, 'size': file_size(path)}
+
+
+async def bench_sqlite(path: str, users: int, active: int) -> dict:
+    persistence = SQLitePersistence(path)
+    for user_id in range(users):
+        await persistence.update_user_data(user_id, user_data(user_id))
+        await persistence.update_conversation('ride', (user_id, user_id), 1)
+    await persistence.flush()
+
+    began = time.perf_counter()
+    for user_id in range(active):
+        await persistence.update_user_data(user_id, user_data(user_id, 1))
+        await persistence.update_conversation('ride', (user_id, user_id), None)
+    await persistence.flush()
+    write_s = time.perf_counter() - began
+    await persistence.close()
+
+    began = time.perf_counter()
+    restarted = SQLitePersistence(path)
+    await restarted.get_user_data()
+    context = _Context()
+    await restarted.load_user(_Update(users - 1), context)
+    start_s = time.perf_counter() - began
+    assert context.user_data['topup_screens'] == 0
+    await restarted.close()
+    return {'write_s': write_s, 'start_s': start_s, 'size': file_size(path)}
+
+
+async def main(args) -> None:
+    directory = tempfile.mkdtemp()
+    results = [
+        ('pickle', await bench_pickle(os.path.join(directory, 'state.pickle'), args.users, args.active)),
+        ('sqlite', await bench_sqlite(os.path.join(directory, 'state.db'), args.users, args.active)),
+    ]
+    print(f"{args.users} users stored, {args.active} changed per interval")
+    print(f"{'backend':>8} {'write ms':>9} {'start ms':>9} {'size KiB':>9}")
+    for name, result in results:
+        print(f"{name:>8} {result['write_s'] * 1000:>9.1f} {result['start_s'] * 1000:>9.1f} "
+              f"{result['size'] / 1024:>9.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--active', type=int, default=500, help="users whose data changes per interval")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,128 @@
+"""Benchmark of address autocomplete on a large generated gazetteer.
+
+Writes a gazetteer of --places synthetic Malaysian addresses ("Jalan
+Sarikan 12, Cheras", ...), so a few prefixes like "jalan" are shared by a
+large share of the names, loads it with ``load_gazetteer`` and measures:
+
+    load       reading the CSV and building the index, and its memory
+    suggest    top suggestions for prefixes of 1 to 12 characters of real
+               names, first uncached and then from the cache
+    resolve    resolving full names, uncached and cached
+    scan       the same suggestions found by scanning every name
+
+Every indexed answer in the scan sample is checked against the scan.
+
+Usage: python benchmarks/bench_places.py [--places 1000000] [--queries 20000]
+"""
+import argparse
+import gc
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dispatch import KM_PER_DEG_LAT, KM_PER_DEG_LON, KUALA_LUMPUR  # noqa: E402
+from places import load_gazetteer, normalize  # noqa: E402
+
+KINDS = ('Jalan', 'Jalan', 'Jalan', 'Lorong', 'Taman', 'Persiaran', 'Kampung', 'Bukit', 'Pangsapuri', 'Menara',
+         'Plaza', 'Sekolah Kebangsaan', 'Masjid', 'Klinik', 'Restoran')
+AREAS = ('Cheras', 'Ampang', 'Kepong', 'Setapak', 'Petaling Jaya', 'Subang Jaya', 'Shah Alam', 'Klang',
+         'Puchong', 'Kajang', 'Bangsar', 'Sentul', 'Damansara', 'Gombak', 'Seri Kembangan', 'Cyberjaya')
+SYLLABLES = ('ma', 'ka', 'sa', 'ri', 'an', 'ba', 'tu', 'la', 'ya', 'de', 'si', 'ra', 'ng', 'pe', 'ko', 'ju',
+             'wa', 'in', 'ta', 'me', 'li', 'ha', 'ru', 'bu')
+
+
+def percentiles_us(samples) -> str:
+    samples = sorted(samples)
+    last = len(samples) - 1
+    return (f"p50 {samples[int(last * 0.5)] * 1e6:7.1f} us  p99 {samples[int(last * 0.99)] * 1e6:7.1f} us  "
+            f"max {samples[-1] * 1e6:8.1f} us")
+
+
+def write_gazetteer(path: str, count: int, seed: int) -> list:
+    """Write ``count`` synthetic places to ``path`` and return their names."""
+    rng = random.Random(seed)
+    lat0, lon0 = KUALA_LUMPUR
+    names = []
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("name,latitude,longitude,weight\n")
+        for _ in range(count):
+            word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+            name = f"{rng.choice(KINDS)} {word} {rng.randint(1, 60)}, {rng.choice(AREAS)}"
+            lat = lat0 + rng.gauss(0, 10) / KM_PER_DEG_LAT
+            lon = lon0 + rng.gauss(0, 10) / KM_PER_DEG_LON
+            f.write(f"\"{name}\",{lat:.5f},{lon:.5f},{rng.paretovariate(1.5):.2f}\n")
+            names.append(name)
+    return names
+
+
+def scan_suggest(gazetteer, text: str) -> list:
+    """Top suggestions for ``text`` by checking every name."""
+    key = normalize(text)
+    keys = gazetteer._keys
+    matches = (position for position, name in enumerate(keys) if name.startswith(key))
+    return [gazetteer._rows[position] for position in gazetteer._rank(matches)]
+
+
+def timed(fn, inputs):
+    samples = []
+    results = []
+    for value in inputs:
+        began = time.perf_counter()
+        results.append(fn(value))
+        samples.append(time.perf_counter() - began)
+    return samples, results
+
+
+def main(args) -> None:
+    rng = random.Random(args.seed)
+    path = os.path.join(tempfile.mkdtemp(), 'places.csv')
+    names = write_gazetteer(path, args.places, args.seed)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    began = time.perf_counter()
+    gazetteer = load_gazetteer(path, cache_size=args.queries)
+    load_s = time.perf_counter() - began
+    rss_mib = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+    # As bot.py does after loading the gazetteer
+    gc.freeze()
+
+    prefixes = []
+    for name in rng.choices(names, k=args.queries):
+        prefixes.append(name[:rng.randint(1, 12)])
+    full = rng.choices(names, k=args.queries)
+
+    # The uncached functions behind the LRU caches, then the cached ones twice
+    suggest_cold, found = timed(gazetteer._suggest, prefixes)
+    timed(gazetteer.suggest, prefixes)
+    suggest_warm, _ = timed(gazetteer.suggest, prefixes)
+    resolve_cold, resolved = timed(gazetteer._resolve, full)
+    timed(gazetteer.resolve, full)
+    resolve_warm, _ = timed(gazetteer.resolve, full)
+    assert all(place is not None and normalize(place.name) == normalize(name) for place, name in zip(resolved, full))
+
+    scan_samples, expected = timed(lambda text: scan_suggest(gazetteer, text), prefixes[:args.scans])
+    for text, places, rows in zip(prefixes, found, expected):
+        assert [place.id for place in places] == rows, (text, places, rows)
+
+    print(f"{len(gazetteer)} places, {len(gazetteer._top)} precomputed prefixes")
+    print(f"load     {load_s:8.2f} s   {rss_mib:8.0f} MiB")
+    print(f"suggest  cold  {percentiles_us(suggest_cold)}")
+    print(f"         warm  {percentiles_us(suggest_warm)}")
+    print(f"resolve  cold  {percentiles_us(resolve_cold)}")
+    print(f"         warm  {percentiles_us(resolve_warm)}")
+    print(f"scan     cold  {percentiles_us(scan_samples)}")
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--places', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=20_000)
+    parser.add_argument('--scans', type=int, default=50, help="suggestions also found by a linear scan")
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
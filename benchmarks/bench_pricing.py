@@ -0,0 +1,105 @@
+"""Benchmark of fare quotes: per-call vs batched, and the route cache.
+
+Generates --trips random trips around Kuala Lumpur, with pickups and
+destinations drawn from --hotspots popular spots plus some scatter (so
+routes repeat, as they do in a city), and measures quotes per second, each
+quote pricing every vehicle type:
+
+    per-call   FareEstimator.quote per trip, first with an empty route
+               cache and then with every route cached
+    batched    FareEstimator.quote_batch over all trips at once (NumPy;
+               without it the batch falls back to per-call quotes)
+
+Every batched fare and trip time is checked against the per-call quote.
+Also times ``Fleet.nearest_each`` finding the nearest driver of every
+vehicle type in one search against one ``nearest`` search per type.
+
+Usage: python benchmarks/bench_pricing.py [--trips 200000] [--drivers 5000]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pricing  # noqa: E402
+from dispatch import KM_PER_DEG_LAT, KM_PER_DEG_LON, KUALA_LUMPUR, Fleet, generate_fleet  # noqa: E402
+from pricing import FareEstimator  # noqa: E402
+
+
+def generate_trips(count: int, hotspots: int, seed: int) -> tuple:
+    rng = random.Random(seed)
+    lat0, lon0 = KUALA_LUMPUR
+    km_per_deg_lon = KM_PER_DEG_LON * math.cos(math.radians(lat0))
+    spots = [(lat0 + rng.gauss(0, 8) / KM_PER_DEG_LAT, lon0 + rng.gauss(0, 8) / km_per_deg_lon)
+             for _ in range(hotspots)]
+
+    def point():
+        lat, lon = rng.choice(spots)
+        return lat + rng.gauss(0, 0.3) / KM_PER_DEG_LAT, lon + rng.gauss(0, 0.3) / km_per_deg_lon
+
+    pickups = [point() for _ in range(count)]
+    destinations = [point() for _ in range(count)]
+    surges = [rng.choice((1.0, 1.0, 1.0, 1.2, 1.5)) for _ in range(count)]
+    return pickups, destinations, surges
+
+
+def per_call(estimator: FareEstimator, pickups, destinations, surges) -> tuple:
+    began = time.perf_counter()
+    quotes = [estimator.quote(p, d, s) for p, d, s in zip(pickups, destinations, surges)]
+    return time.perf_counter() - began, quotes
+
+
+def main(args) -> None:
+    pickups, destinations, surges = generate_trips(args.trips, args.hotspots, args.seed)
+    estimator = FareEstimator()
+
+    cold_s, quotes = per_call(estimator, pickups, destinations, surges)
+    routes = estimator.route.cache_info()
+    warm_s, _ = per_call(estimator, pickups, destinations, surges)
+
+    began = time.perf_counter()
+    fares, minutes, km = estimator.quote_batch(pickups, destinations, surges)
+    batch_s = time.perf_counter() - began
+    for i, trip in enumerate(quotes):
+        for j, quote in enumerate(trip):
+            assert fares[i][j] == quote.fare and minutes[i][j] == quote.minutes, (i, j)
+
+    fleet = Fleet()
+    for driver in generate_fleet(args.drivers, seed=args.seed):
+        fleet.add(driver)
+    kinds = tuple(estimator.by_key)
+    began = time.perf_counter()
+    for pickup in pickups[:args.searches]:
+        fleet.nearest_each(*pickup, kinds)
+    each_s = time.perf_counter() - began
+    began = time.perf_counter()
+    for pickup in pickups[:args.searches]:
+        for kind in kinds:
+            fleet.nearest(*pickup, kind)
+    separate_s = time.perf_counter() - began
+
+    print(f"{args.trips} trips between {args.hotspots} hotspots, {len(estimator.vehicles)} vehicle types, "
+          f"numpy {'installed' if pricing.numpy() is not None else 'not installed'}")
+    print(f"{routes.currsize} distinct routes, {routes.hits / (routes.hits + routes.misses):.0%} "
+          f"of first-pass quotes from the route cache")
+    print(f"{'mode':<22} {'quotes/s':>12} {'us/quote':>9}")
+    for name, elapsed in (('per-call, cold cache', cold_s), ('per-call, warm cache', warm_s),
+                          ('batched', batch_s)):
+        print(f"{name:<22} {args.trips / elapsed:>12.0f} {elapsed / args.trips * 1e6:>9.2f}")
+    print(f"nearest driver of every type, {args.drivers} drivers: "
+          f"one search {each_s / args.searches * 1e6:.1f} us, "
+          f"one per type {separate_s / args.searches * 1e6:.1f} us")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trips', type=int, default=200_000)
+    parser.add_argument('--hotspots', type=int, default=50)
+    parser.add_argument('--drivers', type=int, default=5000)
+    parser.add_argument('--searches', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,170 @@
+"""Benchmark of promotion rules at checkout.
+
+Generates --rules promotion rules (percent and amount discounts, free
+delivery and cashback, with minimum orders, day and hour windows,
+first-order and per-user limits), --automatic of them applying without a
+code, and --orders orders, each from a user who entered a few codes, and
+measures:
+
+    compile    compiling the rules and indexing them in a PromotionEngine
+    best       per-order latency of PromotionEngine.best
+    scan       the same search done by checking every rule against the order
+
+Every order's benefits are checked against the scan. Then --tasks asyncio
+tasks race to redeem a code limited to --total redemptions, each pausing
+between finding the promotion and redeeming it as a handler pausing to
+send a message would, to check that exactly --total are redeemed.
+
+Usage: python benchmarks/bench_promotions.py [--rules 5000] [--orders 50000]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promotions import DAYS, KINDS, ORDER_TYPES, PromotionEngine, compile_rule  # noqa: E402
+
+
+def percentiles_us(samples) -> str:
+    samples = sorted(samples)
+    last = len(samples) - 1
+    return (f"p50 {samples[int(last * 0.5)] * 1e6:7.1f} us  p99 {samples[int(last * 0.99)] * 1e6:7.1f} us  "
+            f"max {samples[-1] * 1e6:8.1f} us")
+
+
+def generate_rules(count: int, automatic: int, seed: int) -> list:
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        rule = {'code': f"PROMO{i:05d}", 'title': f"Promotion {i}"}
+        benefit = rng.choice(('percent', 'percent', 'amount', 'free_delivery', 'cashback_percent'))
+        if benefit == 'percent':
+            rule['percent'] = rng.choice((5, 10, 15, 20, 30, 50))
+            if rng.random() < 0.8:
+                rule['max_discount'] = rng.choice((3, 5, 10, 15))
+        elif benefit == 'amount':
+            rule['amount'] = rng.choice((2, 3, 5, 8, 10))
+        elif benefit == 'free_delivery':
+            rule['free_delivery'] = True
+        else:
+            rule['cashback_percent'] = rng.choice((5, 10, 15))
+            rule['max_cashback'] = rng.choice((2, 5, 10))
+        if rng.random() < 0.6:
+            rule['order_types'] = [rng.choice(ORDER_TYPES)]
+        if rng.random() < 0.5:
+            rule['min_order'] = rng.choice((10, 15, 20, 30, 50))
+        if rng.random() < 0.3:
+            first = rng.randrange(7)
+            rule['days'] = [DAYS[(first + day) % 7] for day in range(rng.randint(1, 3))]
+        if rng.random() < 0.2:
+            start = rng.randrange(24)
+            rule['hours'] = [f"{start}:00", f"{(start + rng.randint(2, 6)) % 24}:00"]
+        if rng.random() < 0.2:
+            rule['first_orders'] = rng.choice((1, 3, 5))
+        if rng.random() < 0.3:
+            rule['per_user'] = rng.choice((1, 2, 5))
+        rule['automatic'] = i < automatic
+        rules.append(rule)
+    return rules
+
+
+def generate_orders(count: int, codes, seed: int) -> list:
+    """``(order type, amount, fee, codes, uses, placed, now)`` per order."""
+    rng = random.Random(seed)
+    began = time.time()
+    orders = []
+    for _ in range(count):
+        entered = tuple(rng.sample(codes, rng.randint(0, 5)))
+        uses = {code: rng.randint(0, 2) for code in entered if rng.random() < 0.3}
+        order_type = rng.choice(ORDER_TYPES)
+        fee = 400 if order_type == 'Food' else 0
+        orders.append((order_type, rng.randint(400, 8000), fee, entered, uses, rng.randint(0, 6),
+                       began + rng.uniform(0, 7 * 86400)))
+    return orders
+
+
+def scan_best(engine: PromotionEngine, order_type, amount, fee, codes, uses, placed, now) -> dict:
+    """kind -> best benefit in sen, by checking every rule."""
+    moment = time.localtime(now)
+    day, minute = moment.tm_wday, moment.tm_hour * 60 + moment.tm_min
+    entered = set(codes)
+    best = {}
+    for promotion in engine.promotions:
+        if ((promotion.automatic or promotion.code in entered)
+                and order_type in promotion.order_types and day in promotion.days
+                and amount >= promotion.min_order
+                and (promotion.start <= minute < promotion.end) != promotion.wraps
+                and placed < promotion.first_orders
+                and uses.get(promotion.code, 0) < promotion.per_user):
+            value = promotion.value(amount, fee)
+            if value > best.get(promotion.kind, 0):
+                best[promotion.kind] = value
+    return best
+
+
+def timed(fn, inputs):
+    samples = []
+    results = []
+    for value in inputs:
+        began = time.perf_counter()
+        results.append(fn(*value))
+        samples.append(time.perf_counter() - began)
+    return samples, results
+
+
+async def race(tasks: int, total: int) -> int:
+    """Redemptions made by ``tasks`` concurrent orders of a code limited to ``total``."""
+    engine = PromotionEngine([compile_rule({'code': 'LIMITED', 'title': "Limited", 'amount': 5,
+                                            'total': total})])
+
+    async def order(user: int) -> int:
+        found = engine.best('Food', 2000, codes=('LIMITED',))
+        # Another order may redeem the last one while this handler waits
+        await asyncio.sleep(0)
+        return len(engine.redeem(found, {}))
+
+    return sum(await asyncio.gather(*(order(user) for user in range(tasks))))
+
+
+def main(args) -> None:
+    rules = generate_rules(args.rules, args.automatic, args.seed)
+    began = time.perf_counter()
+    engine = PromotionEngine(compile_rule(rule) for rule in rules)
+    compile_s = time.perf_counter() - began
+    gc.collect()
+    gc.freeze()
+
+    orders = generate_orders(args.orders, [rule['code'] for rule in rules], args.seed)
+    fast, found = timed(engine.best, orders)
+    scan, expected = timed(lambda *order: scan_best(engine, *order), orders[:args.scans])
+    for order, applied, wanted in zip(orders, found, expected):
+        assert {best.promotion.kind: best.value for best in applied} == wanted, order
+    discounted = sum(1 for applied in found if applied)
+
+    print(f"{args.rules} rules ({args.automatic} automatic), compiled in {compile_s * 1000:.1f} ms")
+    print(f"{args.orders} orders, {discounted / len(orders):.0%} with a promotion, "
+          f"{sum(len(applied) for applied in found) / len(orders):.2f} benefits per order "
+          f"(of {', '.join(KINDS)})")
+    print(f"best  {percentiles_us(fast)}")
+    print(f"scan  {percentiles_us(scan)}")
+
+    redeemed = asyncio.run(race(args.tasks, args.total))
+    assert redeemed == args.total, redeemed
+    print(f"{args.tasks} concurrent orders for a code limited to {args.total}: {redeemed} redeemed")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=5000)
+    parser.add_argument('--automatic', type=int, default=200, help="rules that apply without a code")
+    parser.add_argument('--orders', type=int, default=50_000)
+    parser.add_argument('--scans', type=int, default=2000, help="orders also checked by a scan")
+    parser.add_argument('--tasks', type=int, default=10_000)
+    parser.add_argument('--total', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
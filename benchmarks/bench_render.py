@@ -0,0 +1,165 @@
+"""Benchmark screen rendering: prebuilt render cache vs. building per update.
+
+For each screen, reports time per render and the bytes allocated while
+rendering it once (tracemalloc peak), for the old per-call construction and
+for the prebuilt screens/templates in render.py.
+
+Usage: python benchmarks/bench_render.py [ITERATIONS]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+import render  # noqa: E402
+from catalog import load_catalog  # noqa: E402
+from locales import Locale  # noqa: E402
+from promotions import load_promotions  # noqa: E402
+
+CATALOG = load_catalog(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'catalog.json'))
+# Built once at startup, as bot.py does
+PROMOTIONS = render.promotions_screen(load_promotions(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'promotions.json')
+).listed(), Locale('en', 'English'))
+
+
+def legacy_main_menu():
+    keyboard = [
+        [
+            InlineKeyboardButton("🚗 Book a Ride", callback_data="book_ride"),
+            InlineKeyboardButton("🍔 Order Food", callback_data="order_food")
+        ],
+        [
+            InlineKeyboardButton("📦 Track Order", callback_data="track_order"),
+            InlineKeyboardButton("💳 My Wallet", callback_data="my_wallet")
+        ],
+        [
+            InlineKeyboardButton("🎁 Promotions", callback_data="promotions"),
+            InlineKeyboardButton("📞 Support", callback_data="support")
+        ],
+        [
+            InlineKeyboardButton("ℹ️ About Grab", callback_data="about"),
+            InlineKeyboardButton("⚙️ Settings", callback_data="settings")
+        ]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
+def legacy_welcome(first_name="Aisyah"):
+    return dict(
+        text=(
+            f"👋 <b>Welcome to Grab, {first_name}!</b>\n\n"
+            f"Your everyday everything app.\n\n"
+            f"🚗 <b>Ride</b> - Book a car or bike\n"
+            f"🍔 <b>Food</b> - Order from restaurants\n"
+            f"📦 <b>Deliveries</b> - Send packages\n"
+            f"💳 <b>Payments</b> - GrabPay wallet\n\n"
+            f"What would you like to do today?"
+        ),
+        reply_markup=legacy_main_menu()
+    )
+
+
+def legacy_promotions():
+    return dict(
+        text=(
+            "🎁 <b>Promotions & Deals</b>\n\n"
+            "🔥 <b>Hot Deals:</b>\n\n"
+            "• 20% off on first 3 rides\n"
+            "   Code: GRAB20\n\n"
+            "• Free delivery on orders above RM 30\n"
+            "   Code: FREEDEL30\n\n"
+            "• RM 5 off on food orders\n"
+            "   Code: GRABFOOD5\n\n"
+            "• Weekend Special: 15% cashback\n"
+            "   Valid: Fri-Sun\n\n"
+            "💡 Apply these codes at checkout!"
+        ),
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")
+        ]]),
+        parse_mode='HTML'
+    )
+
+
+def legacy_restaurant_menu(restaurant_index=2):
+    restaurant_names = ["Pizza Express", "Noodles House", "Fried Chicken Co", "Healthy Bites", "Sushi Station"]
+    restaurant_name = restaurant_names[restaurant_index]
+    menu_items = {
+        0: ["🍕 Margherita Pizza - RM 25", "🍕 Pepperoni Pizza - RM 28", "🍕 Hawaiian Pizza - RM 30"],
+        1: ["🍜 Beef Noodles - RM 18", "🍜 Chicken Noodles - RM 16", "🍜 Veggie Noodles - RM 14"],
+        2: ["🍗 Original Fried Chicken - RM 15", "🍗 Spicy Fried Chicken - RM 16", "🍗 Chicken Combo - RM 22"],
+        3: ["🥗 Caesar Salad - RM 20", "🥗 Greek Salad - RM 18", "🥗 Quinoa Bowl - RM 22"],
+        4: ["🍱 Salmon Sushi Set - RM 35", "🍱 Mixed Sushi - RM 30", "🍱 Tuna Roll - RM 25"]
+    }
+    items = menu_items.get(restaurant_index, [])
+    keyboard = [[InlineKeyboardButton(item, callback_data=f"food_{restaurant_index}_{i}")]
+                for i, item in enumerate(items)]
+    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="order_food")])
+    return dict(text=f"🍔 <b>{restaurant_name}</b>\n\nSelect an item:",
+                reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+
+
+def legacy_wallet(balance=72.5):
+    return dict(
+        text=(
+            f"💳 <b>GrabPay Wallet</b>\n\n"
+            f"Balance: <b>RM {balance:.2f}</b>\n\n"
+            f"Recent transactions:\n"
+            f"• Ride booking - RM 15.00\n"
+            f"• Food order - RM 28.50\n"
+            f"• Top-up - RM 100.00\n\n"
+            f"💡 Tip: Top up your wallet for faster checkout!"
+        ),
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("💵 Top Up", callback_data="topup")],
+            [InlineKeyboardButton("📜 Transaction History", callback_data="history")],
+            [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
+        ]),
+        parse_mode='HTML'
+    )
+
+
+RECENT = "• Ride booking - RM 15.00\n• Food order - RM 28.50\n• Top-up - RM 100.00"
+
+CASES = [
+    ("main menu", legacy_main_menu, lambda: render.MAIN_MENU),
+    ("welcome", legacy_welcome, lambda: render.WELCOME.render(first_name="Aisyah")),
+    ("promotions", legacy_promotions, lambda: {**PROMOTIONS}),
+    ("restaurant", legacy_restaurant_menu, lambda: {**CATALOG.menu_page(3)}),
+    ("wallet", legacy_wallet, lambda: render.WALLET.render(balance="RM 72.50", recent=RECENT)),
+]
+
+
+def time_per_call(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bytes_per_call(func):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - before
+
+
+def main(iterations):
+    print(f"{'screen':>11} {'before us':>10} {'after us':>9} {'before B':>9} {'after B':>8}")
+    for name, before, after in CASES:
+        print(
+            f"{name:>11} {time_per_call(before, iterations):>10.2f} {time_per_call(after, iterations):>9.2f}"
+            f" {bytes_per_call(before):>9} {bytes_per_call(after):>8}"
+        )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,104 @@
+"""Benchmark callback routing: CallbackRouter vs. the old regex + if/elif chain.
+
+Both sides include the handler-selection work python-telegram-bot does before
+the callback runs: the ConversationHandler entry patterns are checked in
+registration order, then the button handler picks a branch.
+
+Usage: python benchmarks/bench_router.py [ITERATIONS]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import CallbackRouter  # noqa: E402
+
+CALLBACKS = [
+    "book_ride", "order_food", "track_order", "my_wallet", "promotions", "support",
+    "about", "settings", "main_menu", "rest_3", "food_2_1", "topup", "topup_50",
+]
+
+LEGACY_PATTERNS = [re.compile(p) for p in ("^book_ride$", "^order_food$|^rest_|^food_", "^support$")]
+
+
+def legacy_chain(data):
+    """The branch selection of the old button_handler."""
+    if data == "book_ride":
+        return "book_ride", ()
+    elif data == "order_food":
+        return "order_food", ()
+    elif data == "track_order":
+        return "track_order", ()
+    elif data == "my_wallet":
+        return "my_wallet", ()
+    elif data == "promotions":
+        return "promotions", ()
+    elif data == "support":
+        return "support", ()
+    elif data == "about":
+        return "about", ()
+    elif data == "settings":
+        return "settings", ()
+    elif data == "main_menu":
+        return "main_menu", ()
+    elif data.startswith("rest_"):
+        return "rest", (int(data.split("_")[1]),)
+    elif data.startswith("food_"):
+        parts = data.split("_")
+        return "food", (int(parts[1]), int(parts[2]))
+    elif data == "topup":
+        return "topup", ()
+    elif data.startswith("topup_"):
+        return "topup", (float(data.split("_")[1]),)
+
+
+def legacy_route(data):
+    for pattern in LEGACY_PATTERNS:
+        if pattern.match(data):
+            break
+    return legacy_chain(data)
+
+
+def build_router():
+    router = CallbackRouter()
+
+    async def handler(update, context, *args):
+        pass
+
+    for name in CALLBACKS[:9] + ["topup"]:
+        router.action(name)(handler)
+    router.action("rest", int)(handler)
+    router.action("food", int, int)(handler)
+    router.action("topup", float)(handler)
+    patterns = [router.pattern("book_ride"), router.pattern("order_food", "rest", "food"), router.pattern("support")]
+
+    def route(data):
+        for pattern in patterns:
+            if pattern(data):
+                break
+        return router.resolve(data)
+    return route, router.resolve
+
+
+def bench(route, data, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        route(data)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main(iterations):
+    router_route, router_resolve = build_router()
+    print("ns per callback; 'total' includes the ConversationHandler pattern checks")
+    print(f"{'callback':>12} {'chain':>7} {'resolve':>8} {'old total':>10} {'new total':>10}")
+    for data in CALLBACKS:
+        print(
+            f"{data:>12} {bench(legacy_chain, data, iterations):>7.0f} {bench(router_resolve, data, iterations):>8.0f}"
+            f" {bench(legacy_route, data, iterations):>10.0f} {bench(router_route, data, iterations):>10.0f}"
+        )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,114 @@
+"""Benchmark of the sharded deployment: throughput with 1 to N worker processes.
+
+For each worker count, starts that many worker processes (each the bot's
+handlers from ``build_application()`` on an in-process fake Bot API, as in
+load_test.py), routes the same generated update stream to them through an
+``Ingress`` and measures updates per second from the first update sent until
+every worker has processed its share. Also reports how evenly the users were
+spread and how many users move when one worker is added.
+
+Throughput can only grow with the worker count while there are idle cores;
+the table shows the cores available.
+
+Usage: python benchmarks/bench_sharding.py [--workers 4] [--count 20000] [--users 2000]
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('BOT_TOKEN', '123:fake')
+os.environ.setdefault('METRICS_PORT', '0')
+
+from telegram.ext import Application  # noqa: E402
+
+import bot  # noqa: E402
+from load_test import DEFAULT_MIX, FakeBotAPI, generate_updates  # noqa: E402
+from processor import KeyedUpdateProcessor  # noqa: E402
+from sharding import HashRing, Ingress, WorkerPool, WorkerServer, routing_key, run_worker  # noqa: E402
+
+
+def worker() -> None:
+    """Worker process: the bot's handlers behind a WorkerServer, on a fake Bot API."""
+    application = bot.build_application(
+        Application.builder().token(bot.BOT_TOKEN).request(FakeBotAPI()).get_updates_request(FakeBotAPI())
+        .updater(None).concurrent_updates(KeyedUpdateProcessor(bot.CONCURRENT_UPDATES))
+    )
+    server = WorkerServer(
+        application, bot.WORKER_SOCKET, bot.WORKER_NAME,
+        release=functools.partial(bot.release_users, application), adopt=bot.adopt_orders
+    )
+    asyncio.run(run_worker(application, server))
+
+
+async def measure(workers: int, updates: list, warmup: int, env: dict) -> dict:
+    ingress = Ingress()
+    pool = WorkerPool(ingress, [sys.executable, os.path.abspath(__file__), '--worker'], workers,
+                      env=lambda index: env)
+    await pool.start()
+    try:
+        for data in updates[:warmup]:
+            await ingress.dispatch(data)
+        await ingress.drain()
+        ingress.dispatched.clear()
+        began = time.perf_counter()
+        for data in updates[warmup:]:
+            await ingress.dispatch(data)
+        await ingress.drain()
+        elapsed = time.perf_counter() - began
+    finally:
+        await pool.stop()
+    shares = sorted(ingress.dispatched.values())
+    return {
+        'updates_per_sec': (len(updates) - warmup) / elapsed,
+        'elapsed_s': elapsed,
+        'max_share': shares[-1] / sum(shares) if shares else 0.0,
+    }
+
+
+def moved_on_join(users: list, workers: int) -> float:
+    """Fraction of users that change worker when a worker joins a ring of ``workers``."""
+    before = HashRing([f"w{i}" for i in range(workers)])
+    after = HashRing([f"w{i}" for i in range(workers + 1)])
+    return sum(before.node_for(user) != after.node_for(user) for user in users) / len(users)
+
+
+async def main(args) -> None:
+    updates = [data for _, data in generate_updates(args.count + args.warmup, args.users, DEFAULT_MIX, args.seed)]
+    users = sorted({routing_key(data) for data in updates})
+    env = {'METRICS_PORT': '0', 'STORAGE_BACKEND': args.storage}
+    if args.storage == 'sqlite':
+        env['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    print(f"{args.count} updates from {len(users)} users, {args.storage} storage, "
+          f"{os.cpu_count()} cores available")
+    print(f"{'workers':>7} {'updates/s':>10} {'speedup':>8} {'largest share':>14} {'moved on join':>14}")
+    baseline = None
+    for workers in range(1, args.workers + 1):
+        result = await measure(workers, updates, args.warmup, env)
+        baseline = baseline or result['updates_per_sec']
+        print(f"{workers:>7} {result['updates_per_sec']:>10.0f} {result['updates_per_sec'] / baseline:>7.2f}x "
+              f"{result['max_share'] * 100:>13.1f}% {moved_on_join(users, workers) * 100:>13.1f}%")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="largest worker count")
+    parser.add_argument('--count', type=int, default=20_000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=2000)
+    parser.add_argument('--storage', choices=['memory', 'sqlite'], default='memory')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.worker:
+        worker()
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,160 @@
+"""Benchmark of a restart: time from starting the process to its first reply.
+
+Starts bot.py's Application in a fresh Python process against a fake Bot
+API that answers every request after --rtt seconds, like Telegram over the
+network. While the bot was down --pending users sent /start; one more user
+sends /start once the bot is polling. Each run reports:
+
+    import    seconds from spawning the process until bot.py is imported
+    first     seconds from spawning the process until the first reply
+    all       seconds until every update Telegram still had was answered
+    answered  pending updates answered, of --pending
+    calls     Bot API requests made before the first reply
+
+Runs, taking turns --repeat times (medians are shown):
+
+    old        as the bot started before: NumPy imported with pricing.py,
+               the webhook checked after post_init and pending updates
+               dropped
+    no snap    pending updates answered, no snapshot to start from (the
+               first start, and the one that writes the snapshot)
+    snapshot   pending updates answered, fleet and surge demand read from
+               the snapshot written by the run before
+
+Usage: python benchmarks/bench_startup.py [--pending 50] [--rtt 0.05] [--repeat 5]
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(args) -> None:
+    """Start the bot once and print what the run measured as JSON."""
+    spawned = args.spawned
+    sys.path.insert(0, ROOT)
+    if args.old:
+        importlib.import_module("numpy")
+    import bot
+    imported = time.time()
+
+    from telegram import Update
+    from telegram.ext import Application
+
+    from load_test import FakeBotAPI, UpdateFactory
+    from processor import KeyedUpdateProcessor
+
+    factory = UpdateFactory()
+    queued = [factory.message(user_id, '/start') for user_id in range(1, args.pending + 1)]
+    latest = factory.message(args.pending + 1, '/start')
+    delivered = set()
+    replied = {}
+    calls = []
+    application = None
+
+    class RestartedAPI(FakeBotAPI):
+        """Telegram as the bot finds it after a restart: updates queued for
+        it, one more arriving once it polls."""
+
+        polled = False
+
+        async def do_request(self, url, method, request_data=None, **kwargs):
+            endpoint = url.rsplit('/', 1)[1]
+            params = request_data.parameters if request_data else {}
+            if 'sendMessage' not in calls:
+                calls.append(endpoint)
+            if endpoint == 'deleteWebhook' and params.get('drop_pending_updates'):
+                queued.clear()
+            if endpoint != 'getUpdates':
+                status, body = await super().do_request(url, method, request_data, **kwargs)
+                if endpoint == 'sendMessage':
+                    replied.setdefault(params['chat_id'], time.time())
+                    if latest['message']['chat']['id'] in replied and delivered <= set(replied):
+                        application.stop_running()
+                return status, body
+            await asyncio.sleep(self.latency)
+            if not self.polled:
+                self.polled = True
+                queued.append(latest)
+            offset = params.get('offset') or 0
+            batch = [update for update in queued if update['update_id'] >= offset]
+            delivered.update(update['message']['chat']['id'] for update in batch)
+            return 200, json.dumps({'ok': True, 'result': batch}).encode()
+
+    api = RestartedAPI(args.rtt)
+    builder = Application.builder().token('123:fake').request(api).get_updates_request(api)
+    if bot.CONCURRENT_UPDATES > 1:
+        builder.concurrent_updates(KeyedUpdateProcessor(bot.CONCURRENT_UPDATES))
+    application = bot.build_application(builder)
+    if args.old:
+        post_init = application.post_init
+
+        async def checked_post_init(application):
+            await post_init(application)
+            await application.bot.get_webhook_info()
+
+        application.post_init = checked_post_init
+    application.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=bot.DROP_PENDING_UPDATES)
+    print(json.dumps({
+        'import': imported - spawned,
+        'first': min(replied.values()) - spawned,
+        'all': max(replied.values()) - spawned,
+        'answered': len(replied) - 1,
+        'calls': calls,
+    }))
+
+
+def run(args, directory: str, old: bool, snapshot_path: str) -> dict:
+    env = dict(os.environ, BOT_TOKEN='123:fake', METRICS_PORT='0', STORAGE_BACKEND=args.backend,
+               DATABASE_PATH=os.path.join(directory, f"bot-{time.monotonic_ns()}.db"),
+               DROP_PENDING_UPDATES='true' if old else 'false', SNAPSHOT_PATH=snapshot_path)
+    command = [sys.executable, os.path.abspath(__file__), '--pending', str(args.pending), '--rtt', str(args.rtt)]
+    if old:
+        command.append('--old')
+    command += ['--spawned', repr(time.time())]
+    result = subprocess.run(command, env=env, capture_output=True, text=True, timeout=120)
+    if result.returncode:
+        sys.exit(f"bot failed to start:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(args) -> None:
+    print(f"{args.pending} updates pending, {args.rtt * 1e3:.0f} ms per Bot API request, {args.backend} storage")
+    print(f"{'':<9} {'import':>8} {'first':>8} {'all':>8} {'answered':>9}  calls before the first reply")
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, 'warm.snapshot')
+        runs = (('old', True, ''), ('no snap', False, snapshot_path), ('snapshot', False, snapshot_path))
+        results = {name: [] for name, _, _ in runs}
+        # In turns, so the machine getting busier or quieter affects every run alike
+        for _ in range(args.repeat):
+            for name, old, path in runs:
+                if name == 'no snap' and os.path.exists(snapshot_path):
+                    os.remove(snapshot_path)
+                results[name].append(run(args, directory, old, path))
+        for name, samples in results.items():
+            times = {key: statistics.median(sample[key] for sample in samples) for key in ('import', 'first', 'all')}
+            print(f"{name:<9} {times['import'] * 1e3:>6.0f}ms {times['first'] * 1e3:>6.0f}ms {times['all'] * 1e3:>6.0f}ms"
+                  f" {samples[-1]['answered']:>5}/{args.pending:<3}  {', '.join(samples[-1]['calls'])}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pending', type=int, default=50, help="updates sent while the bot was down")
+    parser.add_argument('--rtt', type=float, default=0.05, help="seconds per Bot API request")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--backend', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--old', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--spawned', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.spawned is not None:
+        child(args)
+    else:
+        main(args)
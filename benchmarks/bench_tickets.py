@@ -0,0 +1,174 @@
+"""Benchmark of support ticket ingestion, search and export.
+
+Generates --tickets support requests from --users users (complaints about
+drivers, payments and orders, with a few rarer words) and stores them in
+the in-memory ticket store and the SQLite one (FTS5), queueing them as the
+support handler does and storing a batch every --batch tickets. Measures:
+
+    add       per-ticket latency of TicketStore.add, what the handler pays
+    store     tickets stored per second, batch by batch
+    find      per-query latency of TicketStore.find for words (one common,
+              one rare, two together), reference IDs and users
+    export    tickets per second streamed by export_jsonl
+
+Every query's results are checked to be the same in both stores and, for
+the first --scans queries, against a scan of every ticket.
+
+Usage: python benchmarks/bench_tickets.py [--tickets 1000000] [--queries 2000]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tickets import SQLiteTicketStore, Ticket, TicketStore, export_jsonl, new_reference, words  # noqa: E402
+
+ISSUES = (
+    "I was charged twice for my {thing}", "my driver was {adjective} and took a long route",
+    "the food arrived {adjective} and {adjective}", "I need a refund for order {order}",
+    "I left my {thing} in the car", "my {thing} never arrived, order {order}",
+    "the app keeps crashing when I pay with {thing}", "promo code not applied to my {thing}",
+)
+THINGS = ('ride', 'food', 'phone', 'wallet', 'umbrella', 'card', 'grabpay', 'pizza', 'laptop', 'bag')
+ADJECTIVES = ('rude', 'late', 'cold', 'soggy', 'reckless', 'lost', 'friendly', 'spilled', 'wrong', 'slow')
+
+
+def percentiles_us(samples) -> str:
+    samples = sorted(samples)
+    last = len(samples) - 1
+    return (f"p50 {samples[int(last * 0.5)] * 1e6:8.1f} us  p99 {samples[int(last * 0.99)] * 1e6:8.1f} us  "
+            f"max {samples[-1] * 1e6:9.1f} us")
+
+
+def generate_tickets(count: int, users: int, seed: int) -> list:
+    rng = random.Random(seed)
+    began = time.time() - count
+    tickets = []
+    for i in range(count):
+        text = rng.choice(ISSUES).format(
+            thing=rng.choice(THINGS), adjective=rng.choice(ADJECTIVES), order=f"{rng.getrandbits(32):08X}"
+        )
+        if rng.random() < 0.01:
+            text += " " + rng.choice(("chargeback", "lawyer", "injured", "fraud"))
+        tickets.append(Ticket(new_reference(), rng.randrange(users), text,
+                              f"{rng.getrandbits(32):08X}" if rng.random() < 0.7 else None,
+                              created_at=began + i))
+    return tickets
+
+
+def generate_queries(count: int, tickets: list, seed: int) -> list:
+    rng = random.Random(seed)
+    kinds = (
+        lambda: rng.choice(THINGS),
+        lambda: rng.choice(("chargeback", "lawyer", "injured", "fraud")),
+        lambda: f"{rng.choice(ADJECTIVES)} {rng.choice(THINGS)}",
+        lambda: '#' + rng.choice(tickets).id,
+        lambda: f"user:{rng.choice(tickets).user_id}",
+    )
+    return [rng.choice(kinds)() for _ in range(count)]
+
+
+def scan(tickets: list, query: str, limit: int) -> list:
+    """Ids of the tickets matching ``query``, newest first, by reading every ticket."""
+    if query.startswith('#'):
+        return [ticket.id for ticket in tickets if ticket.id == query[1:]]
+    if query.startswith('user:'):
+        user_id = int(query[5:])
+        matches = (ticket for ticket in reversed(tickets) if ticket.user_id == user_id)
+    else:
+        terms = set(words(query))
+        matches = (ticket for ticket in reversed(tickets) if terms <= set(words(ticket.text)))
+    found = []
+    for ticket in matches:
+        found.append(ticket.id)
+        if len(found) == limit:
+            break
+    return found
+
+
+async def ingest(store: TicketStore, tickets: list, batch: int):
+    """Returns per-add latencies and tickets stored per second."""
+    adds = []
+    stored_s = 0.0
+    for i in range(0, len(tickets), batch):
+        for ticket in tickets[i:i + batch]:
+            began = time.perf_counter()
+            store.add(ticket)
+            adds.append(time.perf_counter() - began)
+        began = time.perf_counter()
+        await store.flush()
+        stored_s += time.perf_counter() - began
+    return adds, len(tickets) / stored_s
+
+
+async def timed_find(store: TicketStore, queries, limit: int):
+    samples = []
+    results = []
+    for query in queries:
+        began = time.perf_counter()
+        found = await store.find(query, limit)
+        samples.append(time.perf_counter() - began)
+        results.append([ticket.id for ticket in found])
+    return samples, results
+
+
+async def run(args, path: str) -> None:
+    tickets = generate_tickets(args.tickets, args.users, args.seed)
+    queries = generate_queries(args.queries, tickets, args.seed)
+    stores = {'memory': TicketStore(), 'sqlite': SQLiteTicketStore(path)}
+    await stores['sqlite']._run(stores['sqlite']._open_db)
+
+    print(f"{args.tickets} tickets from {args.users} users, stored in batches of {args.batch}")
+    results = {}
+    for name, store in stores.items():
+        # Separate copies, so closing a ticket in one store does not touch the other
+        copies = [Ticket.from_dict(ticket.to_dict()) for ticket in tickets]
+        adds, rate = await ingest(store, copies, args.batch)
+        del copies
+        gc.collect()
+        gc.freeze()
+        samples, results[name] = await timed_find(store, queries, args.limit)
+        print(f"{name:<7} add    {percentiles_us(adds)}")
+        print(f"{'':<7} store  {rate:,.0f} tickets/s")
+        print(f"{'':<7} find   {percentiles_us(samples)}")
+        for kind in ('#', 'user:'):
+            picked = [sample for sample, query in zip(samples, queries) if query.startswith(kind)]
+            print(f"{'':<7}   {kind + '...':<6}{percentiles_us(picked)}")
+        picked = [sample for sample, query in zip(samples, queries) if not query.startswith(('#', 'user:'))]
+        print(f"{'':<7}   words {percentiles_us(picked)}")
+
+    assert results['memory'] == results['sqlite']
+    for query, found in zip(queries[:args.scans], results['memory']):
+        assert found == scan(tickets, query, args.limit), query
+    print(f"results identical in both stores, and to a scan for {min(args.scans, len(queries))} queries")
+
+    began = time.perf_counter()
+    with open(os.devnull, 'w') as out:
+        exported = export_jsonl(path, out)
+    export_s = time.perf_counter() - began
+    assert exported == args.tickets
+    print(f"export {exported / export_s:,.0f} tickets/s, {os.path.getsize(path) / 1e6:.0f} MB database")
+    await stores['sqlite'].close()
+
+
+def main(args) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(args, os.path.join(directory, 'tickets.db')))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickets', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--batch', type=int, default=500, help="tickets stored per batch")
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--scans', type=int, default=50, help="queries also answered by a scan")
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,259 @@
+"""Fake Telegram for comparing polling and webhook mode on one machine.
+
+Serves a minimal Bot API on --api-port and feeds recorded updates to the bot,
+either through getUpdates (polling mode) or by POSTing them to the webhook the
+bot registered with setWebhook (webhook mode). It measures end-to-end latency
+from delivering an update to receiving the bot's reply, and the update rate.
+
+    python benchmarks/fake_telegram.py --mode polling &
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot BOT_TOKEN=123:fake python bot.py
+
+    python benchmarks/fake_telegram.py --mode webhook &
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot BOT_TOKEN=123:fake \\
+        BOT_MODE=webhook WEBHOOK_URL=http://127.0.0.1:8443 python bot.py
+
+Set SEND_RATE_LIMIT=0 on the bot to measure the bot itself rather than
+Telegram's flood limits, which the send scheduler otherwise enforces.
+
+Updates are read from --updates (one JSON update per line) or generated.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict, deque
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook import HTTPError, read_request, write_response  # noqa: E402
+
+# Bot API methods that count as the bot's reply to an update
+REPLY_METHODS = {'sendMessage', 'editMessageText'}
+
+
+def generate_updates(count: int, users: int):
+    """Yield a mix of /start, menu taps and free-text messages from ``users`` users."""
+    for i in range(count):
+        user_id = 1000 + i % users
+        user = {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}
+        chat = {'id': user_id, 'type': 'private'}
+        # Each user goes through the mix in turn, so consecutive taps differ
+        kind = (i // users) % 4
+        if kind == 0:
+            yield {'update_id': i + 1, 'message': {
+                'message_id': i + 1, 'date': int(time.time()), 'chat': chat, 'from': user,
+                'text': '/start', 'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+            }}
+        elif kind == 1:
+            yield {'update_id': i + 1, 'message': {
+                'message_id': i + 1, 'date': int(time.time()), 'chat': chat, 'from': user, 'text': 'hi',
+            }}
+        else:
+            yield {'update_id': i + 1, 'callback_query': {
+                'id': str(i + 1), 'from': user, 'chat_instance': str(user_id),
+                'data': 'promotions' if kind == 2 else 'main_menu',
+                'message': {'message_id': 1, 'date': int(time.time()), 'chat': chat, 'text': 'menu'},
+            }}
+
+
+def update_chat_id(update: dict) -> int:
+    if 'message' in update:
+        return update['message']['chat']['id']
+    return update['callback_query']['message']['chat']['id']
+
+
+class FakeTelegram:
+    """Minimal Bot API server plus an update feeder."""
+
+    def __init__(self, mode: str, concurrency: int):
+        self.mode = mode
+        self.concurrency = concurrency
+        self.webhook_url = None
+        self.secret_token = None
+        self.webhook_set = asyncio.Event()
+        self.pending_updates = deque()
+        self.updates_available = asyncio.Event()
+        # chat_id -> delivery timestamps of updates still awaiting a reply
+        self.in_flight = defaultdict(deque)
+        self.latencies = []
+        self.slots = asyncio.Semaphore(concurrency)
+        self.message_id = 0
+
+    # Bot API side
+
+    async def handle_api(self, reader, writer) -> None:
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    method, path, headers, body, keep_alive = await read_request(reader, 50 * 1024 * 1024)
+                except (asyncio.IncompleteReadError, ConnectionError, HTTPError):
+                    break
+                params = self.parse_params(headers, body)
+                result = await self.call(path.rsplit('/', 1)[-1], params)
+                payload = json.dumps({'ok': True, 'result': result}).encode()
+                write_response(writer, HTTPStatus.OK, payload, keep_alive)
+                await writer.drain()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def parse_params(headers: dict, body: bytes) -> dict:
+        if headers.get('content-type', '').startswith('application/json'):
+            return json.loads(body or b'{}')
+        params = {}
+        for name, value in parse_qsl(body.decode()):
+            try:
+                params[name] = json.loads(value)
+            except ValueError:
+                params[name] = value
+        return params
+
+    async def call(self, method: str, params: dict):
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Grab', 'username': 'grab_bot'}
+        if method == 'getWebhookInfo':
+            return {'url': self.webhook_url or '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url')
+            self.secret_token = params.get('secret_token')
+            self.webhook_set.set()
+            return True
+        if method == 'deleteWebhook':
+            self.webhook_url = None
+            return True
+        if method == 'getUpdates':
+            return await self.get_updates(float(params.get('timeout', 0)))
+        if method in REPLY_METHODS:
+            self.record_reply(int(params['chat_id']))
+            self.message_id += 1
+            return {
+                'message_id': params.get('message_id', self.message_id), 'date': int(time.time()),
+                'chat': {'id': int(params['chat_id']), 'type': 'private'}, 'text': params.get('text', ''),
+            }
+        return True
+
+    async def get_updates(self, timeout: float):
+        if not self.pending_updates:
+            self.updates_available.clear()
+            try:
+                await asyncio.wait_for(self.updates_available.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        batch = list(self.pending_updates)
+        self.pending_updates.clear()
+        return batch
+
+    def record_reply(self, chat_id: int) -> None:
+        sent = self.in_flight.get(chat_id)
+        if sent:
+            self.latencies.append(time.perf_counter() - sent.popleft())
+            self.slots.release()
+
+    # Update delivery side
+
+    async def deliver_polling(self, update: dict) -> None:
+        self.in_flight[update_chat_id(update)].append(time.perf_counter())
+        self.pending_updates.append(update)
+        self.updates_available.set()
+
+    async def open_webhook_connection(self):
+        url = urlsplit(self.webhook_url)
+        return await asyncio.open_connection(url.hostname, url.port or 80)
+
+    async def deliver_webhook(self, connection, update: dict) -> None:
+        reader, writer = connection
+        body = json.dumps(update).encode()
+        path = urlsplit(self.webhook_url).path or '/'
+        head = (
+            f"POST {path} HTTP/1.1\r\nHost: bot\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+        )
+        if self.secret_token:
+            head += f"X-Telegram-Bot-Api-Secret-Token: {self.secret_token}\r\n"
+        self.in_flight[update_chat_id(update)].append(time.perf_counter())
+        writer.write(head.encode() + b'\r\n' + body)
+        await writer.drain()
+        status_line = await reader.readuntil(b'\r\n\r\n')
+        if b' 200 ' not in status_line.split(b'\r\n', 1)[0]:
+            print(f"Webhook rejected update: {status_line.splitlines()[0].decode()}")
+
+    async def feed(self, updates: list) -> float:
+        start = time.perf_counter()
+        if self.mode == 'polling':
+            for update in updates:
+                await self.slots.acquire()
+                await self.deliver_polling(update)
+        else:
+            await self.webhook_set.wait()
+            queue = deque(updates)
+            connections = [await self.open_webhook_connection() for _ in range(self.concurrency)]
+
+            async def worker(connection):
+                while queue:
+                    update = queue.popleft()
+                    await self.slots.acquire()
+                    await self.deliver_webhook(connection, update)
+
+            await asyncio.gather(*(worker(c) for c in connections))
+            for _, writer in connections:
+                writer.close()
+        # Wait for the last replies
+        for _ in range(self.concurrency):
+            await self.slots.acquire()
+        return time.perf_counter() - start
+
+
+async def main(args) -> None:
+    if args.updates:
+        with open(args.updates) as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = list(generate_updates(args.count, args.users))
+
+    fake = FakeTelegram(args.mode, args.concurrency)
+    server = await asyncio.start_server(fake.handle_api, '127.0.0.1', args.api_port)
+    print(f"Fake Bot API on http://127.0.0.1:{args.api_port}/bot ({args.mode} mode), waiting for the bot...")
+    async with server:
+        try:
+            elapsed = await asyncio.wait_for(fake.feed(updates), args.timeout)
+        except asyncio.TimeoutError:
+            print(f"Timed out; {len(fake.latencies)} of {len(updates)} updates answered")
+            return
+    latencies = sorted(fake.latencies)
+    result = {
+        'mode': args.mode,
+        'updates': len(updates),
+        'concurrency': args.concurrency,
+        'updates_per_sec': round(len(updates) / elapsed, 1),
+        'latency_ms_p50': round(statistics.median(latencies) * 1000, 3),
+        'latency_ms_p95': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+        'latency_ms_max': round(latencies[-1] * 1000, 3),
+    }
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['polling', 'webhook'], default='polling')
+    parser.add_argument('--api-port', type=int, default=8081)
+    parser.add_argument('--updates', help="JSONL file of recorded updates")
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--record', help="write the generated updates to this JSONL file and exit")
+    args = parser.parse_args()
+    if args.record:
+        with open(args.record, 'w') as f:
+            for update in generate_updates(args.count, args.users):
+                f.write(json.dumps(update) + '\n')
+    else:
+        asyncio.run(main(args))
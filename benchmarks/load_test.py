@@ -0,0 +1,335 @@
+"""Load test and replay harness for the bot's handlers.
+
+Builds the same Application and handlers as ``bot.main()`` on top of an
+in-process fake Bot API (no network) and feeds it a synthetic stream of
+updates from many simulated users: /start, menu taps, food orders, ride
+booking conversations and wallet top-ups, interleaved across users. Each
+user's updates arrive in order, as they would from Telegram.
+
+Reports throughput, p50/p95/p99 handler latency overall and per scenario,
+memory growth and the Bot API calls made, and can save the results as JSON
+to compare commits:
+
+    python benchmarks/load_test.py --count 50000 --users 2000 --output before.json
+    python benchmarks/load_test.py --count 50000 --users 2000 --compare before.json
+
+Updates can also be replayed from a JSONL file (--updates), e.g. one written
+with --record or by benchmarks/fake_telegram.py --record.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('BOT_TOKEN', '123:fake')
+os.environ.setdefault('METRICS_PORT', '0')
+
+import telegram  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.ext import Application  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+
+import bot  # noqa: E402
+
+# Relative weight of each scenario in the generated mix
+DEFAULT_MIX = {'start': 1, 'menu': 4, 'food': 2, 'ride': 2, 'topup': 1, 'text': 1}
+MENU_TAPS = ('promotions', 'about', 'settings', 'track_order', 'my_wallet', 'support', 'main_menu')
+PLACES = ('KLCC', 'Mid Valley Megamall', 'Bangsar South', 'Sunway Pyramid', 'KL Sentral', 'Pavilion KL')
+TOPUP_AMOUNTS = (20, 50, 100, 200)
+
+
+class FakeBotAPI(BaseRequest):
+    """Answers Bot API requests in-process with minimal valid results,
+    optionally after ``latency`` seconds to stand in for the network."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[1]
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        if endpoint == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Grab', 'username': 'grab_bot'}
+        elif endpoint == 'getWebhookInfo':
+            result = {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        elif endpoint in ('sendMessage', 'editMessageText'):
+            self.message_id += 1
+            result = {
+                'message_id': params.get('message_id', self.message_id), 'date': 0,
+                'chat': {'id': params['chat_id'], 'type': 'private'}, 'text': params.get('text', ''),
+            }
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+class UpdateFactory:
+    """Builds raw update dicts with increasing update ids."""
+
+    def __init__(self):
+        self.update_id = 0
+
+    def _next_id(self) -> int:
+        self.update_id += 1
+        return self.update_id
+
+    def message(self, user_id: int, text: str) -> dict:
+        update_id = self._next_id()
+        message = {
+            'message_id': update_id, 'date': 0, 'text': text,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"},
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': update_id, 'message': message}
+
+    def callback(self, user_id: int, data: str) -> dict:
+        update_id = self._next_id()
+        return {'update_id': update_id, 'callback_query': {
+            'id': str(update_id), 'chat_instance': str(user_id), 'data': data,
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"},
+            'message': {'message_id': 1, 'date': 0, 'chat': {'id': user_id, 'type': 'private'}, 'text': 'menu'},
+        }}
+
+
+def scenario_steps(kind: str, rng: random.Random, catalog, topup_screen: int = 1):
+    """Return the (is_callback, payload) steps of one user session.
+
+    ``topup_screen`` is the number the bot gives this user's next top-up screen.
+    """
+    if kind == 'start':
+        return [(False, '/start')]
+    if kind == 'menu':
+        return [(True, rng.choice(MENU_TAPS)), (True, 'main_menu')]
+    if kind == 'food':
+        restaurant = rng.choice(catalog.restaurants)
+        item = rng.choice(restaurant.items)
+        return [(True, 'order_food'), (True, f"rest_{restaurant.id}"), (True, f"food_{item.id}")]
+    if kind == 'ride':
+        pickup, destination = rng.sample(PLACES, 2)
+        ride = rng.randrange(len(bot.estimator.vehicles))
+        return [(True, 'book_ride'), (False, pickup), (False, destination), (True, f"ride_{ride}")]
+    if kind == 'topup':
+        return [(True, 'my_wallet'), (True, 'topup'), (True, f"topup_{rng.choice(TOPUP_AMOUNTS)}_{topup_screen}")]
+    if kind == 'text':
+        # Free text matched to an intent; a ride request with both places goes straight to the quotes
+        pickup, destination = rng.sample(PLACES, 2)
+        return rng.choice((
+            [(False, f"book a ride from {pickup} to {destination}"),
+             (True, f"ride_{rng.randrange(len(bot.estimator.vehicles))}")],
+            [(False, "where is my order?")],
+            [(False, "I'm hungry")],
+            [(False, "what's my balance")],
+        ))
+    raise ValueError(f"Unknown scenario: {kind}")
+
+
+def generate_updates(count: int, users: int, mix: dict, seed: int = 1):
+    """Yield (scenario, update dict) pairs with user sessions interleaved."""
+    rng = random.Random(seed)
+    catalog = bot.catalog.get()
+    factory = UpdateFactory()
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    sessions = defaultdict(list)
+    topup_screens = Counter()
+    for _ in range(count):
+        user_id = 10_000 + rng.randrange(users)
+        steps = sessions[user_id]
+        if not steps:
+            kind = rng.choices(kinds, weights)[0]
+            if kind == 'topup':
+                topup_screens[user_id] += 1
+            scenario = scenario_steps(kind, rng, catalog, topup_screens[user_id])
+            steps.extend((kind, step) for step in reversed(scenario))
+        kind, (is_callback, payload) = steps.pop()
+        if is_callback:
+            yield kind, factory.callback(user_id, payload)
+        else:
+            yield kind, factory.message(user_id, payload)
+
+
+def rss_kb() -> int:
+    """Current resident set size in KiB."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentiles(samples) -> dict:
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    last = len(samples) - 1
+    return {
+        'p50': round(samples[int(last * 0.50)] * 1000, 4),
+        'p95': round(samples[int(last * 0.95)] * 1000, 4),
+        'p99': round(samples[int(last * 0.99)] * 1000, 4),
+        'max': round(samples[-1] * 1000, 4),
+    }
+
+
+async def run(stream, warmup: int) -> dict:
+    api = FakeBotAPI()
+    application = bot.build_application(
+        Application.builder().token(bot.BOT_TOKEN).request(api).get_updates_request(FakeBotAPI()).updater(None)
+    )
+    errors = []
+
+    async def count_errors(update, context):
+        errors.append(repr(context.error))
+
+    application.add_error_handler(count_errors)
+
+    latencies = []
+    by_scenario = defaultdict(list)
+    async with application:
+        await application.post_init(application)
+        processed = 0
+        rss_start = rss_kb()
+        start = time.perf_counter()
+        for kind, data in stream:
+            update = Update.de_json(data, application.bot)
+            began = time.perf_counter()
+            await application.process_update(update)
+            elapsed = time.perf_counter() - began
+            processed += 1
+            if processed == warmup:
+                rss_start = rss_kb()
+                start = time.perf_counter()
+            elif processed > warmup:
+                latencies.append(elapsed)
+                by_scenario[kind].append(elapsed)
+        total = time.perf_counter() - start
+        rss_end = rss_kb()
+        await application.post_stop(application)
+    await application.post_shutdown(application)
+
+    measured = len(latencies)
+    return {
+        'updates': measured,
+        'elapsed_s': round(total, 3),
+        'updates_per_sec': round(measured / total, 1) if total else 0.0,
+        'latency_ms': percentiles(latencies),
+        'by_scenario': {
+            kind: {'updates': len(samples), **percentiles(samples)}
+            for kind, samples in sorted(by_scenario.items())
+        },
+        'memory': {
+            'rss_start_kb': rss_start,
+            'rss_end_kb': rss_end,
+            'growth_kb': rss_end - rss_start,
+            'growth_bytes_per_update': round((rss_end - rss_start) * 1024 / measured, 1) if measured else 0.0,
+        },
+        'api_calls': dict(api.calls),
+        'errors': len(errors),
+        'first_errors': errors[:5],
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(result: dict, baseline: dict) -> None:
+    rows = [('updates/s', result['updates_per_sec'], baseline['updates_per_sec'])]
+    for key in ('p50', 'p95', 'p99'):
+        rows.append((f"{key} ms", result['latency_ms'][key], baseline['latency_ms'][key]))
+    rows.append(('mem growth KiB', result['memory']['growth_kb'], baseline['memory']['growth_kb']))
+    print(f"\nvs {baseline.get('commit', '?')}:")
+    print(f"{'metric':>15} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, now, before in rows:
+        change = f"{(now - before) / before * 100:+.1f}%" if before else 'n/a'
+        print(f"{name:>15} {before:>10} {now:>10} {change:>8}")
+
+
+def main(args) -> None:
+    logging.getLogger().setLevel(args.log_level)
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, args.mix.split(',')):
+        name, _, weight = part.partition('=')
+        mix[name] = float(weight)
+
+    if args.record:
+        with open(args.record, 'w') as f:
+            for _, data in generate_updates(args.count, args.users, mix, args.seed):
+                f.write(json.dumps(data) + '\n')
+        return
+
+    if args.updates:
+        def replay():
+            with open(args.updates) as f:
+                for line in f:
+                    if line.strip():
+                        yield 'replay', json.loads(line)
+        stream = replay()
+    else:
+        stream = generate_updates(args.count, args.users, mix, args.seed)
+
+    result = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'python_telegram_bot': telegram.__version__,
+        'params': {
+            'count': args.count, 'users': args.users, 'mix': mix, 'seed': args.seed,
+            'warmup': args.warmup, 'updates_file': args.updates, 'storage': bot.STORAGE_BACKEND,
+        },
+        **asyncio.run(run(stream, args.warmup)),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=20_000, help="updates to generate")
+    parser.add_argument('--users', type=int, default=1000, help="simulated users")
+    parser.add_argument('--mix', default='', help="scenario weights, e.g. 'food=5,ride=1'")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=500, help="updates to run before measuring")
+    parser.add_argument('--updates', help="replay updates from this JSONL file instead")
+    parser.add_argument('--record', help="write the generated updates to this JSONL file and exit")
+    parser.add_argument('--output', help="save the results as JSON")
+    parser.add_argument('--compare', help="compare with results saved by --output")
+    parser.add_argument('--log-level', default='WARNING')
+    main(parser.parse_args())
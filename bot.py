@@ -1,27 +1,73 @@
 import os
+import asyncio
+import atexit
+import functools
+import gc
+import html
 import logging
+import queue
+import secrets
+import sys
+import time
 import uuid
-from datetime import datetime, timedelta
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from logging.handlers import QueueHandler, QueueListener
+from telegram import Bot, Update
 from telegram.ext import (
     Application, 
     CommandHandler, 
     MessageHandler, 
     CallbackQueryHandler,
     ConversationHandler,
+    TypeHandler,
     filters, 
     ContextTypes
 )
 from dotenv import load_dotenv
 
+import render
+from catalog import CatalogStore, format_price
+from order_store import DELIVERED, Order, OrderStore
+from storage import create_storage
+from wallet import format_amount, to_minor
+from router import CallbackRouter
+from webhook import WebhookServer, run_webhook
+from outbound import NOTIFICATION, OutboundScheduler
+from lifecycle import OrderLifecycle
+from dispatch import KUALA_LUMPUR, Driver, Fleet, FleetSimulator, generate_fleet
+from places import load_gazetteer
+from intents import IntentMatcher
+from promotions import load_promotions
+from locales import load_locales
+from broadcast import Broadcaster
+from tickets import Ticket, create_ticket_store, new_reference
+from pricing import FareEstimator, SurgePricer
+from persistence import SQLitePersistence
+from processor import KeyedUpdateProcessor
+from snapshot import load_snapshot, save_snapshot
+from sharding import Ingress, IngressWebhookServer, WorkerPool, WorkerServer, run_ingress, run_worker
+import metrics
+
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+
+
+class _QueueHandler(QueueHandler):
+    """Queue records unformatted; the listener thread formats them."""
+
+    def prepare(self, record):
+        return record
+
+
+# Configure logging: records are queued and written by a background thread,
+# so logging I/O never blocks update processing
+log_queue = queue.SimpleQueue()
+log_output = logging.StreamHandler()
+log_output.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = QueueListener(log_queue, log_output)
+logging.basicConfig(handlers=[_QueueHandler(log_queue)], level=logging.INFO)
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # Get bot token from environment variable
@@ -30,537 +76,1228 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN environment variable is not set!")
 
+# Serving mode: 'polling' (default) or 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('PORT', 8443))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+WEBHOOK_MAX_BODY = int(os.getenv('WEBHOOK_MAX_BODY', 1024 * 1024))
+
+# Bot API server, overridable for local testing against a fake server
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL environment variable is required in webhook mode!")
+
+# Updates sent while the bot was down are answered once it is up, unless
+# DROP_PENDING_UPDATES=true discards them
+DROP_PENDING_UPDATES = os.getenv('DROP_PENDING_UPDATES', 'false').lower() in ('1', 'true', 'yes')
+
 # Conversation states
 (RIDE_PICKUP, RIDE_DESTINATION, FOOD_RESTAURANT, FOOD_ITEM, 
- TRACKING, WALLET_ACTION, SUPPORT_ISSUE) = range(7)
+ TRACKING, WALLET_ACTION, SUPPORT_ISSUE, RIDE_VEHICLE) = range(8)
 
-# Mock data storage (in production, use a database)
-user_data = {}
-orders = {}
+# user_data keys of a ride being booked
+RIDE_KEYS = ('ride_type', 'pickup', 'pickup_location', 'destination', 'destination_location',
+             'destination_text', 'surge')
 
+# How long delivered orders are kept before eviction (seconds)
+ORDER_RETENTION_SECONDS = float(os.getenv('ORDER_RETENTION_SECONDS', 24 * 3600))
 
-def get_main_menu():
-    """Create the main menu inline keyboard."""
-    keyboard = [
-        [
-            InlineKeyboardButton("🚗 Book a Ride", callback_data="book_ride"),
-            InlineKeyboardButton("🍔 Order Food", callback_data="order_food")
-        ],
-        [
-            InlineKeyboardButton("📦 Track Order", callback_data="track_order"),
-            InlineKeyboardButton("💳 My Wallet", callback_data="my_wallet")
-        ],
-        [
-            InlineKeyboardButton("🎁 Promotions", callback_data="promotions"),
-            InlineKeyboardButton("📞 Support", callback_data="support")
-        ],
-        [
-            InlineKeyboardButton("ℹ️ About Grab", callback_data="about"),
-            InlineKeyboardButton("⚙️ Settings", callback_data="settings")
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+# Storage backend: 'memory' (lost on restart) or 'sqlite'
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'memory')
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'grab.db')
+
+orders = OrderStore(retention=ORDER_RETENTION_SECONDS)
+storage = create_storage(STORAGE_BACKEND, orders, DATABASE_PATH)
+
+# With sqlite, conversation states and context.user_data survive restarts;
+# changes are written every PERSISTENCE_INTERVAL seconds
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', 1.0))
+persistence = SQLitePersistence(DATABASE_PATH, PERSISTENCE_INTERVAL) if STORAGE_BACKEND == 'sqlite' else None
+
+# Orders move through their statuses on a timer and users are notified.
+# ORDER_TIME_SCALE shortens every step, e.g. 0.01 for a demo
+ORDER_TIME_SCALE = float(os.getenv('ORDER_TIME_SCALE', 1.0))
+ORDER_TICK_SECONDS = float(os.getenv('ORDER_TICK_SECONDS', 1.0))
+lifecycle = OrderLifecycle(orders, time_scale=ORDER_TIME_SCALE, tick=ORDER_TICK_SECONDS)
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_order_steps_pending', "Order status changes scheduled.", lambda: lifecycle.pending
+))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_order_status_changes_total', "Order status changes applied.", lambda: lifecycle.changed, 'counter'
+))
+
+# Restaurant catalog, reloaded when the file changes
+CATALOG_PATH = os.getenv('CATALOG_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'catalog.json'))
+catalog = CatalogStore(CATALOG_PATH)
+
+# Gazetteer that typed pickups and destinations are resolved against, and
+# how many recent resolutions and suggestions are cached
+PLACES_PATH = os.getenv('PLACES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'places.csv'))
+PLACES_CACHE_SIZE = int(os.getenv('PLACES_CACHE_SIZE', 10_000))
+places = load_gazetteer(PLACES_PATH, cache_size=PLACES_CACHE_SIZE)
+# The gazetteer lives as long as the process; keep full garbage collections
+# from walking its (possibly millions of) entries again and again
+gc.freeze()
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_place_cache_hits_total', "Typed addresses resolved from the cache.",
+    lambda: places.resolve.cache_info().hits, 'counter'
+))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_place_cache_misses_total', "Typed addresses resolved against the gazetteer.",
+    lambda: places.resolve.cache_info().misses, 'counter'
+))
+
+# Recent places offered as one-tap pickups and destinations
+RECENT_PLACES = 4
+
+# Free-text messages ("book a ride to KLCC", "top up 50") are matched to the
+# bot's services; the intents of recent messages are cached
+intents = IntentMatcher()
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_intent_cache_hits_total', "Free-text messages classified from the cache.",
+    lambda: intents.classify.cache_info().hits, 'counter'
+))
+
+# Inline button callbacks are dispatched by action name
+router = CallbackRouter()
+
+# Transactions on the wallet screen and per history page
+RECENT_TRANSACTIONS = 3
+HISTORY_PAGE_SIZE = 8
+
+# Outgoing messages per second across all chats; 0 disables the send scheduler
+SEND_RATE_LIMIT = float(os.getenv('SEND_RATE_LIMIT', 30))
+
+# Updates processed at once across users; each user's updates stay in order.
+# 1 processes all updates one at a time
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', 64))
+
+# With WORKERS > 1 this process only receives updates and hands each user's
+# updates to one of WORKERS worker processes, which share the sqlite database
+WORKERS = int(os.getenv('WORKERS', 1))
+# Set by the ingress on the worker processes it starts
+WORKER_NAME = os.getenv('WORKER_NAME')
+WORKER_SOCKET = os.getenv('WORKER_SOCKET')
+
+if WORKERS > 1 and STORAGE_BACKEND != 'sqlite':
+    raise ValueError("WORKERS > 1 requires STORAGE_BACKEND=sqlite!")
+
+# Simulated driver fleet: FLEET_SIZE drivers around Kuala Lumpur, of which
+# FLEET_MOVES report a new position every second. Rides get the nearest
+# available driver within DISPATCH_RADIUS_KM of the pickup
+FLEET_SIZE = int(os.getenv('FLEET_SIZE', 2000))
+FLEET_MOVES = int(os.getenv('FLEET_MOVES', 200))
+DISPATCH_RADIUS_KM = float(os.getenv('DISPATCH_RADIUS_KM', 15))
+fleet = Fleet(max_km=DISPATCH_RADIUS_KM)
+# Each worker process dispatches its own share of the drivers
+worker_index = int(WORKER_NAME[1:]) % WORKERS if WORKER_NAME else 0
+
+# Fast start: the fleet's positions and recent demand for surge pricing are
+# saved to SNAPSHOT_PATH (one file per worker) on shutdown and read back on
+# boot instead of being built from scratch. Unset, nothing is saved
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', '')
+snapshot_path = f"{SNAPSHOT_PATH}.{WORKER_NAME}" if SNAPSHOT_PATH and WORKER_NAME else SNAPSHOT_PATH
+SNAPSHOT_KEY = (FLEET_SIZE, WORKERS, worker_index)
+warm_state = load_snapshot(snapshot_path, SNAPSHOT_KEY) if snapshot_path else None
+
+if warm_state is not None:
+    drivers = [Driver(*row) for row in warm_state[0]['drivers']]
+else:
+    drivers = generate_fleet(FLEET_SIZE)[worker_index::WORKERS]
+for driver in drivers:
+    fleet.add(driver)
+del drivers
+fleet_simulator = FleetSimulator(fleet, FLEET_MOVES // WORKERS)
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_drivers_available', "Drivers free to take a ride.", lambda: fleet.available
+))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_drivers_assigned', "Drivers on a ride.", lambda: fleet.assigned
+))
+
+# Fares and trip times for every ride type, with routes memoized per pair of
+# grid cells. Fares surge up to SURGE_MAX times where bookings outnumber
+# free drivers
+estimator = FareEstimator()
+SURGE_MAX = float(os.getenv('SURGE_MAX', 2.0))
+surge = SurgePricer(fleet, max_surge=SURGE_MAX)
+if warm_state is not None:
+    surge.restore(warm_state[0]['demand'], time.time() - warm_state[1])
+    warm_state = None
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_route_cache_hits_total', "Trip distances answered from the route cache.",
+    lambda: estimator.route.cache_info().hits, 'counter'
+))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_surge_zones', "Zones where fares are surging.", lambda: surge.surging
+))
+
+# Languages the bot speaks: English plus a message catalog per language in
+# LOCALES_PATH, compiled at startup. Each user gets the language they chose
+# in Settings, else their Telegram app's
+LOCALES_PATH = os.getenv('LOCALES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'locales'))
+locales = load_locales(LOCALES_PATH)
+
+# Promotion codes and automatic promotions, applied at checkout. Each worker
+# process redeems its share of a code's total redemptions
+PROMOTIONS_PATH = os.getenv('PROMOTIONS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'promotions.json'))
+promotions = load_promotions(PROMOTIONS_PATH, worker=(worker_index, WORKERS))
+PROMOTIONS_SCREENS = {lang: render.promotions_screen(promotions.listed(), lang) for lang in locales}
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_promotions_redeemed_total', "Promotions applied to orders.", lambda: promotions.redeemed, 'counter'
+))
+# Codes a user can have entered at once, most recent first
+MAX_PROMO_CODES = 10
+# Delivery fee added to food orders, in ringgit
+DELIVERY_FEE = float(os.getenv('DELIVERY_FEE', 4.0))
+
+# Users allowed to /broadcast, comma-separated Telegram user ids. Broadcasts
+# send at most BROADCAST_RATE messages per second, leaving the rest of
+# SEND_RATE_LIMIT to replies
+ADMIN_IDS = frozenset(int(user_id) for user_id in os.getenv('ADMIN_IDS', '').split(',') if user_id.strip())
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 20))
+
+
+async def broadcast_done(broadcast) -> None:
+    if broadcast.admin is not None:
+        await broadcaster.bot.send_message(chat_id=broadcast.admin, **render.BROADCAST_DONE.render(
+            id=broadcast.id, sent=broadcast.sent, pruned=broadcast.pruned, failed=broadcast.failed
+        ))
+
+
+broadcaster = Broadcaster(storage, rate=BROADCAST_RATE or None, done=broadcast_done)
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_broadcasts_running', "Broadcasts being sent.", lambda: len(broadcaster.running)
+))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_broadcast_messages_total', "Broadcast messages sent.", lambda: broadcaster.sent, 'counter'
+))
+
+# Support tickets, stored in batches and searchable by agents: the users in
+# AGENT_IDS (comma-separated) and the admins
+tickets = create_ticket_store(STORAGE_BACKEND, DATABASE_PATH)
+AGENT_IDS = ADMIN_IDS | frozenset(
+    int(user_id) for user_id in os.getenv('AGENT_IDS', '').split(',') if user_id.strip()
+)
+# Tickets listed per agent command
+TICKETS_PAGE_SIZE = 10
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_tickets_total', "Support tickets filed.", lambda: tickets.added, 'counter'
+))
+metrics.REGISTRY.register(metrics.FunctionMetric(
+    'bot_tickets_pending', "Support tickets waiting to be stored.", lambda: tickets.pending
+))
+
+# Prometheus metrics endpoint; METRICS_PORT=0 disables it
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9090))
+metrics_server = metrics.MetricsServer(listen=METRICS_LISTEN, port=METRICS_PORT) if METRICS_PORT else None
+
+# Conversation state labels in metrics
+STATE_NAMES = {
+    RIDE_PICKUP: 'ride_pickup',
+    RIDE_DESTINATION: 'ride_destination',
+    RIDE_VEHICLE: 'ride_vehicle',
+    FOOD_RESTAURANT: 'food_restaurant',
+    FOOD_ITEM: 'food_item',
+    TRACKING: 'tracking',
+    WALLET_ACTION: 'wallet_action',
+    SUPPORT_ISSUE: 'support_issue',
+}
+
+
+def user_locale(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """The user's language: the one they chose in Settings, else their
+    Telegram app's, remembered so that notifications use it too."""
+    data = context.user_data
+    if data is None:
+        return locales.default
+    code = data.get('locale')
+    if code is None:
+        user = update.effective_user
+        code = data['locale'] = locales.get(user.language_code if user else None).code
+    return locales.get(code)
+
+
+def stored_locale(application: Application, user_id: int):
+    """The language of a user the bot is not replying to, e.g. for a notification."""
+    data = application.user_data.get(user_id)
+    return locales.get(data.get('locale') if data else None)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
     try:
         user = update.effective_user
-        logger.info(f"Received /start command from user {user.id} (@{user.username})")
-        
-        welcome_message = (
-            f"👋 <b>Welcome to Grab, {user.first_name}!</b>\n\n"
-            f"Your everyday everything app.\n\n"
-            f"🚗 <b>Ride</b> - Book a car or bike\n"
-            f"🍔 <b>Food</b> - Order from restaurants\n"
-            f"📦 <b>Deliveries</b> - Send packages\n"
-            f"💳 <b>Payments</b> - GrabPay wallet\n\n"
-            f"What would you like to do today?"
-        )
-        
-        await update.message.reply_html(
-            welcome_message,
-            reply_markup=get_main_menu()
-        )
-        logger.info(f"Successfully sent start message to user {user.id}")
+        await update.message.reply_text(**user_locale(update, context).WELCOME.render(first_name=user.first_name))
+        logger.info("Sent /start reply to user %s (@%s)", user.id, user.username)
     except Exception as e:
-        logger.error(f"Error in start handler: {e}", exc_info=True)
+        logger.error("Error in start handler: %s", e, exc_info=True)
         try:
-            await update.message.reply_text(
-                "Welcome to Grab! Use /menu to see options.",
-                reply_markup=get_main_menu()
-            )
+            await update.message.reply_text(**render.START_FALLBACK)
         except:
             pass
 
 
 async def menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show the main menu."""
-    await update.message.reply_text(
-        "📱 <b>Grab Main Menu</b>\n\nWhat would you like to do?",
-        reply_markup=get_main_menu(),
-        parse_mode='HTML'
-    )
+    await update.message.reply_text(**user_locale(update, context).MAIN_MENU_SCREEN)
 
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle button callbacks."""
     query = update.callback_query
     await query.answer()
-    
+    return await router.dispatch(update, context)
+
+
+@router.action("book_ride")
+async def show_book_ride(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Ask for the ride pickup location."""
+    forget_ride(context)
+    await update.callback_query.edit_message_text(
+        **render.book_ride_screen(recent_places(context), user_locale(update, context))
+    )
+    context.user_data['ride_type'] = 'car'
+    return RIDE_PICKUP
+
+
+@router.action("order_food")
+async def show_restaurants(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show the first page of the restaurant list."""
+    await update.callback_query.edit_message_text(
+        **catalog.get().restaurants_page(0, user_locale(update, context))
+    )
+    return FOOD_RESTAURANT
+
+
+@router.action("restaurants", int)
+async def show_restaurants_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int) -> int:
+    """Show another page of the restaurant list."""
+    await update.callback_query.edit_message_text(
+        **catalog.get().restaurants_page(page, user_locale(update, context))
+    )
+    return FOOD_RESTAURANT
+
+
+@router.action("track_order")
+async def show_track_order(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show the status of the user's latest order."""
+    await update.callback_query.edit_message_text(
+        **await track_order_screen(update.effective_user.id, user_locale(update, context))
+    )
+    return ConversationHandler.END
+
+
+async def track_order_screen(user_id: int, lang) -> dict:
+    """The status screen of the user's latest order."""
+    latest = await storage.latest_order(user_id)
+    if not latest:
+        return lang.NO_ACTIVE_ORDERS
+    # Orders read back after a restart pick up their schedule here
+    lifecycle.schedule(latest)
+    status = latest.status
+    order_type = lang.ORDER_TYPES.get(latest.type, latest.type)
+    return lang.TRACK_ORDER.render(
+        order_id=latest.id,
+        order_type=order_type,
+        status=lang.STATUSES.get(status, status),
+        status_emoji=render.STATUS_EMOJI.get(status, '📦'),
+        eta=lifecycle.eta(latest),
+        note=lang.TRACK_NOTES[status].format(order=order_type.lower())
+    )
+
+
+@router.action("my_wallet")
+async def show_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show the GrabPay wallet."""
+    await update.callback_query.edit_message_text(
+        **await wallet_screen(update.effective_user.id, user_locale(update, context))
+    )
+    return WALLET_ACTION
+
+
+async def wallet_screen(user_id: int, lang) -> dict:
+    """The user's balance and recent transactions."""
+    balance = await storage.get_balance(user_id)
+    recent = await storage.transactions(user_id, 0, RECENT_TRANSACTIONS)
+    return lang.WALLET.render(
+        balance=format_amount(balance),
+        recent='\n'.join(f"• {tx.describe()}" for tx in recent) or lang.NO_TRANSACTIONS
+    )
+
+
+@router.action("history")
+async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the newest page of the transaction history."""
+    await show_history_page(update, context, 0)
+
+
+@router.action("history", int)
+async def show_history_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int) -> None:
+    """Show a page of the transaction history, newest first."""
+    query = update.callback_query
+    page = max(page, 0)
+    # One extra row tells whether there is a next page
+    entries = await storage.transactions(query.from_user.id, page * HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE + 1)
+    await query.edit_message_text(**render.history_screen(
+        [tx.describe() for tx in entries[:HISTORY_PAGE_SIZE]], page, len(entries) > HISTORY_PAGE_SIZE,
+        user_locale(update, context)
+    ))
+
+
+@router.action("promotions")
+async def show_promotions(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show current promotions."""
+    await update.callback_query.edit_message_text(**PROMOTIONS_SCREENS[user_locale(update, context)])
+    return ConversationHandler.END
+
+
+@router.action("support")
+async def show_support(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Ask the user to describe their issue."""
+    await update.callback_query.edit_message_text(**user_locale(update, context).SUPPORT)
+    return SUPPORT_ISSUE
+
+
+@router.action("about")
+async def show_about(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show information about Grab."""
+    await update.callback_query.edit_message_text(**user_locale(update, context).ABOUT)
+    return ConversationHandler.END
+
+
+@router.action("settings")
+async def show_settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show the user's settings."""
+    await update.callback_query.edit_message_text(**user_locale(update, context).SETTINGS)
+    return ConversationHandler.END
+
+
+@router.action("language")
+async def show_languages(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Offer the languages the bot speaks."""
+    await update.callback_query.edit_message_text(
+        **render.languages_screen(locales.languages, user_locale(update, context))
+    )
+
+
+@router.action("language", str)
+async def choose_language(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str) -> None:
+    """Switch the user to another language and show their settings in it."""
+    lang = locales.get(code)
+    context.user_data['locale'] = lang.code
+    await update.callback_query.edit_message_text(**lang.SETTINGS)
+
+
+@router.action("main_menu")
+async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Return to the main menu."""
+    await update.callback_query.edit_message_text(**user_locale(update, context).MAIN_MENU_SCREEN)
+    return ConversationHandler.END
+
+
+@router.action("rest", int)
+async def show_restaurant_menu(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                               restaurant_id: int) -> int:
+    """Show the first page of the selected restaurant's menu."""
+    return await show_menu_page(update, context, restaurant_id, 0)
+
+
+@router.action("menu", int, int)
+async def show_menu_page(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                         restaurant_id: int, page: int) -> int:
+    """Show a page of a restaurant's menu."""
+    query = update.callback_query
+    lang = user_locale(update, context)
+    menu_screen = catalog.get().menu_page(restaurant_id, page, lang)
+    if menu_screen is None:
+        await query.edit_message_text(**catalog.get().restaurants_page(0, lang))
+        return FOOD_RESTAURANT
+    await query.edit_message_text(**menu_screen)
+    return FOOD_ITEM
+
+
+def add_promo_code(context: ContextTypes.DEFAULT_TYPE, promotion, lang) -> dict:
+    """Keep a code the user sent for their next orders."""
+    codes = [promotion.code] + [code for code in context.user_data.get('promo_codes', ()) if code != promotion.code]
+    context.user_data['promo_codes'] = codes[:MAX_PROMO_CODES]
+    return lang.PROMO_ADDED.render(code=promotion.code, title=html.escape(promotion.title))
+
+
+def find_promos(context: ContextTypes.DEFAULT_TYPE, order_type: str, amount: int, fee: int = 0) -> tuple:
+    """The best promotions for an order of ``amount`` sen plus a delivery ``fee``."""
+    data = context.user_data
+    return promotions.best(order_type, amount, fee, data.get('promo_codes', ()), data.get('promo_uses'),
+                           data.get('order_counts', {}).get(order_type, 0))
+
+
+async def checkout(context: ContextTypes.DEFAULT_TYPE, user_id: int, order_type: str, order_id: str,
+                   amount: int, fee: int = 0) -> tuple:
+    """Redeem the best promotions for an order, count the order and credit
+    any cashback. Returns the promotions applied."""
+    # Finding and redeeming happen without an await in between
+    applied = promotions.redeem(find_promos(context, order_type, amount, fee),
+                                context.user_data.setdefault('promo_uses', {}))
+    counts = context.user_data.setdefault('order_counts', {})
+    counts[order_type] = counts.get(order_type, 0) + 1
+    for found in applied:
+        storage.record_redemption(found.promotion.code, worker_index)
+        if found.promotion.kind == 'cashback':
+            await storage.record_transaction(user_id, 'cashback', found.value, key=f"cashback-{order_id}")
+    return applied
+
+
+def discount(applied) -> int:
+    """What ``applied`` promotions take off the price, in sen (cashback is paid later)."""
+    return sum(found.value for found in applied if found.promotion.kind != 'cashback')
+
+
+@router.action("food", int)
+async def place_food_order(update: Update, context: ContextTypes.DEFAULT_TYPE, item_id: int) -> int:
+    """Place a food order for the selected item."""
+    query = update.callback_query
+    current = catalog.get()
+    item = current.items_by_id.get(item_id)
+    if item is None:
+        await query.edit_message_text(**current.restaurants_page(0, user_locale(update, context)))
+        return FOOD_RESTAURANT
+    restaurant_name = current.restaurants_by_id[item.restaurant_id].name
+
+    order_id = str(uuid.uuid4())[:8].upper()
+    order = Order(
+        id=order_id,
+        user_id=query.from_user.id,
+        type='Food',
+        restaurant=restaurant_name,
+        status='Preparing'
+    )
+    order.eta = lifecycle.eta(order)
+    lifecycle.schedule(storage.add_order(order))
+    price, fee = to_minor(item.price), to_minor(DELIVERY_FEE)
+    applied = await checkout(context, order.user_id, 'Food', order_id, price, fee)
+
+    lang = user_locale(update, context)
+    await query.edit_message_text(**lang.ORDER_PLACED.render(
+        order_id=order_id,
+        restaurant=current.restaurant_html[item.restaurant_id],
+        item=current.item_html[item.id],
+        price=format_price(item.price),
+        delivery=format_amount(fee),
+        promos=render.promo_lines(applied, lang),
+        total=format_amount(price + fee - discount(applied)),
+        eta=order.eta
+    ))
+    return ConversationHandler.END
+
+
+@router.action("topup")
+async def show_topup(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the top-up amounts.
+
+    Each top-up screen gets a number, carried in its buttons, that can be
+    spent once: a second tap on the same screen (a double tap, or tapping
+    again before the edit arrives) credits nothing.
+    """
+    await update.callback_query.edit_message_text(
+        **render.topup_screen(open_topup(context), user_locale(update, context))
+    )
+
+
+def open_topup(context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Number a new top-up screen and make it the one that can be spent."""
+    screen_id = context.user_data.get('topup_screens', 0) + 1
+    context.user_data['topup_screens'] = screen_id
+    context.user_data['topup_open'] = screen_id
+    return screen_id
+
+
+@router.action("topup", int, int)
+async def topup_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE, amount: int, screen_id: int) -> None:
+    """Credit the wallet with the selected amount."""
+    query = update.callback_query
+    if amount not in render.TOPUP_AMOUNTS or context.user_data.get('topup_open') != screen_id:
+        return
+    del context.user_data['topup_open']
     user_id = query.from_user.id
-    
-    if query.data == "book_ride":
-        await query.edit_message_text(
-            "🚗 <b>Book a Ride</b>\n\n"
-            "Please share your pickup location.\n\n"
-            "You can send:\n"
-            "📍 Your current location (location button)\n"
-            "📝 Or type your address",
-            parse_mode='HTML'
+    # The callback query id makes a redelivered update a no-op too
+    tx, _ = await storage.record_transaction(user_id, 'topup', to_minor(amount), key=query.id, durable=True)
+    balance = await storage.get_balance(user_id)
+    await query.edit_message_text(**user_locale(update, context).TOPUP_DONE.render(
+        amount=format_amount(tx.amount), balance=format_amount(balance)
+    ))
+
+
+def forget_ride(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop the ride being booked, keeping the rest of the user's data."""
+    for key in RIDE_KEYS:
+        context.user_data.pop(key, None)
+
+
+def recent_places(context: ContextTypes.DEFAULT_TYPE, exclude: str = None) -> tuple:
+    """The user's recent places, most recent first, except one named ``exclude``."""
+    found = (places.get(place_id) for place_id in context.user_data.get('recent_places', ()))
+    return tuple(place for place in found if place is not None and place.name != exclude)
+
+
+def remember_place(context: ContextTypes.DEFAULT_TYPE, place) -> None:
+    """Move ``place`` to the front of the user's recent places."""
+    recent = [place.id] + [i for i in context.user_data.get('recent_places', ()) if i != place.id]
+    context.user_data['recent_places'] = recent[:RECENT_PLACES]
+
+
+def set_pickup(context: ContextTypes.DEFAULT_TYPE, pickup: str, location=None) -> None:
+    """Record the pickup label and, if known, its ``(latitude, longitude)``."""
+    context.user_data.setdefault('ride_type', 'car')
+    context.user_data['pickup'] = pickup
+    if location:
+        context.user_data['pickup_location'] = list(location)
+    else:
+        context.user_data.pop('pickup_location', None)
+
+
+def pickup_screen(context: ContextTypes.DEFAULT_TYPE, lang) -> dict:
+    """Confirm the pickup and ask for the destination."""
+    pickup = context.user_data['pickup']
+    return render.ride_pickup_screen(pickup, recent_places(context, exclude=pickup), lang)
+
+
+async def after_pickup(update: Update, context: ContextTypes.DEFAULT_TYPE, reply) -> int:
+    """Ask for the destination, or go on to one given with the pickup."""
+    destination = context.user_data.pop('destination_text', None)
+    if destination is None:
+        await reply(**pickup_screen(context, user_locale(update, context)))
+        return RIDE_DESTINATION
+    return await take_destination(update, context, destination, reply)
+
+
+async def take_pickup(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, reply) -> int:
+    """Use a typed pickup address, or offer the places it may mean."""
+    place = places.resolve(text)
+    if place is not None:
+        remember_place(context, place)
+        set_pickup(context, place.name, (place.lat, place.lon))
+    else:
+        set_pickup(context, text)
+        suggestions = places.suggest(text)
+        if suggestions:
+            await reply(**render.place_suggestions_screen('pickup', text, suggestions, user_locale(update, context)))
+            return RIDE_PICKUP
+    return await after_pickup(update, context, reply)
+
+
+async def handle_ride_pickup(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle the ride pickup: a shared location or a typed address."""
+    location = update.message.location
+    if not location:
+        return await take_pickup(update, context, update.message.text, update.message.reply_text)
+    set_pickup(context, render.format_location(location.latitude, location.longitude),
+               (location.latitude, location.longitude))
+    return await after_pickup(update, context, update.message.reply_text)
+
+
+@router.action("pickup", int)
+async def choose_pickup(update: Update, context: ContextTypes.DEFAULT_TYPE, place_id: int) -> int:
+    """Use a suggested or recent place as the pickup."""
+    place = places.get(place_id)
+    if place is None:
+        await update.callback_query.edit_message_text(
+            **render.book_ride_screen(recent_places(context), user_locale(update, context))
         )
-        context.user_data['ride_type'] = 'car'
         return RIDE_PICKUP
-        
-    elif query.data == "order_food":
-        restaurants = [
-            "🍕 Pizza Express",
-            "🍜 Noodles House",
-            "🍗 Fried Chicken Co",
-            "🥗 Healthy Bites",
-            "🍱 Sushi Station"
-        ]
-        keyboard = [[InlineKeyboardButton(r, callback_data=f"rest_{i}")] 
-                   for i, r in enumerate(restaurants)]
-        keyboard.append([InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")])
-        
-        await query.edit_message_text(
-            "🍔 <b>Order Food</b>\n\n"
-            "Select a restaurant:",
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='HTML'
-        )
-        return FOOD_RESTAURANT
-        
-    elif query.data == "track_order":
-        user_orders = [o for o in orders.values() if o.get('user_id') == user_id]
-        if user_orders:
-            latest = user_orders[-1]
-            status = latest.get('status', 'Preparing')
-            order_type = latest.get('type', 'Order')
-            
-            status_emoji = {
-                'Preparing': '👨‍🍳',
-                'On the way': '🚗',
-                'Delivered': '✅'
-            }.get(status, '📦')
-            
-            await query.edit_message_text(
-                f"📦 <b>Track Your Order</b>\n\n"
-                f"Order ID: {latest.get('id', 'N/A')}\n"
-                f"Type: {order_type}\n"
-                f"Status: {status_emoji} {status}\n"
-                f"Estimated time: {latest.get('eta', '15-20 min')}\n\n"
-                f"Your {order_type.lower()} is on the way!",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔄 Refresh", callback_data="track_order"),
-                    InlineKeyboardButton("🔙 Back", callback_data="main_menu")
-                ]]),
-                parse_mode='HTML'
-            )
-        else:
-            await query.edit_message_text(
-                "📦 <b>No Active Orders</b>\n\n"
-                "You don't have any active orders right now.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")
-                ]]),
-                parse_mode='HTML'
-            )
-        return ConversationHandler.END
-        
-    elif query.data == "my_wallet":
-        balance = user_data.get(user_id, {}).get('wallet_balance', 50.00)
-        await query.edit_message_text(
-            f"💳 <b>GrabPay Wallet</b>\n\n"
-            f"Balance: <b>RM {balance:.2f}</b>\n\n"
-            f"Recent transactions:\n"
-            f"• Ride booking - RM 15.00\n"
-            f"• Food order - RM 28.50\n"
-            f"• Top-up - RM 100.00\n\n"
-            f"💡 Tip: Top up your wallet for faster checkout!",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("💵 Top Up", callback_data="topup")],
-                [InlineKeyboardButton("📜 Transaction History", callback_data="history")],
-                [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-            ]),
-            parse_mode='HTML'
-        )
-        return WALLET_ACTION
-        
-    elif query.data == "promotions":
-        await query.edit_message_text(
-            "🎁 <b>Promotions & Deals</b>\n\n"
-            "🔥 <b>Hot Deals:</b>\n\n"
-            "• 20% off on first 3 rides\n"
-            "   Code: GRAB20\n\n"
-            "• Free delivery on orders above RM 30\n"
-            "   Code: FREEDEL30\n\n"
-            "• RM 5 off on food orders\n"
-            "   Code: GRABFOOD5\n\n"
-            "• Weekend Special: 15% cashback\n"
-            "   Valid: Fri-Sun\n\n"
-            "💡 Apply these codes at checkout!",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")
-            ]]),
-            parse_mode='HTML'
-        )
-        return ConversationHandler.END
-        
-    elif query.data == "support":
-        await query.edit_message_text(
-            "📞 <b>Grab Support</b>\n\n"
-            "How can we help you today?\n\n"
-            "Common issues:\n"
-            "• Payment problems\n"
-            "• Order issues\n"
-            "• Account questions\n"
-            "• Refund requests\n\n"
-            "Please describe your issue:",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Back", callback_data="main_menu")
-            ]]),
-            parse_mode='HTML'
-        )
-        return SUPPORT_ISSUE
-        
-    elif query.data == "about":
-        await query.edit_message_text(
-            "ℹ️ <b>About Grab</b>\n\n"
-            "Grab is Southeast Asia's leading super-app, providing everyday services:\n\n"
-            "🚗 <b>Transport</b>\n"
-            "Safe and reliable rides\n\n"
-            "🍔 <b>Food Delivery</b>\n"
-            "Your favorite restaurants delivered\n\n"
-            "📦 <b>Logistics</b>\n"
-            "Send packages anywhere\n\n"
-            "💳 <b>Payments</b>\n"
-            "GrabPay wallet and more\n\n"
-            "Available in 8 countries across Southeast Asia!",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Back to Menu", callback_data="main_menu")
-            ]]),
-            parse_mode='HTML'
-        )
-        return ConversationHandler.END
-        
-    elif query.data == "settings":
-        await query.edit_message_text(
-            "⚙️ <b>Settings</b>\n\n"
-            "Language: English\n"
-            "Notifications: On\n"
-            "Payment Method: GrabPay\n"
-            "Preferred Vehicle: GrabCar\n\n"
-            "More settings coming soon!",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Back", callback_data="main_menu")
-            ]]),
-            parse_mode='HTML'
-        )
-        return ConversationHandler.END
-        
-    elif query.data == "main_menu":
-        await query.edit_message_text(
-            "📱 <b>Grab Main Menu</b>\n\nWhat would you like to do?",
-            reply_markup=get_main_menu(),
-            parse_mode='HTML'
-        )
-        return ConversationHandler.END
-        
-    elif query.data.startswith("rest_"):
-        restaurant_index = int(query.data.split("_")[1])
-        restaurant_names = [
-            "Pizza Express",
-            "Noodles House",
-            "Fried Chicken Co",
-            "Healthy Bites",
-            "Sushi Station"
-        ]
-        restaurant_name = restaurant_names[restaurant_index]
-        
-        menu_items = {
-            0: ["🍕 Margherita Pizza - RM 25", "🍕 Pepperoni Pizza - RM 28", "🍕 Hawaiian Pizza - RM 30"],
-            1: ["🍜 Beef Noodles - RM 18", "🍜 Chicken Noodles - RM 16", "🍜 Veggie Noodles - RM 14"],
-            2: ["🍗 Original Fried Chicken - RM 15", "🍗 Spicy Fried Chicken - RM 16", "🍗 Chicken Combo - RM 22"],
-            3: ["🥗 Caesar Salad - RM 20", "🥗 Greek Salad - RM 18", "🥗 Quinoa Bowl - RM 22"],
-            4: ["🍱 Salmon Sushi Set - RM 35", "🍱 Mixed Sushi - RM 30", "🍱 Tuna Roll - RM 25"]
-        }
-        
-        items = menu_items.get(restaurant_index, [])
-        keyboard = [[InlineKeyboardButton(item, callback_data=f"food_{restaurant_index}_{i}")] 
-                   for i, item in enumerate(items)]
-        keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="order_food")])
-        
-        await query.edit_message_text(
-            f"🍔 <b>{restaurant_name}</b>\n\n"
-            "Select an item:",
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='HTML'
-        )
-        return FOOD_ITEM
-        
-    elif query.data.startswith("food_"):
-        parts = query.data.split("_")
-        restaurant_index = int(parts[1])
-        item_index = int(parts[2])
-        
-        restaurant_names = ["Pizza Express", "Noodles House", "Fried Chicken Co", "Healthy Bites", "Sushi Station"]
-        restaurant_name = restaurant_names[restaurant_index]
-        
-        order_id = str(uuid.uuid4())[:8].upper()
-        order = {
-            'id': order_id,
-            'user_id': user_id,
-            'type': 'Food',
-            'restaurant': restaurant_name,
-            'status': 'Preparing',
-            'eta': '25-30 min',
-            'created_at': datetime.now()
-        }
-        orders[order_id] = order
-        
-        await query.edit_message_text(
-            f"✅ <b>Order Placed!</b>\n\n"
-            f"Order ID: <b>{order_id}</b>\n"
-            f"Restaurant: {restaurant_name}\n"
-            f"Status: 👨‍🍳 Preparing\n"
-            f"Estimated delivery: 25-30 minutes\n\n"
-            f"You can track your order anytime!",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("📦 Track Order", callback_data="track_order"),
-                InlineKeyboardButton("🔙 Menu", callback_data="main_menu")
-            ]]),
-            parse_mode='HTML'
+    remember_place(context, place)
+    set_pickup(context, place.name, (place.lat, place.lon))
+    return await after_pickup(update, context, update.callback_query.edit_message_text)
+
+
+@router.action("pickup")
+async def keep_typed_pickup(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Use the pickup as typed rather than a suggested place."""
+    if 'pickup' not in context.user_data:
+        await update.callback_query.edit_message_text(
+            **render.book_ride_screen(recent_places(context), user_locale(update, context))
         )
-        return ConversationHandler.END
-        
-    elif query.data == "topup":
-        await query.edit_message_text(
-            "💵 <b>Top Up Wallet</b>\n\n"
-            "Select amount:",
-            reply_markup=InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("RM 20", callback_data="topup_20"),
-                    InlineKeyboardButton("RM 50", callback_data="topup_50")
-                ],
-                [
-                    InlineKeyboardButton("RM 100", callback_data="topup_100"),
-                    InlineKeyboardButton("RM 200", callback_data="topup_200")
-                ],
-                [InlineKeyboardButton("🔙 Back", callback_data="my_wallet")]
-            ]),
-            parse_mode='HTML'
+        return RIDE_PICKUP
+    return await after_pickup(update, context, update.callback_query.edit_message_text)
+
+
+async def handle_ride_destination(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handle the ride destination: a shared location or a typed address."""
+    location = update.message.location
+    if location:
+        return await offer_rides(update, context, render.format_location(location.latitude, location.longitude),
+                                 (location.latitude, location.longitude), update.message.reply_text)
+    return await take_destination(update, context, update.message.text, update.message.reply_text)
+
+
+async def take_destination(update: Update, context: ContextTypes.DEFAULT_TYPE, destination: str, reply) -> int:
+    """Quote rides to a typed destination address, or offer the places it may mean."""
+    place = places.resolve(destination)
+    if place is not None:
+        remember_place(context, place)
+        return await offer_rides(update, context, place.name, (place.lat, place.lon), reply)
+    suggestions = places.suggest(destination)
+    if suggestions:
+        context.user_data['destination'] = destination
+        await reply(**render.place_suggestions_screen('dropoff', destination, suggestions, user_locale(update, context)))
+        return RIDE_DESTINATION
+    return await offer_rides(update, context, destination, None, reply)
+
+
+@router.action("dropoff", int)
+async def choose_destination(update: Update, context: ContextTypes.DEFAULT_TYPE, place_id: int) -> int:
+    """Use a suggested or recent place as the destination."""
+    place = places.get(place_id)
+    if 'pickup' not in context.user_data or place is None:
+        await update.callback_query.edit_message_text(
+            **render.book_ride_screen(recent_places(context), user_locale(update, context))
         )
-        
-    elif query.data.startswith("topup_"):
-        amount = float(query.data.split("_")[1])
-        if user_id not in user_data:
-            user_data[user_id] = {'wallet_balance': 50.00}
-        user_data[user_id]['wallet_balance'] += amount
-        
-        await query.edit_message_text(
-            f"✅ <b>Top Up Successful!</b>\n\n"
-            f"Amount: RM {amount:.2f}\n"
-            f"New Balance: RM {user_data[user_id]['wallet_balance']:.2f}\n\n"
-            f"Thank you for using GrabPay!",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Back to Wallet", callback_data="my_wallet")
-            ]]),
-            parse_mode='HTML'
+        return RIDE_PICKUP
+    remember_place(context, place)
+    return await offer_rides(update, context, place.name, (place.lat, place.lon),
+                             update.callback_query.edit_message_text)
+
+
+@router.action("dropoff")
+async def keep_typed_destination(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Use the destination as typed rather than a suggested place."""
+    destination = context.user_data.get('destination')
+    if 'pickup' not in context.user_data or destination is None:
+        await update.callback_query.edit_message_text(
+            **render.book_ride_screen(recent_places(context), user_locale(update, context))
         )
+        return RIDE_PICKUP
+    return await offer_rides(update, context, destination, None, update.callback_query.edit_message_text)
 
 
-async def handle_ride_pickup(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Handle ride pickup location input."""
-    pickup = update.message.text if update.message else "Current Location"
-    context.user_data['pickup'] = pickup
-    
-    await update.message.reply_text(
-        f"📍 Pickup: {pickup}\n\n"
-        "Now please share your destination.\n"
-        "Type your destination address:"
-    )
-    return RIDE_DESTINATION
+def ride_quotes(context: ContextTypes.DEFAULT_TYPE, lang, multiplier: float = None):
+    """Return ``(quotes, surge multiplier, option labels)`` for every ride
+    type on the ride being booked; quotes are None without a destination on
+    the map. ``multiplier`` defaults to the surge at the pickup right now."""
+    # Addresses not in the gazetteer are dispatched from the city centre
+    pickup = context.user_data.get('pickup_location') or KUALA_LUMPUR
+    destination = context.user_data.get('destination_location')
+    if multiplier is None:
+        multiplier = surge.multiplier(*pickup)
+    quotes = estimator.quote(pickup, destination, multiplier) if destination else None
+    # The nearest free driver of every type, in one search
+    nearest = fleet.nearest_each(*pickup, estimator.by_key)
+    labels = []
+    for index, vehicle in enumerate(estimator.vehicles):
+        found = nearest.get(vehicle.key)
+        if quotes:
+            fare = to_minor(quotes[index].fare)
+            off = discount(find_promos(context, 'Ride', fare))
+            fare = format_amount(fare - off) + (" 🎟️" if off else "")
+        labels.append(render.ride_option_label(
+            vehicle,
+            fare if quotes else lang.METERED,
+            lang.DRIVER_AWAY.format(minutes=fleet.eta_minutes(found[1])) if found else lang.NO_DRIVER_NEARBY
+        ))
+    return quotes, multiplier, tuple(labels)
 
 
-async def handle_ride_destination(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Handle ride destination input."""
-    destination = update.message.text
-    pickup = context.user_data.get('pickup', 'Current Location')
-    
-    # Simulate ride booking
+async def offer_rides(update: Update, context: ContextTypes.DEFAULT_TYPE, destination: str, location,
+                      reply) -> int:
+    """Quote every ride type to ``destination`` and ask which to book."""
+    context.user_data['destination'] = destination
+    if location:
+        context.user_data['destination_location'] = list(location)
+    else:
+        context.user_data.pop('destination_location', None)
+    surge.record(*(context.user_data.get('pickup_location') or KUALA_LUMPUR))
+    lang = user_locale(update, context)
+    quotes, multiplier, labels = ride_quotes(context, lang)
+    # The ride is charged at the surge shown on the options
+    context.user_data['surge'] = multiplier
+    await reply(**render.ride_options_screen(
+        html.escape(context.user_data.get('pickup', 'Current Location')),
+        html.escape(destination),
+        quotes[0].km if quotes else None,
+        multiplier,
+        labels,
+        lang
+    ))
+    return RIDE_VEHICLE
+
+
+@router.action("ride", int)
+async def book_ride(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int) -> int:
+    """Dispatch the nearest driver of the chosen ride type and confirm the ride."""
+    query = update.callback_query
+    lang = user_locale(update, context)
+    destination = context.user_data.get('destination')
+    if 'pickup' not in context.user_data or destination is None or not 0 <= index < len(estimator.vehicles):
+        await query.edit_message_text(**render.book_ride_screen(recent_places(context), lang))
+        return RIDE_PICKUP
+    vehicle = estimator.vehicles[index]
+    context.user_data['ride_type'] = vehicle.key
+    pickup = context.user_data['pickup']
+    latitude, longitude = context.user_data.get('pickup_location') or KUALA_LUMPUR
+    quotes, multiplier, labels = ride_quotes(context, lang, context.user_data.get('surge'))
+
     order_id = str(uuid.uuid4())[:8].upper()
-    order = {
-        'id': order_id,
-        'user_id': update.effective_user.id,
-        'type': 'Ride',
-        'pickup': pickup,
-        'destination': destination,
-        'status': 'On the way',
-        'eta': '8-12 min',
-        'driver': 'Ahmad B.',
-        'vehicle': 'Honda City ABC1234',
-        'created_at': datetime.now()
-    }
-    orders[order_id] = order
-    
-    await update.message.reply_text(
-        f"🚗 <b>Ride Booked!</b>\n\n"
-        f"Order ID: <b>{order_id}</b>\n"
-        f"Pickup: {pickup}\n"
-        f"Destination: {destination}\n"
-        f"Driver: {order['driver']}\n"
-        f"Vehicle: {order['vehicle']}\n"
-        f"Status: 🚗 On the way\n"
-        f"ETA: 8-12 minutes\n\n"
-        f"Your driver is on the way!",
-        reply_markup=get_main_menu(),
-        parse_mode='HTML'
-    )
-    
-    context.user_data.clear()
+    assigned = fleet.assign(order_id, latitude, longitude, vehicle.key)
+    if assigned is None:
+        await query.edit_message_text(**render.no_drivers_screen(vehicle, labels, lang))
+        return RIDE_VEHICLE
+    driver, distance = assigned
+
+    pickup_minutes = fleet.eta_minutes(distance)
+    quote = quotes[index] if quotes else None
+    # Metered rides have no price for a promotion to take off
+    applied = await checkout(context, update.effective_user.id, 'Ride', order_id, to_minor(quote.fare) if quote else 0)
+    created_at = time.time()
+    order = storage.add_order(Order(
+        id=order_id,
+        user_id=update.effective_user.id,
+        type='Ride',
+        pickup=pickup,
+        destination=destination,
+        status='On the way',
+        eta=f"{pickup_minutes} min",
+        created_at=created_at,
+        driver=driver.name,
+        vehicle=driver.vehicle,
+        fare=format_amount(to_minor(quote.fare) - discount(applied)) if quote else "Metered",
+        # Pickup and trip, on the lifecycle's clock; without a quote the ride takes the default time
+        arrive_at=created_at + (pickup_minutes + quote.minutes) * 60 * ORDER_TIME_SCALE if quote else None
+    ))
+    lifecycle.schedule(order)
+
+    fare = order.fare if quote else lang.METERED
+    await query.edit_message_text(**lang.RIDE_BOOKED.render(
+        order_id=order_id,
+        pickup=html.escape(pickup),
+        destination=html.escape(destination),
+        driver=order.driver,
+        vehicle=order.vehicle,
+        fare=lang.SURGE_FARE.format(fare=fare, surge=multiplier) if quote and multiplier > 1 else fare,
+        promos=render.promo_lines(applied, lang),
+        eta=order.eta,
+        trip=lang.TRIP_TIME.format(minutes=quote.minutes) if quote else "-"
+    ))
+
+    forget_ride(context)
     return ConversationHandler.END
 
 
 async def handle_support(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Handle support issue."""
+    """File the user's issue as a support ticket, linked to their latest order."""
     issue = update.message.text
-    await update.message.reply_text(
-        f"📞 <b>Support Request Received</b>\n\n"
-        f"Thank you for contacting Grab Support.\n\n"
-        f"Your issue: {issue}\n\n"
-        f"Our team will get back to you within 24 hours.\n"
-        f"Reference ID: {str(uuid.uuid4())[:8].upper()}\n\n"
-        f"For urgent matters, call: 1300-GRAB",
-        reply_markup=get_main_menu(),
-        parse_mode='HTML'
-    )
+    user_id = update.effective_user.id
+    latest = await storage.latest_order(user_id)
+    ticket = tickets.add(Ticket(new_reference(), user_id, issue, latest.id if latest else None))
+    await update.message.reply_text(**user_locale(update, context).SUPPORT_RECEIVED.render(
+        issue=html.escape(issue),
+        reference_id=ticket.id
+    ))
     return ConversationHandler.END
 
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the current conversation."""
-    await update.message.reply_text(
-        "Operation cancelled. Use /menu to see options.",
-        reply_markup=get_main_menu()
-    )
-    context.user_data.clear()
+    await update.message.reply_text(**user_locale(update, context).CANCELLED)
+    forget_ride(context)
     return ConversationHandler.END
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send help message."""
-    help_text = (
-        "🤖 <b>Grab Bot Commands</b>\n\n"
-        "/start - Start the bot\n"
-        "/menu - Show main menu\n"
-        "/help - Show this help\n"
-        "/cancel - Cancel current operation\n\n"
-        "💡 <b>Tips:</b>\n"
-        "• Use inline buttons for quick actions\n"
-        "• Track your orders anytime\n"
-        "• Check promotions for great deals!\n\n"
-        "Need help? Contact support via the menu!"
-    )
-    await update.message.reply_html(help_text, reply_markup=get_main_menu())
+    await update.message.reply_text(**user_locale(update, context).HELP)
+
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send the rest of an admin's /broadcast message to every user, or show
+    the broadcasts being sent."""
+    # The HTML of the message keeps the admin's formatting
+    parts = update.message.text_html.split(None, 1)
+    if len(parts) < 2:
+        await update.message.reply_text(**render.broadcast_usage(broadcaster.running))
+        return
+    broadcast = await storage.create_broadcast(parts[1].strip(), update.effective_chat.id, worker_index)
+    broadcaster.start(broadcast)
+    logger.info("User %s started broadcast %s", update.effective_user.id, broadcast.id)
+    await update.message.reply_text(**render.BROADCAST_STARTED.render(id=broadcast.id))
+
+
+async def tickets_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show an agent the open tickets, or the tickets matching the rest of the
+    message: a reference ID, user:ID or words."""
+    parts = update.message.text.split(None, 1)
+    if len(parts) < 2:
+        found = await tickets.recent(TICKETS_PAGE_SIZE)
+        title = "Open tickets"
+    else:
+        found = await tickets.find(parts[1], TICKETS_PAGE_SIZE)
+        title = f"Tickets for {parts[1].strip()}"
+    await update.message.reply_text(**render.tickets_screen(title, found))
+
+
+async def close_ticket_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Close a ticket for an agent and tell the user."""
+    if not context.args:
+        await update.message.reply_text(**render.tickets_screen("Open tickets", await tickets.recent(TICKETS_PAGE_SIZE)))
+        return
+    reference_id = context.args[0].lstrip('#').upper()
+    ticket = await tickets.close_ticket(reference_id, update.effective_user.id)
+    if ticket is None:
+        await update.message.reply_text(**render.TICKET_NOT_OPEN.render(reference_id=reference_id))
+        return
+    await update.message.reply_text(**render.TICKET_CLOSED.render(reference_id=ticket.id))
+    bot = context.bot
+    extra = {'rate_limit_args': NOTIFICATION} if bot.rate_limiter is not None else {}
+    lang = stored_locale(context.application, ticket.user_id)
+    await bot.send_message(chat_id=ticket.user_id, **lang.TICKET_RESOLVED.render(reference_id=ticket.id), **extra)
+
+
+async def remember_contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Remember every user who sends an update, for broadcasts."""
+    if update.effective_user is not None:
+        storage.remember_user(update.effective_user.id)
+
+
+class IntentFilter(filters.MessageFilter):
+    """Text messages whose intent is one of ``names``."""
+
+    __slots__ = ('names',)
+
+    def __init__(self, *names):
+        super().__init__(name=f"IntentFilter({', '.join(names)})")
+        self.names = names
+
+    def filter(self, message) -> bool:
+        found = intents.classify(message.text) if message.text else None
+        return found is not None and found.name in self.names
+
+
+class AwaitingText(filters.MessageFilter):
+    """Messages from users a conversation is waiting on for text, e.g. the
+    description of a support issue. ``states`` maps each conversation handler
+    to its states that take text; set it once the handlers are built."""
+
+    __slots__ = ('states',)
+
+    def __init__(self):
+        super().__init__(name='AwaitingText')
+        self.states = {}
+
+    def filter(self, message) -> bool:
+        if message.from_user is None:
+            return False
+        key = (message.chat.id, message.from_user.id)
+        # The states live in the handlers; there is no public per-key getter
+        return any(handler._conversations.get(key) in states for handler, states in self.states.items())
+
+
+async def start_ride_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Start booking a ride from a message like "ride from KL Sentral to KLCC",
+    skipping the questions it already answers."""
+    slots = intents.classify(update.message.text).slots
+    forget_ride(context)
+    if 'destination' in slots:
+        context.user_data['destination_text'] = slots['destination']
+    if 'pickup' in slots:
+        return await take_pickup(update, context, slots['pickup'], update.message.reply_text)
+    destination = slots.get('destination')
+    await update.message.reply_text(**render.book_ride_screen(
+        recent_places(context, exclude=destination), user_locale(update, context),
+        html.escape(destination) if destination else None
+    ))
+    return RIDE_PICKUP
+
+
+async def start_food_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Open the menu a message like "I want pizza" asks for, or the restaurant list."""
+    current = catalog.get()
+    lang = user_locale(update, context)
+    restaurant = current.find(intents.classify(update.message.text).slots.get('words', ()))
+    if restaurant is not None:
+        await update.message.reply_text(**current.menu_page(restaurant.id, 0, lang))
+        return FOOD_ITEM
+    await update.message.reply_text(**current.restaurants_page(0, lang))
+    return FOOD_RESTAURANT
+
+
+async def start_support_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Take a message describing a problem as a support issue, or ask for one."""
+    if 'issue' in intents.classify(update.message.text).slots:
+        return await handle_support(update, context)
+    await update.message.reply_text(**user_locale(update, context).SUPPORT)
+    return SUPPORT_ISSUE
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handle regular text messages."""
-    user_message = update.message.text.lower()
-    user = update.effective_user
-    
-    responses = {
-        'hi': f"Hi {user.first_name}! How can I help you today?",
-        'hello': f"Hello {user.first_name}! What would you like to do?",
-        'thanks': "You're welcome! Anything else I can help with?",
-        'bye': "Goodbye! Have a great day! 🚗"
-    }
-    
-    response = responses.get(user_message, 
-        f"Hi {user.first_name}! I'm here to help. "
-        "Use /menu to see all available services.")
-    
-    await update.message.reply_text(response, reply_markup=get_main_menu())
+    """Handle regular text messages: promotion codes, greetings, and requests
+    to track an order, see the wallet or top up. Rides, food and support are started by
+    their conversations' ``IntentFilter`` entry points."""
+    text = update.message.text
+    lang = user_locale(update, context)
+    promotion = promotions.get(text) if len(text) <= 32 else None
+    if promotion is not None:
+        await update.message.reply_text(**add_promo_code(context, promotion, lang))
+        return
+    template = lang.GREETINGS.get(text.lower())
+    intent = intents.classify(text) if template is None else None
+    if intent is None:
+        template = template or lang.DEFAULT_REPLY
+        await update.message.reply_text(**template.render(first_name=update.effective_user.first_name))
+    elif intent.name == 'track':
+        await update.message.reply_text(**await track_order_screen(update.effective_user.id, lang))
+    elif intent.name == 'wallet':
+        await update.message.reply_text(**await wallet_screen(update.effective_user.id, lang))
+    elif intent.name == 'topup':
+        amount = intent.slots.get('amount')
+        if amount in render.TOPUP_AMOUNTS:
+            await update.message.reply_text(**render.topup_confirm_screen(int(amount), open_topup(context), lang))
+        else:
+            await update.message.reply_text(**render.topup_screen(open_topup(context), lang))
+    else:
+        # A ride, food or support request while that conversation is already under way
+        await update.message.reply_text(**lang.DEFAULT_REPLY.render(first_name=update.effective_user.first_name))
 
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Log the error and send a telegram message."""
     logger.error(msg="Exception while handling an update:", exc_info=context.error)
+    metrics.ERRORS.inc(type(context.error).__name__)
     
     if isinstance(update, Update) and update.message:
         try:
-            await update.message.reply_text(
-                "Sorry, something went wrong. Please try again or use /menu.",
-                reply_markup=get_main_menu()
-            )
+            await update.message.reply_text(**user_locale(update, context).ERROR)
         except:
             pass
 
 
-async def post_init(application: Application) -> None:
-    """Delete webhook if it exists."""
+def record_order_updates(changed) -> None:
+    """Save the orders whose status changed this tick and free their drivers."""
+    for order in changed:
+        storage.save_order(order)
+        if order.status_code == DELIVERED:
+            # The driver is free for the next ride
+            fleet.release(order.id)
+
+
+async def push_order_updates(application: Application, changed) -> None:
+    """Notify the users of the orders whose status changed this tick, one
+    message per user however many of their orders changed."""
+    by_user = {}
+    for order in changed:
+        # An order that took two steps in one tick is reported once
+        by_user.setdefault(order.user_id, {})[order.id] = order
+
     bot = application.bot
+    # Notifications queue behind interactive replies in the send scheduler
+    extra = {'rate_limit_args': NOTIFICATION} if bot.rate_limiter is not None else {}
+    sends = []
+    for user_id, user_orders in by_user.items():
+        lang = stored_locale(application, user_id)
+        lines = [
+            lang.ORDER_UPDATE_LINES[order.type, order.status].format(
+                order_id=order.id,
+                eta=order.eta,
+                restaurant=html.escape(order.restaurant or ''),
+                destination=html.escape(order.destination or '')
+            )
+            for order in user_orders.values()
+            if (order.type, order.status) in lang.ORDER_UPDATE_LINES
+        ]
+        if lines:
+            sends.append(bot.send_message(
+                chat_id=user_id, **lang.ORDER_UPDATE.render(updates='\n\n'.join(lines)), **extra
+            ))
+    results = await asyncio.gather(*sends, return_exceptions=True)
+    failed = sum(isinstance(result, Exception) for result in results)
+    if failed:
+        logger.warning("%d of %d order updates could not be sent", failed, len(results))
+
+
+async def release_users(application: Application, owns) -> None:
+    """After a rebalance, save the state of the users this worker no longer
+    owns and drop it from memory, so their new worker reads it fresh.
+
+    Drivers on their rides are freed: the rides finish under the new worker,
+    whose own share of the fleet never had them assigned."""
+    await application.update_persistence()
+    if persistence is not None:
+        await persistence.flush()
+    await storage.flush()
+    gone = {user_id for user_id in storage.cached_users() | set(application.user_data) if not owns(user_id)}
+    if not gone:
+        return
+    for user_id in gone:
+        for order in orders.for_user(user_id):
+            fleet.release(order.id)
+    storage.forget(gone)
+    if persistence is not None:
+        persistence.forget(gone)
+    for user_id in gone:
+        # application.user_data is a read-only view
+        application._user_data.pop(user_id, None)
+    logger.info("Handed over %d users", len(gone))
+
+
+async def adopt_orders(owns) -> None:
+    """Schedule the active orders of the users this worker owns, including
+    those it took over from another worker."""
+    for order in await storage.active_orders():
+        if not owns(order.user_id):
+            continue
+        if order.id not in orders:
+            orders.add(order)
+        lifecycle.schedule(order)
+
+
+def worker_env(index: int) -> dict:
+    """Settings of the index-th worker process: its own metrics port and an
+    even share of the send rate."""
+    env = {'SEND_RATE_LIMIT': str(SEND_RATE_LIMIT / WORKERS)}
+    if METRICS_PORT:
+        env['METRICS_PORT'] = str(METRICS_PORT + index)
+    return env
+
+
+async def post_init(application: Application) -> None:
+    """Open storage, start the order lifecycle and the metrics endpoint.
+
+    Nothing here waits on Telegram: when polling, ``start_polling`` removes
+    any webhook as it starts, in the same request that keeps or drops the
+    pending updates."""
+    await storage.start()
+    await tickets.start()
+    promotions.restore(await storage.redemptions(worker_index))
+    # Broadcasts this worker was sending before a restart carry on
+    broadcaster.bot = application.bot
+    for broadcast in await storage.unfinished_broadcasts(worker_index):
+        broadcaster.start(broadcast)
+    lifecycle.start(functools.partial(push_order_updates, application), record_order_updates)
+    fleet_simulator.start()
+    surge.start()
+    if metrics_server is not None:
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            logger.warning("Metrics endpoint not started: %s", e)
+
+
+def save_warm_state() -> None:
+    """Snapshot the fleet and surge demand for the next start."""
     try:
-        webhook_info = await bot.get_webhook_info()
-        if webhook_info.url:
-            logger.info(f"Removing existing webhook: {webhook_info.url}")
-            await bot.delete_webhook(drop_pending_updates=True)
-            logger.info("Webhook removed successfully")
-    except Exception as e:
-        logger.warning(f"Error checking/removing webhook: {e}")
+        save_snapshot(snapshot_path, SNAPSHOT_KEY, {
+            # Every driver free, as in a fleet built from scratch: the rides
+            # they are on may be finished by another worker after the restart
+            'drivers': [(driver.id, driver.name, driver.vehicle, driver.lat, driver.lon, driver.kind)
+                        for driver in fleet],
+            'demand': surge.demand(),
+        })
+    except OSError as e:
+        logger.warning("Snapshot not saved: %s", e)
 
 
-def main() -> None:
-    """Start the bot."""
-    # Create the Application
-    application = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
+async def post_stop(application: Application) -> None:
+    """Stop broadcasting while the bot can still send the messages under way."""
+    await broadcaster.stop()
+
+
+async def post_shutdown(application: Application) -> None:
+    """Stop the order lifecycle, the fleet and the metrics endpoint, snapshot
+    warm state, then flush and close storage."""
+    await lifecycle.stop()
+    await fleet_simulator.stop()
+    await surge.stop()
+    if snapshot_path:
+        save_warm_state()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    if persistence is not None:
+        await persistence.close()
+    await tickets.close()
+    await storage.close()
+
+
+def build_application(builder=None) -> Application:
+    """Create the Application and register all handlers.
+
+    ``builder`` replaces the default Telegram connection settings, e.g. with a
+    fake Bot API for benchmarks.
+    """
+    if builder is None:
+        builder = Application.builder().token(BOT_TOKEN).base_url(TELEGRAM_API_URL)
+        if SEND_RATE_LIMIT > 0:
+            builder.rate_limiter(OutboundScheduler(global_rate=SEND_RATE_LIMIT))
+        if CONCURRENT_UPDATES > 1:
+            builder.concurrent_updates(KeyedUpdateProcessor(CONCURRENT_UPDATES))
+    if persistence is not None:
+        builder.persistence(persistence)
+    application = builder.post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown).build()
+
+    # Typed requests start a conversation only if no other one is waiting for the user's text
+    awaiting_text = AwaitingText()
 
     # Ride booking conversation
     ride_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(button_handler, pattern="^book_ride$")],
+        name='ride',
+        persistent=persistence is not None,
+        entry_points=[
+            CallbackQueryHandler(button_handler, pattern=router.pattern("book_ride", "pickup", "dropoff", "ride")),
+            MessageHandler(filters.TEXT & ~filters.COMMAND & ~awaiting_text & IntentFilter('ride'), start_ride_from_text),
+        ],
         states={
-            RIDE_PICKUP: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_ride_pickup)],
-            RIDE_DESTINATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_ride_destination)],
+            RIDE_PICKUP: [
+                MessageHandler((filters.TEXT & ~filters.COMMAND) | filters.LOCATION, handle_ride_pickup),
+                CallbackQueryHandler(button_handler, pattern=router.pattern("pickup")),
+            ],
+            RIDE_DESTINATION: [
+                MessageHandler((filters.TEXT & ~filters.COMMAND) | filters.LOCATION, handle_ride_destination),
+                CallbackQueryHandler(button_handler, pattern=router.pattern("dropoff", "pickup")),
+            ],
+            RIDE_VEHICLE: [CallbackQueryHandler(button_handler, pattern=router.pattern("ride", "dropoff", "pickup"))],
         },
         fallbacks=[CommandHandler('cancel', cancel), CommandHandler('menu', menu)],
     )
     
     # Food ordering conversation
     food_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(button_handler, pattern="^order_food$|^rest_|^food_")],
+        name='food',
+        persistent=persistence is not None,
+        entry_points=[
+            CallbackQueryHandler(button_handler, pattern=router.pattern("order_food", "restaurants", "rest", "menu", "food")),
+            MessageHandler(filters.TEXT & ~filters.COMMAND & ~awaiting_text & IntentFilter('food'), start_food_from_text),
+        ],
         states={
-            FOOD_RESTAURANT: [CallbackQueryHandler(button_handler, pattern="^rest_|^order_food$")],
-            FOOD_ITEM: [CallbackQueryHandler(button_handler, pattern="^food_|^order_food$")],
+            FOOD_RESTAURANT: [CallbackQueryHandler(button_handler, pattern=router.pattern("rest", "restaurants", "order_food"))],
+            FOOD_ITEM: [CallbackQueryHandler(button_handler, pattern=router.pattern("food", "menu", "order_food"))],
         },
         fallbacks=[CommandHandler('cancel', cancel), CommandHandler('menu', menu)],
     )
     
     # Support conversation
     support_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(button_handler, pattern="^support$")],
+        name='support',
+        persistent=persistence is not None,
+        entry_points=[
+            CallbackQueryHandler(button_handler, pattern=router.pattern("support")),
+            MessageHandler(filters.TEXT & ~filters.COMMAND & ~awaiting_text & IntentFilter('support'), start_support_from_text),
+        ],
         states={
             SUPPORT_ISSUE: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_support)],
         },
         fallbacks=[CommandHandler('cancel', cancel), CommandHandler('menu', menu)],
     )
+    awaiting_text.states = {ride_handler: {RIDE_PICKUP, RIDE_DESTINATION}, support_handler: {SUPPORT_ISSUE}}
 
     # Register handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("menu", menu))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("cancel", cancel))
+    application.add_handler(CommandHandler("broadcast", broadcast_command, filters.User(user_id=ADMIN_IDS)))
+    application.add_handler(CommandHandler("tickets", tickets_command, filters.User(user_id=AGENT_IDS)))
+    application.add_handler(CommandHandler("close_ticket", close_ticket_command, filters.User(user_id=AGENT_IDS)))
     
     application.add_handler(ride_handler)
     application.add_handler(food_handler)
@@ -575,10 +1312,85 @@ def main() -> None:
     # Register error handler
     application.add_error_handler(error_handler)
 
+    # Before everything else, in a group of its own
+    application.add_handler(TypeHandler(Update, remember_contact), group=-3)
+
+    # Restore each user's conversation states and user_data on first contact
+    if persistence is not None:
+        persistence.attach(application)
+
+    # Record handler latency, update counts and state transitions
+    metrics.instrument(application, STATE_NAMES)
+    return application
+
+
+def run_sharded() -> None:
+    """Receive updates in this process and handle them in WORKERS worker processes."""
+    ingress = Ingress()
+    pool = WorkerPool(ingress, [sys.executable, os.path.abspath(__file__)], WORKERS, env=worker_env)
+    server = None
+    if BOT_MODE == 'webhook':
+        server = IngressWebhookServer(
+            ingress,
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_body_size=WEBHOOK_MAX_BODY
+        )
+    logger.info("Starting Grab bot with %d workers...", WORKERS)
+    asyncio.run(run_ingress(
+        pool,
+        Bot(BOT_TOKEN, base_url=TELEGRAM_API_URL),
+        server,
+        WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=DROP_PENDING_UPDATES
+    ))
+
+
+def main() -> None:
+    """Start the bot."""
+    if WORKER_SOCKET:
+        application = build_application()
+        logger.info("Starting worker %s...", WORKER_NAME)
+        server = WorkerServer(
+            application,
+            WORKER_SOCKET,
+            WORKER_NAME,
+            release=functools.partial(release_users, application),
+            adopt=adopt_orders
+        )
+        asyncio.run(run_worker(application, server))
+        return
+    if WORKERS > 1:
+        run_sharded()
+        return
+
+    application = build_application()
+
     # Start the bot
     logger.info("Starting Grab bot...")
-    logger.info("Bot is now listening for messages...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
+    if BOT_MODE == 'webhook':
+        server = WebhookServer(
+            application,
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_body_size=WEBHOOK_MAX_BODY
+        )
+        logger.info("Bot is now receiving updates via webhook...")
+        asyncio.run(run_webhook(
+            application,
+            server,
+            WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=DROP_PENDING_UPDATES
+        ))
+    else:
+        logger.info("Bot is now listening for messages...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=DROP_PENDING_UPDATES)
 
 
 if __name__ == '__main__':
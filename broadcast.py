@@ -0,0 +1,187 @@
+"""Broadcast messages to every user who has talked to the bot.
+
+A broadcast walks the users known to storage in ascending id order, one
+chunk of ``chunk_size`` ids at a time, so the recipient list is never held
+in memory. Within a chunk messages are sent concurrently, at most
+``concurrency`` at once and ``rate`` per second (the send scheduler in
+``outbound.py`` still enforces Telegram's global limit on top, with
+broadcasts queued behind replies and notifications).
+
+Progress is kept in storage: every delivered recipient is recorded, and
+the broadcast's ``cursor`` moves to the last id of a chunk once the whole
+chunk is done. A broadcast interrupted by a restart resumes after its
+cursor and skips the recipients recorded in the chunk it was sending, so
+nobody gets it twice. With the sqlite backend deliveries are written in
+the storage's batches, so a crash (as opposed to a shutdown) can repeat
+the messages of the last few milliseconds.
+
+Users who blocked the bot or deleted their account are pruned: they are
+marked in storage and left out of later broadcasts until they send the bot
+a message again.
+"""
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+from outbound import BROADCAST, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the chat will never accept a message again
+GONE_MESSAGES = ('chat not found', 'user is deactivated', 'peer_id_invalid')
+
+
+class Broadcast:
+    """A message being sent to every known user, and its progress."""
+
+    __slots__ = ('id', 'text', 'admin', 'worker', 'created_at', 'cursor', 'sent', 'pruned', 'failed',
+                 'finished_at')
+
+    def __init__(self, id, text: str, admin=None, worker: int = 0, created_at=None, cursor: int = 0,
+                 sent: int = 0, pruned: int = 0, failed: int = 0, finished_at=None):
+        self.id = id
+        self.text = text
+        # Chat told when the broadcast finishes
+        self.admin = admin
+        # The worker process sending it; it resumes the broadcast after a restart
+        self.worker = worker
+        self.created_at = time.time() if created_at is None else created_at
+        # Every recipient with an id up to the cursor has been handled
+        self.cursor = cursor
+        self.sent = sent
+        self.pruned = pruned
+        self.failed = failed
+        self.finished_at = finished_at
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Broadcast':
+        broadcast = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(broadcast, name, data.get(name))
+        return broadcast
+
+    def __repr__(self) -> str:
+        return f"Broadcast(id={self.id}, cursor={self.cursor}, sent={self.sent})"
+
+
+def is_gone(error: Exception) -> bool:
+    """Whether a send failed because the user blocked the bot or is gone."""
+    return isinstance(error, Forbidden) or (
+        isinstance(error, BadRequest) and any(text in str(error).lower() for text in GONE_MESSAGES)
+    )
+
+
+class Broadcaster:
+    """Sends broadcasts with ``bot`` to the users in ``storage``.
+
+    ``rate`` caps broadcast messages per second (None for no cap of its
+    own); ``done`` is called with each finished broadcast. ``bot`` may be
+    set later, before the first ``start``.
+    """
+
+    def __init__(self, storage, bot=None, chunk_size: int = 1000, concurrency: int = 100, rate: float = None,
+                 done=None):
+        self.storage = storage
+        self.bot = bot
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.rate = rate
+        self.done = done
+        self._tasks = {}
+        self.sent = 0
+
+    @property
+    def running(self) -> tuple:
+        return tuple(self._tasks)
+
+    def start(self, broadcast: Broadcast) -> None:
+        """Send ``broadcast`` in the background, from its cursor."""
+        if broadcast in self._tasks:
+            return
+        task = asyncio.create_task(self._run(broadcast))
+        self._tasks[broadcast] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast, None))
+
+    async def stop(self) -> None:
+        """Stop sending; the broadcasts resume from their progress on ``start``.
+
+        Messages already being sent are let finish and recorded first, so
+        call this while the bot can still send."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, broadcast: Broadcast) -> None:
+        bucket = TokenBucket(self.rate, self.rate) if self.rate else None
+        # Broadcasts queue behind everything else in the send scheduler
+        extra = {'rate_limit_args': BROADCAST} if getattr(self.bot, 'rate_limiter', None) is not None else {}
+        try:
+            while True:
+                chunk = await self.storage.recipients(broadcast.cursor, self.chunk_size)
+                if not chunk:
+                    break
+                # Recipients of this chunk reached before an interruption
+                done = await self.storage.deliveries(broadcast.id, broadcast.cursor, chunk[-1])
+                await self._send_chunk(broadcast, [user_id for user_id in chunk if user_id not in done], bucket,
+                                       extra)
+                broadcast.cursor = chunk[-1]
+                self.storage.save_broadcast(broadcast)
+            broadcast.finished_at = time.time()
+            self.storage.save_broadcast(broadcast)
+            await self.storage.flush(durable=True)
+        except asyncio.CancelledError:
+            # Keep what was sent, so a resumed broadcast does not send it again
+            self.storage.save_broadcast(broadcast)
+            await self.storage.flush()
+            raise
+        except Exception as e:
+            logger.error("Broadcast %s stopped: %s", broadcast.id, e, exc_info=True)
+            return
+        logger.info("Broadcast %s finished: %d sent, %d pruned, %d failed",
+                    broadcast.id, broadcast.sent, broadcast.pruned, broadcast.failed)
+        if self.done is not None:
+            await self.done(broadcast)
+
+    async def _send_chunk(self, broadcast: Broadcast, user_ids, bucket, extra: dict) -> None:
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        try:
+            for user_id in user_ids:
+                await slots.acquire()
+                if bucket is not None:
+                    while True:
+                        delay = bucket.delay(time.monotonic())
+                        if not delay:
+                            break
+                        await asyncio.sleep(delay)
+                    bucket.take(time.monotonic())
+                tasks.append(asyncio.create_task(self._send(broadcast, user_id, slots, extra)))
+            await asyncio.shield(asyncio.gather(*tasks))
+        except asyncio.CancelledError:
+            # Stopping: no new sends, but the ones under way finish and are recorded
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _send(self, broadcast: Broadcast, user_id, slots: asyncio.Semaphore, extra: dict) -> None:
+        try:
+            await self.bot.send_message(chat_id=user_id, text=broadcast.text, parse_mode='HTML', **extra)
+        except TelegramError as e:
+            if is_gone(e):
+                broadcast.pruned += 1
+                self.storage.prune_user(user_id)
+            else:
+                broadcast.failed += 1
+                logger.warning("Broadcast %s to %s failed: %s", broadcast.id, user_id, e)
+                return
+        else:
+            broadcast.sent += 1
+            self.sent += 1
+        finally:
+            slots.release()
+        self.storage.record_delivery(broadcast.id, user_id)
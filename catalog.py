@@ -0,0 +1,274 @@
+"""Restaurant catalog loaded from a JSON or CSV file.
+
+The catalog is an immutable snapshot indexed by restaurant and item id, by
+cuisine and by name prefix. ``CatalogStore`` reloads the file when it
+changes, swapping in a new snapshot without a restart. Callback data only
+carries numeric ids, so it stays well under Telegram's 64-byte limit however
+large the catalog grows.
+
+JSON layout::
+
+    {"restaurants": [{"id": 1, "name": "Pizza Express", "emoji": "🍕",
+                      "cuisine": "Pizza",
+                      "items": [{"id": 101, "name": "Margherita Pizza", "price": 25}]}]}
+
+CSV layout: one row per item with the columns ``restaurant_id, restaurant,
+emoji, cuisine, item_id, item, price``.
+
+Screens are built in the language of a ``locales.Locale`` (English by
+default) from the texts and button labels its catalog translates; restaurant
+and item names are shown as the catalog file gives them, escaped once at
+load for the HTML of screen texts.
+"""
+import csv
+import html
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import NamedTuple
+
+from render import MENU, MENU_PAGE, RESTAURANTS, keyboard, screen
+
+logger = logging.getLogger(__name__)
+
+# Buttons per page of the restaurant list and of a menu
+PAGE_SIZE = 8
+
+
+class MenuItem(NamedTuple):
+    id: int
+    restaurant_id: int
+    name: str
+    price: float
+
+
+class Restaurant(NamedTuple):
+    id: int
+    name: str
+    emoji: str
+    cuisine: str
+    items: tuple
+
+
+def format_price(price: float) -> str:
+    """Format a price in ringgit, e.g. ``RM 25`` or ``RM 12.50``."""
+    return f"RM {price:.0f}" if price == int(price) else f"RM {price:.2f}"
+
+
+def _page_count(count: int) -> int:
+    return max(1, -(-count // PAGE_SIZE))
+
+
+def _english(text: str) -> str:
+    return text
+
+
+def _nav_row(action: str, page: int, pages: int, label):
+    row = []
+    if page > 0:
+        row.append((label("◀️ Prev"), f"{action}_{page - 1}"))
+    if page < pages - 1:
+        row.append((label("Next ▶️"), f"{action}_{page + 1}"))
+    return row
+
+
+class Catalog:
+    """An indexed, read-only set of restaurants and their menu items."""
+
+    def __init__(self, restaurants):
+        self.restaurants = tuple(restaurants)
+        self.restaurants_by_id = {r.id: r for r in self.restaurants}
+        self.items_by_id = {item.id: item for r in self.restaurants for item in r.items}
+        if len(self.restaurants_by_id) != len(self.restaurants):
+            raise ValueError("Duplicate restaurant id in catalog")
+        if len(self.items_by_id) != sum(len(r.items) for r in self.restaurants):
+            raise ValueError("Duplicate item id in catalog")
+        # Names as they go into HTML text; button labels are plain text
+        self.restaurant_html = {r.id: html.escape(r.name) for r in self.restaurants}
+        self.item_html = {item.id: html.escape(item.name) for item in self.items_by_id.values()}
+
+        by_cuisine = {}
+        for r in self.restaurants:
+            by_cuisine.setdefault(r.cuisine.lower(), []).append(r)
+        self.by_cuisine = {cuisine: tuple(rs) for cuisine, rs in by_cuisine.items()}
+
+        # Sorted (word, kind, id) for every word of every name; prefix search
+        # is a bisect into this list
+        entries = set()
+        for r in self.restaurants:
+            entries.update((word, 'restaurant', r.id) for word in r.name.lower().split())
+            for item in r.items:
+                entries.update((word, 'item', item.id) for word in item.name.lower().split())
+        self._name_index = sorted(entries)
+        self._name_keys = [word for word, _, _ in self._name_index]
+
+        # Rendered pages, built on first use
+        self._pages = {}
+
+    def restaurants_for_cuisine(self, cuisine: str):
+        return self.by_cuisine.get(cuisine.lower(), ())
+
+    def search(self, prefix: str, limit: int = 20):
+        """Return restaurants and items with a name word starting with ``prefix``."""
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        for i in range(bisect_left(self._name_keys, prefix), len(self._name_keys)):
+            word, kind, id = self._name_index[i]
+            if not word.startswith(prefix):
+                break
+            if (kind, id) in seen:
+                continue
+            seen.add((kind, id))
+            results.append(self.restaurants_by_id[id] if kind == 'restaurant' else self.items_by_id[id])
+            if len(results) >= limit:
+                break
+        return results
+
+    def find(self, words):
+        """Return the restaurant that ``words`` (e.g. ``("spicy", "chicken")``)
+        ask for: by cuisine, then by name, then by a menu item; or None."""
+        words = [word for word in words if len(word) >= 3]
+        for word in words:
+            restaurants = self.restaurants_for_cuisine(word)
+            if restaurants:
+                return restaurants[0]
+        items = []
+        for word in words:
+            for found in self.search(word):
+                if isinstance(found, Restaurant):
+                    return found
+                items.append(found)
+        return self.restaurants_by_id[items[0].restaurant_id] if items else None
+
+    def restaurants_page(self, page: int = 0, lang=None):
+        """Return the screen listing restaurants on ``page``, in ``lang``."""
+        pages = _page_count(len(self.restaurants))
+        page = min(max(page, 0), pages - 1)
+        key = ('restaurants', page, lang and lang.code)
+        rendered = self._pages.get(key)
+        if rendered is None:
+            label = lang.label if lang else _english
+            shown = self.restaurants[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+            rows = [[(f"{r.emoji} {r.name}", f"rest_{r.id}")] for r in shown]
+            rows.append(_nav_row('restaurants', page, pages, label))
+            rows.append([(label("🔙 Back to Menu"), "main_menu")])
+            rendered = self._pages[key] = screen(
+                lang.RESTAURANTS if lang else RESTAURANTS,
+                keyboard(*[row for row in rows if row])
+            )
+        return rendered
+
+    def menu_page(self, restaurant_id: int, page: int = 0, lang=None):
+        """Return the menu screen for a restaurant in ``lang``, or None if it
+        does not exist."""
+        restaurant = self.restaurants_by_id.get(restaurant_id)
+        if restaurant is None:
+            return None
+        pages = _page_count(len(restaurant.items))
+        page = min(max(page, 0), pages - 1)
+        key = (restaurant_id, page, lang and lang.code)
+        rendered = self._pages.get(key)
+        if rendered is None:
+            label = lang.label if lang else _english
+            shown = restaurant.items[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+            rows = [
+                [(f"{restaurant.emoji} {item.name} - {format_price(item.price)}", f"food_{item.id}")]
+                for item in shown
+            ]
+            rows.append(_nav_row(f"menu_{restaurant.id}", page, pages, label))
+            rows.append([(label("🔙 Back"), "order_food")])
+            if pages > 1:
+                title = (lang.MENU_PAGE if lang else MENU_PAGE).format(
+                    restaurant=self.restaurant_html[restaurant.id], page=page + 1, pages=pages
+                )
+            else:
+                title = (lang.MENU if lang else MENU).format(restaurant=self.restaurant_html[restaurant.id])
+            rendered = self._pages[key] = screen(title, keyboard(*[row for row in rows if row]))
+        return rendered
+
+
+def _load_json(path: str):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return [
+        Restaurant(
+            id=int(r['id']),
+            name=r['name'],
+            emoji=r.get('emoji', '🍽️'),
+            cuisine=r.get('cuisine', ''),
+            items=tuple(
+                MenuItem(int(item['id']), int(r['id']), item['name'], float(item['price']))
+                for item in r.get('items', [])
+            )
+        )
+        for r in data['restaurants']
+    ]
+
+
+def _load_csv(path: str):
+    restaurants = {}
+    items = {}
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            restaurant_id = int(row['restaurant_id'])
+            if restaurant_id not in restaurants:
+                restaurants[restaurant_id] = (row['restaurant'], row.get('emoji') or '🍽️', row.get('cuisine', ''))
+                items[restaurant_id] = []
+            items[restaurant_id].append(
+                MenuItem(int(row['item_id']), restaurant_id, row['item'], float(row['price']))
+            )
+    return [
+        Restaurant(restaurant_id, name, emoji, cuisine, tuple(items[restaurant_id]))
+        for restaurant_id, (name, emoji, cuisine) in restaurants.items()
+    ]
+
+
+def load_catalog(path: str) -> Catalog:
+    """Load a catalog from a ``.json`` or ``.csv`` file."""
+    if path.endswith('.csv'):
+        return Catalog(_load_csv(path))
+    return Catalog(_load_json(path))
+
+
+class CatalogStore:
+    """Holds the current catalog and reloads it when the file changes.
+
+    The file's modification time is checked at most once every
+    ``check_interval`` seconds. A file that fails to load is logged and the
+    previous catalog stays in use.
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._mtime = os.stat(path).st_mtime_ns
+        self._catalog = load_catalog(path)
+        self._next_check = time.monotonic() + check_interval
+
+    def get(self) -> Catalog:
+        """Return the current catalog, reloading it first if the file changed."""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self.reload()
+        return self._catalog
+
+    def reload(self, force: bool = False) -> bool:
+        """Reload the catalog if the file changed. Returns True if it was reloaded."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime and not force:
+                return False
+            catalog = load_catalog(self.path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Error reloading catalog from %s: %s", self.path, e)
+            return False
+        self._catalog = catalog
+        self._mtime = mtime
+        logger.info("Reloaded catalog: %d restaurants, %d items", len(catalog.restaurants), len(catalog.items_by_id))
+        return True
@@ -0,0 +1,340 @@
+"""Driver dispatch: a live fleet in a grid index and nearest-driver assignment.
+
+Positions are projected onto a flat kilometre grid around a reference
+latitude (accurate enough within a city) and bucketed into square cells of
+``cell_km``. Only available drivers are kept in the cells, so queries never
+wade through busy ones, and a position update moves a driver between two
+cell sets in O(1). ``nearest`` searches rings of cells outward from the
+pickup and stops as soon as no unsearched cell can hold a closer driver.
+
+``assign`` finds and reserves a driver in one synchronous call. With no
+await in between, two bookings handled concurrently on the event loop can
+never get the same driver.
+
+Every driver drives one vehicle type (``bike``, ``car``, ...), and a search
+can be limited to some types. ``nearest_each`` finds the nearest driver of
+every requested type in a single ring search, for quoting all ride types at
+once.
+"""
+import asyncio
+import logging
+import math
+import random
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+
+# Where pickups without coordinates (typed addresses not in the gazetteer) are dispatched from
+KUALA_LUMPUR = (3.1390, 101.6869)
+
+DRIVER_NAMES = (
+    'Ahmad B.', 'Siti N.', 'Raj K.', 'Mei Ling T.', 'Hafiz R.', 'Nurul A.', 'Kumar S.', 'Wei Jie L.',
+    'Farah Z.', 'Daniel C.', 'Aisyah M.', 'Arjun P.', 'Jason W.', 'Zainal H.', 'Priya V.', 'Amirul I.',
+)
+# Vehicle type -> models driven as that type
+VEHICLES = {
+    'bike': ('Honda EX5', 'Yamaha Y15ZR', 'Modenas Kriss'),
+    'car': ('Perodua Myvi', 'Proton Saga', 'Perodua Bezza', 'Proton Persona'),
+    'plus': ('Honda City', 'Toyota Vios', 'Honda Civic'),
+    'six': ('Toyota Innova', 'Proton Exora', 'Toyota Avanza'),
+}
+# Share of the simulated fleet driving each vehicle type
+FLEET_MIX = {'bike': 0.35, 'car': 0.45, 'plus': 0.12, 'six': 0.08}
+
+
+class Driver:
+    """A driver's position and, while on a ride, the order they are assigned to."""
+
+    __slots__ = ('id', 'name', 'vehicle', 'kind', 'lat', 'lon', 'x', 'y', 'cell', 'order_id')
+
+    def __init__(self, id, name: str, vehicle: str, lat: float, lon: float, kind: str = 'car'):
+        self.id = id
+        self.name = name
+        self.vehicle = vehicle
+        self.kind = kind
+        self.lat = lat
+        self.lon = lon
+        self.x = self.y = 0.0
+        self.cell = None
+        self.order_id = None
+
+    @property
+    def available(self) -> bool:
+        return self.order_id is None
+
+    def __repr__(self) -> str:
+        return f"Driver({self.id!r}, {self.name!r}, {self.lat:.5f}, {self.lon:.5f})"
+
+
+class Fleet:
+    """Drivers indexed by grid cell, for nearest-available-driver queries.
+
+    ``max_km`` bounds how far from the pickup a driver is searched for and
+    ``speed_kmh`` converts distances to pickup ETAs.
+    """
+
+    def __init__(self, ref_lat: float = KUALA_LUMPUR[0], cell_km: float = 0.25, max_km: float = 15.0,
+                 speed_kmh: float = 25.0):
+        self.cell_km = cell_km
+        self.max_km = max_km
+        self.speed_kmh = speed_kmh
+        self._km_per_deg_lon = KM_PER_DEG_LON * math.cos(math.radians(ref_lat))
+        self._drivers = {}
+        # (column, row) -> set of available drivers in that cell
+        self._cells = {}
+        # order_id -> driver
+        self._assigned = {}
+
+    def __len__(self) -> int:
+        return len(self._drivers)
+
+    def __iter__(self):
+        return iter(self._drivers.values())
+
+    @property
+    def available(self) -> int:
+        return len(self._drivers) - len(self._assigned)
+
+    @property
+    def assigned(self) -> int:
+        return len(self._assigned)
+
+    def get(self, driver_id):
+        return self._drivers.get(driver_id)
+
+    def _project(self, lat: float, lon: float):
+        return lon * self._km_per_deg_lon, lat * KM_PER_DEG_LAT
+
+    def _place(self, driver: Driver) -> None:
+        driver.x, driver.y = self._project(driver.lat, driver.lon)
+        cell = (math.floor(driver.x / self.cell_km), math.floor(driver.y / self.cell_km))
+        if cell == driver.cell:
+            return
+        if driver.cell is not None:
+            self._unindex(driver)
+        driver.cell = cell
+        if driver.available:
+            bucket = self._cells.get(cell)
+            if bucket is None:
+                self._cells[cell] = {driver}
+            else:
+                bucket.add(driver)
+
+    def _unindex(self, driver: Driver) -> None:
+        bucket = self._cells.get(driver.cell)
+        if bucket is not None:
+            bucket.discard(driver)
+            if not bucket:
+                del self._cells[driver.cell]
+
+    def add(self, driver: Driver) -> Driver:
+        self._drivers[driver.id] = driver
+        self._place(driver)
+        return driver
+
+    def remove(self, driver_id) -> None:
+        """Take a driver off the road, e.g. at the end of their shift."""
+        driver = self._drivers.pop(driver_id, None)
+        if driver is None:
+            return
+        self._unindex(driver)
+        if driver.order_id is not None:
+            self._assigned.pop(driver.order_id, None)
+
+    def move(self, driver_id, lat: float, lon: float) -> None:
+        """Record a driver's new position."""
+        driver = self._drivers.get(driver_id)
+        if driver is None:
+            return
+        driver.lat = lat
+        driver.lon = lon
+        self._place(driver)
+
+    def zone_counts(self, zone_km: float) -> dict:
+        """Available drivers per square zone of ``zone_km``, keyed like ``zone``."""
+        per_zone = max(1, round(zone_km / self.cell_km))
+        counts = {}
+        for (cx, cy), bucket in self._cells.items():
+            zone = (cx // per_zone, cy // per_zone)
+            counts[zone] = counts.get(zone, 0) + len(bucket)
+        return counts
+
+    def zone(self, lat: float, lon: float, zone_km: float):
+        """The ``zone_counts`` key of the zone a point is in."""
+        per_zone = max(1, round(zone_km / self.cell_km))
+        x, y = self._project(lat, lon)
+        return math.floor(x / self.cell_km) // per_zone, math.floor(y / self.cell_km) // per_zone
+
+    def nearest(self, lat: float, lon: float, kind: str = None):
+        """Return ``(driver, distance_km)`` for the nearest available driver
+        (of vehicle type ``kind``, if given) within ``max_km``, or None."""
+        if kind is not None:
+            return self.nearest_each(lat, lon, (kind,)).get(kind)
+        x, y = self._project(lat, lon)
+        cell_km = self.cell_km
+        cx, cy = math.floor(x / cell_km), math.floor(y / cell_km)
+        # Distance from the point to the nearest edge of its own cell
+        margin = min(x - cx * cell_km, (cx + 1) * cell_km - x, y - cy * cell_km, (cy + 1) * cell_km - y)
+        cells = self._cells
+        best = None
+        best_d2 = self.max_km * self.max_km
+        for ring in range(math.ceil(self.max_km / cell_km) + 1):
+            if ring == 0:
+                ring_cells = ((cx, cy),)
+            else:
+                ring_cells = [(cx + dx, cy + dy) for dx in range(-ring, ring + 1) for dy in (-ring, ring)]
+                ring_cells += [(cx + dx, cy + dy) for dx in (-ring, ring) for dy in range(1 - ring, ring)]
+            for cell in ring_cells:
+                bucket = cells.get(cell)
+                if not bucket:
+                    continue
+                for driver in bucket:
+                    d2 = (driver.x - x) ** 2 + (driver.y - y) ** 2
+                    if d2 <= best_d2:
+                        best, best_d2 = driver, d2
+            # Every cell outside this ring is farther away than this
+            if best is not None and best_d2 <= (ring * cell_km + margin) ** 2:
+                break
+        if best is None:
+            return None
+        return best, math.sqrt(best_d2)
+
+    def nearest_each(self, lat: float, lon: float, kinds) -> dict:
+        """Return ``{kind: (driver, distance_km)}`` with the nearest available
+        driver of each vehicle type in ``kinds`` within ``max_km``; types
+        with nobody in range are left out."""
+        if not kinds:
+            return {}
+        x, y = self._project(lat, lon)
+        cell_km = self.cell_km
+        cx, cy = math.floor(x / cell_km), math.floor(y / cell_km)
+        margin = min(x - cx * cell_km, (cx + 1) * cell_km - x, y - cy * cell_km, (cy + 1) * cell_km - y)
+        cells = self._cells
+        limit = self.max_km * self.max_km
+        best = {}
+        best_d2 = dict.fromkeys(kinds, limit)
+        for ring in range(math.ceil(self.max_km / cell_km) + 1):
+            if ring == 0:
+                ring_cells = ((cx, cy),)
+            else:
+                ring_cells = [(cx + dx, cy + dy) for dx in range(-ring, ring + 1) for dy in (-ring, ring)]
+                ring_cells += [(cx + dx, cy + dy) for dx in (-ring, ring) for dy in range(1 - ring, ring)]
+            for cell in ring_cells:
+                bucket = cells.get(cell)
+                if not bucket:
+                    continue
+                for driver in bucket:
+                    kind = driver.kind
+                    if kind not in best_d2:
+                        continue
+                    d2 = (driver.x - x) ** 2 + (driver.y - y) ** 2
+                    if d2 <= best_d2[kind]:
+                        best[kind] = driver
+                        best_d2[kind] = d2
+            # Stop once every type has a driver closer than any unsearched cell
+            if len(best) == len(best_d2) and max(best_d2.values()) <= (ring * cell_km + margin) ** 2:
+                break
+        return {kind: (driver, math.sqrt(best_d2[kind])) for kind, driver in best.items()}
+
+    def assign(self, order_id, lat: float, lon: float, kind: str = None):
+        """Reserve the nearest available driver (of vehicle type ``kind``, if
+        given) for ``order_id``. Returns ``(driver, distance_km)``, or None
+        if nobody is in range."""
+        found = self.nearest(lat, lon, kind)
+        if found is None:
+            return None
+        driver, _ = found
+        self._unindex(driver)
+        driver.order_id = order_id
+        self._assigned[order_id] = driver
+        return found
+
+    def release(self, order_id):
+        """Make the driver of ``order_id`` available again. Returns the driver, or None."""
+        driver = self._assigned.pop(order_id, None)
+        if driver is None:
+            return None
+        driver.order_id = None
+        driver.cell = None
+        self._place(driver)
+        return driver
+
+    def eta_minutes(self, distance_km: float) -> int:
+        """Minutes for a driver ``distance_km`` away to reach the pickup (at least 1)."""
+        return max(1, math.ceil(distance_km / self.speed_kmh * 60))
+
+
+def generate_fleet(count: int, center=KUALA_LUMPUR, radius_km: float = 20.0, seed: int = 1) -> list:
+    """Return ``count`` simulated drivers within ``radius_km`` of ``center``,
+    normally distributed so they are densest in the middle. Vehicle types
+    are drawn according to ``FLEET_MIX``."""
+    rng = random.Random(seed)
+    kinds, shares = zip(*FLEET_MIX.items())
+    lat0, lon0 = center
+    km_per_deg_lon = KM_PER_DEG_LON * math.cos(math.radians(lat0))
+    drivers = []
+    while len(drivers) < count:
+        dx, dy = rng.gauss(0, radius_km / 2), rng.gauss(0, radius_km / 2)
+        if dx * dx + dy * dy > radius_km * radius_km:
+            continue
+        plate = f"W{chr(65 + rng.randrange(26))}{chr(65 + rng.randrange(26))} {rng.randrange(1, 9999)}"
+        kind = rng.choices(kinds, shares)[0]
+        drivers.append(Driver(
+            f"D{len(drivers)}",
+            rng.choice(DRIVER_NAMES),
+            f"{rng.choice(VEHICLES[kind])} {plate}",
+            lat0 + dy / KM_PER_DEG_LAT,
+            lon0 + dx / km_per_deg_lon,
+            kind,
+        ))
+    return drivers
+
+
+class FleetSimulator:
+    """Moves ``moves`` random drivers up to ``step_km`` every ``tick`` seconds,
+    standing in for the drivers' apps reporting their positions."""
+
+    def __init__(self, fleet: Fleet, moves: int, step_km: float = 0.1, tick: float = 1.0, seed: int = None):
+        self.fleet = fleet
+        self.moves = moves
+        self.step_km = step_km
+        self.tick = tick
+        self._rng = random.Random(seed)
+        self._ids = [driver.id for driver in fleet]
+        self._task = None
+
+    def step(self) -> None:
+        rng = self._rng
+        step = self.step_km
+        for driver_id in rng.choices(self._ids, k=self.moves) if self._ids else ():
+            driver = self.fleet.get(driver_id)
+            if driver is None:
+                continue
+            self.fleet.move(
+                driver_id,
+                driver.lat + rng.uniform(-step, step) / KM_PER_DEG_LAT,
+                driver.lon + rng.uniform(-step, step) / KM_PER_DEG_LON,
+            )
+
+    def start(self) -> None:
+        if self._task is None and self.moves:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.step()
+            except Exception as e:
+                logger.error("Error moving drivers: %s", e, exc_info=True)
@@ -0,0 +1,254 @@
+"""Intent matching for free-text messages.
+
+Messages such as "book a ride to KLCC", "where is my food" or "top up 50"
+are classified into one of the bot's services by the keyword phrases they
+contain. Every phrase of every intent is compiled once into an Aho-Corasick
+automaton, so a message is matched against all of them in a single pass
+over its characters, however many phrases there are. Phrases are matched
+on whole words of the normalized text (the same normalization as place
+names) and each found phrase adds its weight to its intent; the intent with
+the highest score wins if it reaches ``threshold``.
+
+Before matching, words of four letters or more that are one typo away
+from a keyword are corrected ("rdie" -> "ride"): a missing, extra or
+swapped letter, or a changed one in words of five letters or more, so
+"good" stays "good". Typo candidates come from a table of every keyword
+with one letter deleted, built along with the automaton, so correcting a
+word is a few dict lookups.
+
+Slots are pulled from the original text with regular expressions: a
+pickup (``from ...``) and destination (``to ...``) for rides, unless they
+are only keywords ("I want to book a ride"), an amount for top-ups, the
+message's content words for food, and the message itself for support when
+it says more than the keywords. Results for recently seen
+messages are kept in an LRU cache.
+"""
+import re
+from collections import deque
+from functools import lru_cache
+from types import MappingProxyType
+from typing import NamedTuple
+
+from places import normalize
+
+# intent -> {keyword phrase: weight}. Phrases are normalized like messages,
+# so "where's" is written "where s"
+KEYWORDS = {
+    'ride': {
+        'ride': 2, 'book a ride': 3, 'taxi': 2, 'cab': 2, 'grabcar': 3, 'grabbike': 3, 'book': 1,
+        'car': 1, 'bike': 1, 'take me': 3, 'pick me up': 3, 'drive me': 3, 'lift': 2, 'go to': 1,
+    },
+    'food': {
+        'food': 2, 'order food': 3, 'hungry': 3, 'eat': 2, 'makan': 3, 'lunch': 2, 'dinner': 2,
+        'breakfast': 2, 'restaurant': 2, 'delivery': 1, 'pizza': 2, 'burger': 2, 'sushi': 2,
+        'noodles': 2, 'chicken': 2, 'salad': 2, 'nasi lemak': 3,
+    },
+    'track': {
+        'track': 3, 'where is my': 3, 'where s my': 3, 'order status': 3, 'status': 2, 'my order': 2,
+        'eta': 2, 'how long': 3, 'arrive': 1, 'arrives': 1, 'late': 1, 'driver': 1,
+    },
+    'topup': {
+        'top up': 3, 'topup': 3, 'reload': 3, 'add money': 3,
+    },
+    'wallet': {
+        'wallet': 3, 'balance': 3, 'grabpay': 3, 'credit': 1, 'transactions': 2, 'history': 2,
+    },
+    'support': {
+        'support': 3, 'help': 2, 'complaint': 3, 'complain': 3, 'problem': 2, 'issue': 2, 'refund': 3,
+        'charged': 3, 'lost': 2, 'contact': 2, 'agent': 2, 'rude': 2,
+    },
+}
+
+# Slots extracted per intent
+SLOTS = {
+    'ride': ('pickup', 'destination'),
+    'food': ('words',),
+    'track': (),
+    'topup': ('amount',),
+    'wallet': (),
+    'support': ('issue',),
+}
+
+# Words that carry no meaning of their own in a request
+STOPWORDS = frozenset(
+    'i me my a an the to from for of at in on with and or is it its was be am are can could would '
+    'you your please pls want need like some get got just now hi hello s m d ll'.split()
+)
+
+_DESTINATION = re.compile(r'.*\bto\s+(?:the\s+)?(.+?)(?=\s+from\s|$)', re.IGNORECASE | re.DOTALL)
+_PICKUP = re.compile(r'\bfrom\s+(?:the\s+)?(.+?)(?=\s+to\s|$)', re.IGNORECASE | re.DOTALL)
+_AMOUNT = re.compile(r'\b(?:rm\s*)?(\d+(?:\.\d{1,2})?)\b', re.IGNORECASE)
+# Trailing punctuation dropped from extracted places
+_TRAILING = ' \t\n.,!?;:'
+
+
+class Intent(NamedTuple):
+    name: str
+    score: float
+    # Read-only; absent slots are missing rather than None
+    slots: MappingProxyType
+
+
+def _deletes(word: str):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _one_typo(a: str, b: str, change: bool = True) -> bool:
+    """Whether ``a`` and ``b`` differ by one inserted, deleted, swapped or
+    (if ``change``) changed letter."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return ((change and a[i + 1:] == b[i + 1:])
+            or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]))
+
+
+class IntentMatcher:
+    """Classifies messages into the intents of ``keywords``.
+
+    ``slots`` names the slots extracted for each intent.
+    """
+
+    def __init__(self, keywords=None, slots=None, threshold: float = 2, min_typo_length: int = 4,
+                 min_change_length: int = 5, cache_size: int = 10_000):
+        keywords = KEYWORDS if keywords is None else keywords
+        self.slots = SLOTS if slots is None else slots
+        self.intents = tuple(keywords)
+        self.threshold = threshold
+        self.min_typo_length = min_typo_length
+        self.min_change_length = min_change_length
+
+        # phrase -> ((intent, weight), ...), one pattern however many intents share it
+        phrases = {}
+        for intent, weighted in keywords.items():
+            for phrase, weight in weighted.items():
+                phrases.setdefault(normalize(phrase), []).append((intent, weight))
+        self._phrases = tuple(phrases)
+        self._weights = tuple(tuple(phrases[phrase]) for phrase in self._phrases)
+        self._build(' ' + phrase + ' ' for phrase in self._phrases)
+
+        # Words of each intent's keywords, and typo candidates for every keyword word
+        self._words = {
+            intent: frozenset(word for phrase in weighted for word in normalize(phrase).split())
+            for intent, weighted in keywords.items()
+        }
+        self._corrections = {}
+        for word in sorted(set().union(*self._words.values())):
+            if len(word) >= min_typo_length:
+                for key in _deletes(word) | {word}:
+                    self._corrections.setdefault(key, []).append(word)
+
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _build(self, patterns) -> None:
+        """Compile ``patterns`` into the automaton: a trie of ``_goto``
+        transitions, ``_fail`` links to the longest proper suffix in the trie,
+        and ``_output``, the patterns ending at each state."""
+        goto, output = [{}], [[]]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                following = goto[state].get(char)
+                if following is None:
+                    following = goto[state][char] = len(goto)
+                    goto.append({})
+                    output.append([])
+                state = following
+            output[state].append(index)
+
+        fail = [0] * len(goto)
+        pending = deque(goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, following in goto[state].items():
+                pending.append(following)
+                link = fail[state]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                link = goto[link].get(char, 0)
+                fail[following] = link if link != following else 0
+                output[following] += output[fail[following]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = tuple(tuple(found) for found in output)
+
+    def _find(self, key: str) -> set:
+        """Indexes of the phrases in normalized ``key``."""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        # Phrases are padded with spaces, so they only match whole words
+        for char in ' ' + key + ' ':
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def _score(self, key: str):
+        scores = dict.fromkeys(self.intents, 0)
+        for index in self._find(key):
+            for intent, weight in self._weights[index]:
+                scores[intent] += weight
+        # The first intent declared wins a tie
+        best = max(self.intents, key=scores.__getitem__)
+        return best, scores[best]
+
+    def correct(self, word: str) -> str:
+        """Return the keyword word ``word`` is a typo of, or ``word``."""
+        if len(word) < self.min_typo_length:
+            return word
+        candidates = set(self._corrections.get(word, ()))
+        for key in _deletes(word):
+            candidates.update(self._corrections.get(key, ()))
+        if word in candidates:
+            return word
+        change = len(word) >= self.min_change_length
+        for candidate in sorted(candidates):
+            if _one_typo(word, candidate, change):
+                return candidate
+        return word
+
+    def _classify(self, text: str):
+        """Return the ``Intent`` of ``text``, or None if it matches none well enough."""
+        key = normalize(text)
+        if not key:
+            return None
+        words = key.split()
+        corrected = [self.correct(word) for word in words]
+        if corrected != words:
+            key = ' '.join(corrected)
+        best, score = self._score(key)
+        if score < self.threshold:
+            return None
+        return Intent(best, score, MappingProxyType(self._slots(best, text, key)))
+
+    def _slots(self, intent: str, text: str, key: str) -> dict:
+        slots = {}
+        wanted = self.slots.get(intent, ())
+        for slot, pattern in (('destination', _DESTINATION.match), ('pickup', _PICKUP.search)):
+            found = pattern(text) if slot in wanted else None
+            if found:
+                place = found.group(1).strip(_TRAILING)
+                # "I want to book a ride" names no destination
+                if any(word not in STOPWORDS and word not in self._words[intent] for word in normalize(place).split()):
+                    slots[slot] = place
+        if 'amount' in wanted:
+            found = _AMOUNT.search(text)
+            if found:
+                slots['amount'] = float(found.group(1))
+        content = [word for word in key.split() if word not in STOPWORDS]
+        if 'words' in wanted and content:
+            slots['words'] = tuple(content)
+        # Support gets the message as the issue when it says more than "help"
+        if 'issue' in wanted and sum(word not in self._words[intent] for word in content) >= 2:
+            slots['issue'] = text.strip()
+        return slots
@@ -0,0 +1,154 @@
+"""Order lifecycle: moves orders through their statuses on a schedule.
+
+Food orders go Preparing -> On the way -> Delivered and rides go On the way
+-> Delivered, each step a fixed time after the order was placed. An order
+with an estimated arrival (``arrive_at``, set for quoted rides) is
+delivered then instead of after the fixed time. Every
+pending step is one small tuple in a single heap ordered by due time, so
+hundreds of thousands of active orders cost a few tuples each and one timer
+task in total, not a job per order.
+
+Every ``tick`` seconds the steps that are due are popped and applied, and
+the orders that changed are handed to a ``record`` callback, to save them,
+and then to a ``push`` callback in one batch, so users can be notified
+instead of polling. ``record`` runs in the tick itself, so a change is kept
+even if the process stops before it is pushed; each batch is pushed in a
+task of its own, so notifications held back by the send rate limit never
+delay the next tick.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+
+from order_store import DELIVERED, ON_THE_WAY, STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Order type -> steps of (status code, seconds after the order was placed)
+STAGES = {
+    'Food': ((ON_THE_WAY, 15 * 60), (DELIVERED, 28 * 60)),
+    'Ride': ((DELIVERED, 10 * 60),),
+}
+
+
+class OrderLifecycle:
+    """Schedules the status changes of the orders in an ``OrderStore``.
+
+    ``time_scale`` multiplies every step's delay, e.g. 0.01 to watch an
+    order go through its statuses in seconds.
+    """
+
+    def __init__(self, orders, stages=STAGES, time_scale: float = 1.0, tick: float = 1.0):
+        self.orders = orders
+        self.stages = stages
+        self.time_scale = time_scale
+        self.tick = tick
+        self._heap = []
+        self._seq = itertools.count()
+        # Ids of orders with steps in the heap
+        self._scheduled = set()
+        self._task = None
+        # Pushes still delivering their batch
+        self._pushes = set()
+        self.changed = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of status changes waiting to happen."""
+        return len(self._heap)
+
+    def schedule(self, order) -> None:
+        """Queue the order's remaining steps. Scheduling an order twice does nothing."""
+        if order.id in self._scheduled:
+            return
+        steps = [step for step in self.stages.get(order.type, ()) if step[0] > order.status_code]
+        if not steps:
+            return
+        self._scheduled.add(order.id)
+        last = len(steps) - 1
+        for i, (code, after) in enumerate(steps):
+            due = order.created_at + after * self.time_scale
+            if i == last and order.arrive_at:
+                due = order.arrive_at
+            heapq.heappush(self._heap, (due, next(self._seq), order.id, code, i == last))
+
+    def arrival(self, order):
+        """Return when the order will be delivered, or None if it has been."""
+        if order.status_code >= DELIVERED:
+            return None
+        if order.arrive_at:
+            return order.arrive_at
+        steps = self.stages.get(order.type)
+        return order.created_at + steps[-1][1] * self.time_scale if steps else None
+
+    def eta(self, order, now: float = None) -> str:
+        """Time left until the order is delivered, e.g. ``"12 min"``."""
+        arrival = self.arrival(order)
+        if arrival is None:
+            return '-'
+        now = time.time() if now is None else now
+        return f"{max(1, math.ceil((arrival - now) / 60))} min"
+
+    def advance(self, now: float = None) -> list:
+        """Apply every step due by ``now``. Returns the orders that changed, in due order."""
+        now = time.time() if now is None else now
+        heap = self._heap
+        changed = []
+        while heap and heap[0][0] <= now:
+            _, _, order_id, code, final = heapq.heappop(heap)
+            if final:
+                self._scheduled.discard(order_id)
+            order = self.orders.get(order_id)
+            if order is None or order.status_code >= code:
+                # Evicted, or already moved on
+                continue
+            self.orders.set_status(order_id, STATUSES[code], now)
+            order.eta = self.eta(order, now)
+            changed.append(order)
+        self.changed += len(changed)
+        return changed
+
+    def start(self, push, record=None) -> None:
+        """Start ticking; each tick's changed orders are passed to ``record``
+        and then ``push``."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(push, record))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pushes = list(self._pushes)
+        for task in pushes:
+            task.cancel()
+        await asyncio.gather(*pushes, return_exceptions=True)
+
+    async def _run(self, push, record) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            changed = self.advance()
+            # Delivered orders expire even for users who never order again
+            self.orders.evict_delivered()
+            if changed:
+                if record is not None:
+                    try:
+                        record(changed)
+                    except Exception as e:
+                        logger.error("Error recording order updates: %s", e, exc_info=True)
+                task = asyncio.create_task(self._push(push, changed))
+                self._pushes.add(task)
+                task.add_done_callback(self._pushes.discard)
+
+    @staticmethod
+    async def _push(push, changed) -> None:
+        try:
+            await push(changed)
+        except Exception as e:
+            logger.error("Error pushing order updates: %s", e, exc_info=True)
@@ -0,0 +1,176 @@
+"""Message catalogs for the languages the bot speaks.
+
+English is the text in render.py. Every other language is a JSON catalog in
+``data/locales`` named after its language code, e.g. ``ms.json``::
+
+    {"name": "Bahasa Melayu",
+     "messages": {"CANCELLED": "Dibatalkan. Guna /menu untuk melihat pilihan.",
+                  "WELCOME": ["👋 <b>Selamat datang ke Grab, {first_name}!</b>", "", "..."],
+                  "TRACK_NOTES": {"Preparing": "{order} anda sedang disediakan."}},
+     "buttons": {"🚗 Book a Ride": "🚗 Tempah Perjalanan"}}
+
+Messages are translated by their name in render.py (``render.MESSAGES``); a
+list stands for its lines joined with newlines, and dicts are translated key
+by key (``"Food/On the way"`` for the key ``('Food', 'On the way')``).
+Buttons are translated by their English label. Anything a catalog leaves
+out stays in English.
+
+Catalogs are read and checked once at startup and compiled into a
+``Locale`` per language, whose screens, templates and keyboards are built
+the way render.py builds the English ones, so a screen costs the same in
+every language. A translation with a field the English text does not have
+stops the bot at startup rather than failing when a user first sees it.
+"""
+import json
+import logging
+import os
+from types import MappingProxyType
+
+import render
+
+logger = logging.getLogger(__name__)
+
+# The language of render.py, and of users whose language is not in a catalog
+DEFAULT = 'en'
+
+# Language codes remembered by Locales.get, e.g. Telegram's 'en-US'
+MATCH_CACHE_SIZE = 1024
+
+
+def _key(key) -> str:
+    """The key a catalog uses for a key of a dict message."""
+    return '/'.join(key) if isinstance(key, tuple) else key
+
+
+class Locale:
+    """The screens, templates, texts and keyboards of one language, under
+    the names render.py gives them in English."""
+
+    def __init__(self, code: str, name: str, messages: dict = None, buttons: dict = None):
+        self.code = code
+        self.name = name
+        self._labels = dict(buttons or {})
+        self._keyboards = {}
+        messages = messages or {}
+        unknown = set(messages) - set(render.MESSAGES)
+        if unknown:
+            raise ValueError(f"{code}: unknown messages {', '.join(sorted(unknown))}")
+        for message in render.MESSAGES:
+            setattr(self, message, self._translate(message, getattr(render, message), messages.get(message)))
+
+    def label(self, text: str) -> str:
+        """The label of the button labelled ``text`` in English."""
+        return self._labels.get(text, text)
+
+    def keyboard(self, markup):
+        """``markup`` with its buttons translated, built once per keyboard."""
+        if markup is None or not self._labels:
+            return markup
+        try:
+            return self._keyboards[markup]
+        except KeyError:
+            pass
+        rows = [[(self.label(button.text), button.callback_data) for button in row] for row in markup.inline_keyboard]
+        translated = markup
+        if any(label != button.text for row, buttons in zip(rows, markup.inline_keyboard)
+               for (label, _), button in zip(row, buttons)):
+            translated = render.keyboard(*rows)
+        self._keyboards[markup] = translated
+        return translated
+
+    def _translate(self, name: str, english, text):
+        if isinstance(english, dict):
+            if text is not None and not isinstance(text, dict):
+                raise ValueError(f"{self.code}: {name} must be an object")
+            text = text or {}
+            keys = {_key(key): key for key in english}
+            unknown = set(text) - set(keys)
+            if unknown:
+                raise ValueError(f"{self.code}: unknown keys of {name}: {', '.join(sorted(unknown))}")
+            return {key: self._translate(f"{name}[{catalog_key}]", english[key], text.get(catalog_key))
+                    for catalog_key, key in keys.items()}
+
+        if isinstance(text, list):
+            text = '\n'.join(text)
+        elif text is not None and not isinstance(text, str):
+            raise ValueError(f"{self.code}: {name} must be text or a list of lines")
+        if isinstance(english, render.Template):
+            if text is not None:
+                self._check_fields(name, english.text, text)
+            markup = self.keyboard(english.reply_markup)
+            if text is None and markup is english.reply_markup:
+                return english
+            return render.Template(english.text if text is None else text, markup, english.parse_mode)
+        if isinstance(english, MappingProxyType):
+            markup = self.keyboard(english['reply_markup'])
+            if text is None and markup is english['reply_markup']:
+                return english
+            return render.screen(english['text'] if text is None else text, markup, english['parse_mode'])
+        if text is None:
+            return english
+        self._check_fields(name, english, text)
+        return text
+
+    def _check_fields(self, name: str, english: str, text: str) -> None:
+        try:
+            extra = render.field_names(text) - render.field_names(english)
+        except ValueError as e:
+            raise ValueError(f"{self.code}: {name}: {e}") from None
+        if extra:
+            raise ValueError(f"{self.code}: {name} has fields the English text does not: "
+                             f"{', '.join(sorted(extra))}")
+
+    def __repr__(self) -> str:
+        return f"Locale({self.code!r}, {self.name!r})"
+
+
+class Locales:
+    """The languages the bot speaks, by language code."""
+
+    def __init__(self, locales, default: str = DEFAULT):
+        self._locales = {locale.code: locale for locale in locales}
+        self.default = self._locales[default]
+        # (code, name) of every language, to choose from
+        self.languages = tuple((locale.code, locale.name) for locale in self._locales.values())
+        self._matched = dict(self._locales)
+
+    def __iter__(self):
+        return iter(self._locales.values())
+
+    def __len__(self) -> int:
+        return len(self._locales)
+
+    def get(self, code) -> Locale:
+        """The locale for ``code``, a language code such as ``ms`` or
+        Telegram's ``en-US``; the default one for unknown codes and None."""
+        try:
+            return self._matched[code]
+        except KeyError:
+            pass
+        locale = self._match(code)
+        if len(self._matched) < MATCH_CACHE_SIZE:
+            self._matched[code] = locale
+        return locale
+
+    def _match(self, code) -> Locale:
+        if not code:
+            return self.default
+        code = code.lower().replace('_', '-')
+        return self._locales.get(code) or self._locales.get(code.split('-')[0]) or self.default
+
+
+def load_locales(directory: str, default: str = DEFAULT) -> Locales:
+    """English plus the language of every ``<code>.json`` catalog in
+    ``directory``; a catalog named after the default language replaces it."""
+    locales = {DEFAULT: Locale(DEFAULT, 'English')}
+    filenames = sorted(os.listdir(directory)) if os.path.isdir(directory) else ()
+    for filename in filenames:
+        code, extension = os.path.splitext(filename)
+        if extension != '.json':
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            catalog = json.load(f)
+        code = code.lower()
+        locales[code] = Locale(code, catalog.get('name', code), catalog.get('messages'), catalog.get('buttons'))
+    logger.info("Loaded %d languages: %s", len(locales), ', '.join(locales))
+    return Locales(locales.values(), default)
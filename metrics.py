@@ -0,0 +1,290 @@
+"""Handler metrics in the Prometheus text format.
+
+Records per-handler and per-callback-action latency histograms, updates by
+type, conversation state transitions and errors, and serves them from a
+small HTTP endpoint (``GET /metrics``) for Prometheus to scrape.
+
+``instrument(application)`` wraps every registered handler callback,
+including those inside conversations, with a timer. Observations are a
+bisect and two list increments; rendering happens only when scraped.
+"""
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+from http import HTTPStatus
+
+from telegram import Update
+from telegram.ext import ConversationHandler, TypeHandler
+
+from webhook import HTTPError, read_request, write_response
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; handlers usually finish well under a millisecond
+# without network, so the low end is finer than Prometheus' defaults
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Update attributes checked, in order, to name an update's type
+UPDATE_TYPES = (
+    'message', 'callback_query', 'edited_message', 'inline_query', 'chosen_inline_result',
+    'channel_post', 'edited_channel_post', 'shipping_query', 'pre_checkout_query', 'poll',
+    'poll_answer', 'my_chat_member', 'chat_member', 'chat_join_request',
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    """Observation counts in fixed buckets, plus their sum, per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._children = {}
+
+    def observe(self, value: float, *labels) -> None:
+        child = self._children.get(labels)
+        if child is None:
+            child = self._children[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        child[bisect_left(self.buckets, value)] += 1
+        child[-1] += value
+
+    def count(self, *labels) -> int:
+        child = self._children.get(labels)
+        return sum(child[:-1]) if child else 0
+
+    def samples(self):
+        for labels, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, child):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            cumulative += child[-2]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {child[-1]}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class FunctionMetric:
+    """A gauge or counter whose value is read from ``function`` at scrape time."""
+
+    def __init__(self, name: str, help: str, function, kind: str = 'gauge'):
+        self.name = name
+        self.help = help
+        self.function = function
+        self.kind = kind
+
+    def samples(self):
+        yield f"{self.name} {self.function()}"
+
+
+class Registry:
+    """The set of metrics rendered by the endpoint."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    'bot_handler_latency_seconds', "Time spent in each handler callback.", ('handler',)
+))
+ACTION_LATENCY = REGISTRY.register(Histogram(
+    'bot_callback_action_latency_seconds', "Time spent handling each inline button action.", ('action',)
+))
+UPDATES = REGISTRY.register(Counter(
+    'bot_updates_total', "Updates received, by type.", ('type',)
+))
+TRANSITIONS = REGISTRY.register(Counter(
+    'bot_conversation_transitions_total', "Conversation state changes.", ('conversation', 'from_state', 'to_state')
+))
+ERRORS = REGISTRY.register(Counter(
+    'bot_errors_total', "Exceptions raised by handlers, by exception type.", ('exception',)
+))
+
+
+def update_type(update: Update) -> str:
+    """Return the kind of update, with commands split out from messages."""
+    for attr in UPDATE_TYPES:
+        value = getattr(update, attr)
+        if value is not None:
+            if attr == 'message' and value.text and value.text.startswith('/'):
+                return 'command'
+            return attr
+    return 'other'
+
+
+async def _count_update(update: Update, context) -> None:
+    UPDATES.inc(update_type(update))
+
+
+def timed(callback, conversation: str = None, from_state: str = None, state_names=None):
+    """Wrap a handler callback to record its latency and, in a conversation,
+    the state it moves to."""
+    name = callback.__name__
+    state_names = state_names or {}
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            result = await callback(update, context)
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, name)
+        if conversation is not None and result is not None:
+            to_state = 'end' if result == ConversationHandler.END else state_names.get(result, result)
+            TRANSITIONS.inc(conversation, from_state, to_state)
+        return result
+    return wrapper
+
+
+def _instrument_handler(handler, state_names, conversation=None, from_state=None) -> None:
+    if isinstance(handler, ConversationHandler):
+        name = handler.name or 'conversation'
+        for h in handler.entry_points:
+            _instrument_handler(h, state_names, name, 'start')
+        for state, handlers in handler.states.items():
+            for h in handlers:
+                _instrument_handler(h, state_names, name, state_names.get(state, state))
+        for h in handler.fallbacks:
+            _instrument_handler(h, state_names, name, 'fallback')
+        return
+    handler.callback = timed(handler.callback, conversation, from_state, state_names)
+
+
+def instrument(application, state_names=None, registry: Registry = REGISTRY) -> None:
+    """Time every handler registered on ``application`` and count updates.
+
+    ``state_names`` maps conversation states to the labels used for them.
+    Call this after all handlers are added. The update processor's load and
+    the send scheduler's queue depth and counters are exported too, when
+    those are in use.
+    """
+    state_names = state_names or {}
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler, state_names)
+    application.add_handler(TypeHandler(Update, _count_update), group=-1)
+
+    processor = application.update_processor
+    if hasattr(processor, 'busy_keys'):
+        registry.register(FunctionMetric(
+            'bot_updates_running', "Updates being processed right now.", lambda: processor.active
+        ))
+        registry.register(FunctionMetric(
+            'bot_users_busy', "Users with an update running or waiting.", lambda: processor.busy_keys
+        ))
+
+    scheduler = application.bot.rate_limiter
+    if hasattr(scheduler, 'stats'):
+        registry.register(FunctionMetric(
+            'bot_outbound_queue_depth', "Outgoing requests waiting to be sent.", lambda: scheduler.queued
+        ))
+        registry.register(FunctionMetric(
+            'bot_outbound_wait_p95_seconds', "95th percentile send queue wait over recent requests.",
+            lambda: scheduler.stats()['wait_p95']
+        ))
+        for name, attr, help in (
+            ('bot_outbound_sent_total', 'sent', "Outgoing requests sent."),
+            ('bot_outbound_coalesced_total', 'coalesced', "Edits merged into a queued edit."),
+            ('bot_outbound_skipped_total', 'skipped', "Edits skipped because nothing changed."),
+            ('bot_outbound_retries_total', 'retries', "Requests retried after a flood limit."),
+        ):
+            registry.register(FunctionMetric(name, help, functools.partial(getattr, scheduler, attr), 'counter'))
+
+
+class MetricsServer:
+    """Serve ``registry`` at ``GET /metrics``."""
+
+    def __init__(self, registry: Registry = REGISTRY, listen: str = '127.0.0.1', port: int = 9090):
+        self.registry = registry
+        self.listen = listen
+        self.port = port
+        self._server = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        logger.info("Metrics available at http://%s:%s/metrics", self.listen, self.port)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader, writer) -> None:
+        try:
+            try:
+                method, path, _, _, _ = await read_request(reader, 0)
+            except HTTPError as e:
+                write_response(writer, e.status, keep_alive=False)
+            except asyncio.IncompleteReadError:
+                return
+            else:
+                if path != '/metrics':
+                    write_response(writer, HTTPStatus.NOT_FOUND, keep_alive=False)
+                elif method != 'GET':
+                    write_response(writer, HTTPStatus.METHOD_NOT_ALLOWED, keep_alive=False)
+                else:
+                    body = self.registry.render().encode()
+                    write_response(writer, HTTPStatus.OK, body, keep_alive=False, content_type=CONTENT_TYPE)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,153 @@
+"""In-memory order store with a per-user index.
+
+Orders are kept as compact ``__slots__`` records and every user has a
+newest-first index, so looking up a user's latest order does not depend on
+how many orders the store holds in total.
+"""
+import time
+from collections import deque
+
+# Order statuses, stored on each record as an index into this tuple
+STATUSES = ('Preparing', 'On the way', 'Delivered')
+PREPARING, ON_THE_WAY, DELIVERED = range(len(STATUSES))
+_STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+
+class Order:
+    """A single ride or food order."""
+
+    __slots__ = (
+        'id', 'user_id', 'type', 'status_code', 'eta', 'created_at',
+        'delivered_at', 'restaurant', 'pickup', 'destination', 'driver',
+        'vehicle', 'fare', 'arrive_at',
+    )
+
+    def __init__(self, id, user_id, type, status='Preparing', eta='15-20 min',
+                 created_at=None, restaurant=None, pickup=None,
+                 destination=None, driver=None, vehicle=None, fare=None,
+                 arrive_at=None):
+        self.id = id
+        self.user_id = user_id
+        self.type = type
+        self.status_code = _STATUS_CODES[status]
+        self.eta = eta
+        self.created_at = time.time() if created_at is None else created_at
+        self.delivered_at = None
+        self.restaurant = restaurant
+        self.pickup = pickup
+        self.destination = destination
+        self.driver = driver
+        self.vehicle = vehicle
+        # Quoted fare, and when the order is expected to arrive (epoch seconds)
+        self.fare = fare
+        self.arrive_at = arrive_at
+
+    @property
+    def status(self) -> str:
+        return STATUSES[self.status_code]
+
+    def to_dict(self) -> dict:
+        """Return the order as a plain dict (for persistence and export)."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Order':
+        order = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(order, name, data.get(name))
+        return order
+
+    def __repr__(self) -> str:
+        return f"Order(id={self.id!r}, user_id={self.user_id}, type={self.type!r}, status={self.status!r})"
+
+
+class OrderStore:
+    """Orders indexed by id and by user, newest first.
+
+    Delivered orders are evicted once they are older than ``retention``
+    seconds, when an order is added and on every tick of the order
+    lifecycle. If ``archive`` is given it is called with each evicted order
+    before it is dropped.
+    """
+
+    def __init__(self, retention: float = 24 * 3600, archive=None):
+        self.retention = retention
+        self.archive = archive
+        self._by_id = {}
+        # user_id -> list of orders, oldest first, so the latest is [-1]
+        self._by_user = {}
+        # (delivered_at, order_id) in delivery order, oldest on the left
+        self._delivered = deque()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, order_id) -> bool:
+        return order_id in self._by_id
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def get(self, order_id):
+        return self._by_id.get(order_id)
+
+    def add(self, order: Order) -> Order:
+        """Store a new order and make it the user's latest."""
+        self._by_id[order.id] = order
+        user_orders = self._by_user.get(order.user_id)
+        if user_orders is None:
+            self._by_user[order.user_id] = [order]
+        else:
+            user_orders.append(order)
+        if self._delivered:
+            self.evict_delivered()
+        return order
+
+    def latest_for_user(self, user_id):
+        """Return the user's most recent order, or None."""
+        user_orders = self._by_user.get(user_id)
+        return user_orders[-1] if user_orders else None
+
+    def for_user(self, user_id):
+        """Return the user's orders, newest first."""
+        return self._by_user.get(user_id, [])[::-1]
+
+    def user_ids(self):
+        """Return the ids of the users with orders in memory."""
+        return self._by_user.keys()
+
+    def forget_user(self, user_id) -> None:
+        """Drop the user's orders from memory, e.g. when another process takes the user over."""
+        for order in self._by_user.pop(user_id, ()):
+            self._by_id.pop(order.id, None)
+
+    def set_status(self, order_id, status: str, now: float = None):
+        """Move an order to a new status. Returns the order, or None."""
+        order = self._by_id.get(order_id)
+        if order is None:
+            return None
+        code = _STATUS_CODES[status]
+        order.status_code = code
+        if code == DELIVERED and order.delivered_at is None:
+            order.delivered_at = time.time() if now is None else now
+            self._delivered.append((order.delivered_at, order_id))
+        return order
+
+    def evict_delivered(self, now: float = None) -> int:
+        """Drop delivered orders older than the retention period."""
+        cutoff = (time.time() if now is None else now) - self.retention
+        evicted = 0
+        while self._delivered and self._delivered[0][0] <= cutoff:
+            _, order_id = self._delivered.popleft()
+            order = self._by_id.pop(order_id, None)
+            if order is None:
+                continue
+            user_orders = self._by_user.get(order.user_id)
+            if user_orders is not None:
+                user_orders.remove(order)
+                if not user_orders:
+                    del self._by_user[order.user_id]
+            if self.archive is not None:
+                self.archive(order)
+            evicted += 1
+        return evicted
@@ -0,0 +1,308 @@
+"""Outbound send scheduler between the handlers and the Bot API.
+
+``OutboundScheduler`` is a python-telegram-bot rate limiter: every Bot API
+call that targets a chat passes through it. It enforces Telegram's flood
+limits with a global token bucket and one bucket per chat, sends
+interactive replies before notifications, merges queued edits of the same
+message into one request, skips edits that would not change the message and
+backs off on ``RetryAfter``.
+
+Requests to the same chat are sent one at a time, in the order they were
+made: the next is only sent once the one before it has finished. Pass
+``rate_limit_args=NOTIFICATION`` to a bot method to send at low priority,
+or ``BROADCAST`` to send after everything else.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Priorities, lower is sent first
+INTERACTIVE = 0
+NOTIFICATION = 10
+BROADCAST = 20
+
+# Telegram's published limits: ~30 messages/s overall, about one message
+# per second in a private chat (short bursts are tolerated) and 20 messages
+# per minute in a group
+GLOBAL_RATE = 30.0
+PRIVATE_CHAT_RATE = 1.0
+PRIVATE_CHAT_BURST = 3
+GROUP_CHAT_RATE = 20 / 60
+GROUP_CHAT_BURST = 3
+
+# Full per-chat buckets are dropped once there are more than this many
+MAX_IDLE_BUCKETS = 50_000
+
+EDIT_ENDPOINTS = frozenset({'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption'})
+
+
+class TokenBucket:
+    """Tokens refill at ``rate`` per second up to ``capacity``."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Request:
+    __slots__ = ('priority', 'seq', 'chat_id', 'edit_key', 'callback', 'args', 'kwargs', 'data',
+                 'future', 'enqueued')
+
+    def __init__(self, priority, seq, chat_id, edit_key, callback, args, kwargs, data):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.edit_key = edit_key
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.data = data
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+
+
+def _content(data: dict):
+    return data.get('text', data.get('caption')), data.get('reply_markup')
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """Flood-limit-aware scheduler for outgoing Bot API requests."""
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, private_chat_rate: float = PRIVATE_CHAT_RATE,
+                 private_chat_burst: int = PRIVATE_CHAT_BURST, group_chat_rate: float = GROUP_CHAT_RATE,
+                 group_chat_burst: int = GROUP_CHAT_BURST, max_retries: int = 3,
+                 content_cache_size: int = 10_000):
+        self.global_rate = global_rate
+        self.private_chat_rate = private_chat_rate
+        self.private_chat_burst = private_chat_burst
+        self.group_chat_rate = group_chat_rate
+        self.group_chat_burst = group_chat_burst
+        self.max_retries = max_retries
+        self.content_cache_size = content_cache_size
+
+        self._global = None
+        self._buckets = {}
+        # chat_id -> queued requests, in order; kept while one is being sent
+        self._chats = {}
+        # (priority, seq, chat_id) of chats whose head request may be sent now
+        self._ready = []
+        # (ready_at, chat_id) of chats waiting for a chat token
+        self._waiting = []
+        # edit key -> queued edit request, for coalescing
+        self._pending_edits = {}
+        # (chat_id, message_id) -> last (text, reply_markup) sent
+        self._last_content = OrderedDict()
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._paused_until = 0.0
+        self._dispatcher = None
+        self._tasks = set()
+
+        self.queued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.retries = 0
+        self.wait_times = deque(maxlen=1000)
+
+    async def initialize(self) -> None:
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        for requests in self._chats.values():
+            for request in requests:
+                if not request.future.done():
+                    request.future.cancel()
+        self._chats.clear()
+
+    def stats(self) -> dict:
+        """Return queue depth, counters and recent wait times (seconds)."""
+        waits = sorted(self.wait_times)
+        return {
+            'queue_depth': self.queued,
+            'chats_queued': len(self._chats),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'skipped_noop': self.skipped,
+            'retries': self.retries,
+            'wait_p50': waits[len(waits) // 2] if waits else 0.0,
+            'wait_p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+            'wait_max': waits[-1] if waits else 0.0,
+        }
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.private_chat_rate, self.private_chat_burst)
+            else:
+                bucket = TokenBucket(self.group_chat_rate, self.group_chat_burst)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _schedule(self, chat_id, now: float) -> None:
+        """Put a chat with queued requests into the ready or waiting heap."""
+        head = self._chats[chat_id][0]
+        delay = self._bucket(chat_id).delay(now)
+        if delay:
+            heapq.heappush(self._waiting, (now + delay, chat_id))
+        else:
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+
+    def _remember(self, key, content) -> None:
+        self._last_content[key] = content
+        self._last_content.move_to_end(key)
+        if len(self._last_content) > self.content_cache_size:
+            self._last_content.popitem(last=False)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await self._send_with_retries(callback, args, kwargs)
+
+        edit_key = None
+        if endpoint in EDIT_ENDPOINTS:
+            edit_key = (chat_id, data.get('message_id'))
+            pending = self._pending_edits.get(edit_key)
+            if pending is not None:
+                # The queued edit has not been sent yet: send this content instead
+                pending.callback, pending.args, pending.kwargs, pending.data = callback, args, kwargs, data
+                self.coalesced += 1
+                return await asyncio.shield(pending.future)
+            if self._last_content.get(edit_key) == _content(data):
+                self.skipped += 1
+                return True
+
+        priority = INTERACTIVE if rate_limit_args is None else rate_limit_args
+        request = _Request(priority, next(self._seq), chat_id, edit_key, callback, args, kwargs, data)
+        if edit_key is not None:
+            self._pending_edits[edit_key] = request
+        requests = self._chats.get(chat_id)
+        if requests is None:
+            self._chats[chat_id] = deque([request])
+            self._schedule(chat_id, time.monotonic())
+        else:
+            requests.append(request)
+        self.queued += 1
+        self._wakeup.set()
+        return await asyncio.shield(request.future)
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            now = time.monotonic()
+            while self._waiting and self._waiting[0][0] <= now:
+                _, chat_id = heapq.heappop(self._waiting)
+                self._schedule(chat_id, now)
+
+            if not self._ready:
+                timeout = self._waiting[0][0] - now if self._waiting else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = max(self._global.delay(now), self._paused_until - now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            requests = self._chats[chat_id]
+            request = requests.popleft()
+            self._global.take(now)
+            self._bucket(chat_id).take(now)
+            if request.edit_key is not None and self._pending_edits.get(request.edit_key) is request:
+                del self._pending_edits[request.edit_key]
+            self.queued -= 1
+            self.wait_times.append(now - request.enqueued)
+
+            task = asyncio.create_task(self._send(request))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+            if len(self._buckets) > MAX_IDLE_BUCKETS:
+                self._buckets = {
+                    cid: bucket for cid, bucket in self._buckets.items()
+                    if cid in self._chats or not bucket.is_full(now)
+                }
+
+    def _sent(self, chat_id) -> None:
+        """Let the chat's next request go now that the one before it has finished."""
+        if self._chats[chat_id]:
+            self._schedule(chat_id, time.monotonic())
+            self._wakeup.set()
+        else:
+            del self._chats[chat_id]
+
+    async def _send(self, request: _Request) -> None:
+        try:
+            result = await self._send_with_retries(request.callback, request.args, request.kwargs)
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+            return
+        finally:
+            self._sent(request.chat_id)
+        self.sent += 1
+        data = request.data
+        if request.edit_key is not None:
+            self._remember(request.edit_key, _content(data))
+        elif isinstance(result, dict) and 'message_id' in result:
+            self._remember((request.chat_id, result['message_id']), _content(data))
+        if not request.future.done():
+            request.future.set_result(result)
+
+    async def _send_with_retries(self, callback, args, kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = float(e.retry_after)
+                logger.warning("Flood limit hit, retrying in %ss", retry_after)
+                self.retries += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                await asyncio.sleep(retry_after)
+            except BadRequest as e:
+                if 'message is not modified' in str(e).lower():
+                    return True
+                raise
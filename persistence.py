@@ -0,0 +1,237 @@
+"""Incremental SQLite persistence for conversation states and user_data.
+
+``SQLitePersistence`` is a python-telegram-bot persistence backend that
+stores one row per user's ``user_data`` and one row per conversation key,
+so a restart in the middle of a ride booking keeps the user's step and
+pickup. Unlike the pickle-file persistence, which rewrites everything on
+each flush, only the rows that changed are written:
+
+* python-telegram-bot hands over each changed user and conversation key
+  every ``update_interval`` seconds; unchanged user_data is skipped
+  (compared by hash) and the rest is written in one transaction on a
+  background thread right after.
+* Values are stored as compact JSON.
+* Nothing is read at startup. ``attach()`` adds a handler that runs before
+  all others and loads a user's data and conversation states the first
+  time the user sends an update after a restart.
+
+Conversation rows are found by user id, the last element of the default
+``(chat_id, user_id)`` conversation key.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram import Update
+from telegram.ext import BasePersistence, ConversationHandler, PersistenceInput, TypeHandler
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+class SQLitePersistence(BasePersistence):
+    """Persist user_data and conversation states to SQLite, one row per key."""
+
+    def __init__(self, path: str, update_interval: float = 1.0):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='persistence')
+        self._conn = None
+        # conversation name -> persistent ConversationHandler
+        self._handlers = {}
+        # Users whose rows have been loaded
+        self._loaded = set()
+        # user_id -> hash of the user_data last written (or loaded)
+        self._written = {}
+        # user_id -> JSON to write, or None to delete
+        self._pending_users = {}
+        # (user_id, name, key JSON) -> state JSON, or None to delete
+        self._pending_conversations = {}
+        self._flush_task = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS user_state (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)')
+            # Keyed by user first, so a user's rows are one range read
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS conversations (user_id INTEGER NOT NULL, name TEXT NOT NULL, '
+                'key TEXT NOT NULL, state TEXT NOT NULL, PRIMARY KEY (user_id, name, key)) WITHOUT ROWID'
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _read(self, user_id):
+        conn = self._connection()
+        row = conn.execute('SELECT data FROM user_state WHERE user_id = ?', (user_id,)).fetchone()
+        conversations = conn.execute(
+            'SELECT name, key, state FROM conversations WHERE user_id = ?', (user_id,)
+        ).fetchall()
+        return row[0] if row else None, conversations
+
+    def _write(self, users: dict, conversations: dict) -> None:
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO user_state (user_id, data) VALUES (?, ?)',
+                [(user_id, data) for user_id, data in users.items() if data is not None]
+            )
+            conn.executemany(
+                'DELETE FROM user_state WHERE user_id = ?',
+                [(user_id,) for user_id, data in users.items() if data is None]
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO conversations (user_id, name, key, state) VALUES (?, ?, ?, ?)',
+                [(*row_key, state) for row_key, state in conversations.items() if state is not None]
+            )
+            conn.executemany(
+                'DELETE FROM conversations WHERE user_id = ? AND name = ? AND key = ?',
+                [row_key for row_key, state in conversations.items() if state is None]
+            )
+
+    def attach(self, application) -> None:
+        """Load each user's rows on their first update. Call after adding the
+        conversation handlers."""
+        self._handlers = {
+            handler.name: handler
+            for handler in itertools.chain.from_iterable(application.handlers.values())
+            if isinstance(handler, ConversationHandler) and handler.persistent
+        }
+        # Runs before the conversation handlers look up the user's state
+        application.add_handler(TypeHandler(Update, self.load_user), group=-2)
+
+    async def load_user(self, update: Update, context) -> None:
+        """Restore the user's data and conversation states, once per user."""
+        user = update.effective_user
+        if user is None or user.id in self._loaded:
+            return
+        data, conversations = await self._run(self._read, user.id)
+        if user.id in self._loaded:
+            return
+        self._loaded.add(user.id)
+        if data is not None:
+            # Anything set since the restart is newer than the stored copy
+            for name, value in json.loads(data).items():
+                context.user_data.setdefault(name, value)
+        self._written[user.id] = hash(data or '{}')
+        for name, key, state in conversations:
+            handler = self._handlers.get(name)
+            if handler is None:
+                continue
+            key = tuple(json.loads(key))
+            # The states live in the handler; there is no public per-key setter
+            if key not in handler._conversations:
+                handler._conversations.update_no_track({key: json.loads(state)})
+
+    def forget(self, user_ids) -> None:
+        """Drop the users' data and conversation states from memory, so they
+        are loaded again on their next update. Call ``flush()`` first."""
+        user_ids = set(user_ids)
+        for user_id in user_ids:
+            self._loaded.discard(user_id)
+            self._written.pop(user_id, None)
+        for handler in self._handlers.values():
+            # Removed from the underlying dict: a tracked removal would delete the stored row
+            states = handler._conversations.data
+            for key in [key for key in states if key[-1] in user_ids]:
+                del states[key]
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_soon())
+
+    async def _flush_soon(self) -> None:
+        # Let the rest of this round of updates be staged first
+        await asyncio.sleep(0)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Error writing conversation state: %s", e, exc_info=True)
+
+    async def flush(self) -> None:
+        """Write the staged changes in one transaction."""
+        if not (self._pending_users or self._pending_conversations):
+            return
+        users, self._pending_users = self._pending_users, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        await self._run(self._write, users, conversations)
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    async def get_user_data(self):
+        # Loaded per user by load_user
+        return {}
+
+    async def get_conversations(self, name: str):
+        # Loaded per user by load_user
+        return {}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        encoded = _dumps(data)
+        digest = hash(encoded)
+        if self._written.get(user_id, hash('{}')) == digest:
+            return
+        self._written[user_id] = digest
+        self._pending_users[user_id] = encoded
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._written.pop(user_id, None)
+        self._pending_users[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        state = None if new_state is None else _dumps(new_state)
+        self._pending_conversations[key[-1], name, _dumps(list(key))] = state
+        self._schedule_flush()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def get_chat_data(self):
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_bot_data(self):
+        return {}
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
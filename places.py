@@ -0,0 +1,159 @@
+"""Address autocomplete and resolution from a local gazetteer file.
+
+Place names are normalized (case-folded, punctuation dropped, spaces
+collapsed) and kept in one sorted list, which acts as a flattened trie: the
+names starting with a prefix are the contiguous run found by two bisects.
+Suggestions are the most popular places in that run. For prefixes shared by
+more than ``scan_limit`` names (``j`` or ``jalan`` in a gazetteer of
+millions), the top suggestions are precomputed when the gazetteer is built,
+so no query ever ranks more than ``scan_limit`` names. Resolutions and
+suggestions for recently typed text are kept in LRU caches.
+
+A place's id is its row number in the file, so rows appended to the
+gazetteer keep existing ids (and users' recent places) valid.
+
+CSV layout: ``name, latitude, longitude`` and an optional ``weight``
+(popularity; the most popular places are suggested first).
+"""
+import csv
+import heapq
+import logging
+import re
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Sorts after every character a normalized name can contain
+_LAST = '\U0010ffff'
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+class Place(NamedTuple):
+    id: int
+    name: str
+    lat: float
+    lon: float
+
+
+def normalize(text: str) -> str:
+    """Key a name or typed text is matched on, e.g. ``"Mid-Valley  Megamall!"``
+    -> ``"mid valley megamall"``."""
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+class Gazetteer:
+    """A read-only set of places indexed for prefix search.
+
+    Place ``i`` is ``names[i]`` at ``(lats[i], lons[i])`` with popularity
+    ``weights[i]`` (all 1 if omitted).
+    """
+
+    def __init__(self, names, lats, lons, weights=None, suggestions: int = 5, scan_limit: int = 256,
+                 cache_size: int = 10_000):
+        self.suggestions = suggestions
+        self.scan_limit = scan_limit
+        self._names = list(names)
+        self._lats = array('d', lats)
+        self._lons = array('d', lons)
+        weights = array('d', weights if weights is not None else [1.0] * len(self._names))
+        if not len(self._names) == len(self._lats) == len(self._lons) == len(weights):
+            raise ValueError("Gazetteer columns differ in length")
+        keys = list(map(normalize, self._names))
+
+        # Sorted by name, most popular first among equal names (sorting is stable)
+        order = sorted(range(len(keys)), key=weights.__getitem__, reverse=True)
+        order.sort(key=keys.__getitem__)
+        self._keys = [keys[row] for row in order]
+        self._rows = array('I', order)
+        self._weights = array('d', (weights[row] for row in order))
+        del keys, weights
+
+        # prefix -> positions of its top suggestions, for prefixes too common to rank per query
+        self._top = {}
+        if len(self._keys) > scan_limit:
+            self._build_top('', 0, len(self._keys))
+
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+        self.suggest = lru_cache(maxsize=cache_size)(self._suggest)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _rank(self, positions):
+        return heapq.nlargest(self.suggestions, positions, key=self._weights.__getitem__)
+
+    def _build_top(self, prefix: str, lo: int, hi: int):
+        """Store the top suggestions of ``prefix`` (names ``lo:hi``) and of
+        every longer prefix with more than ``scan_limit`` names. Each name is
+        ranked once, in the smallest prefix it belongs to that is not stored."""
+        keys = self._keys
+        depth = len(prefix)
+        i = lo
+        # A name equal to the prefix sorts before the names extending it
+        while i < hi and len(keys[i]) == depth:
+            i += 1
+        best = self._rank(range(lo, i))
+        while i < hi:
+            child = keys[i][:depth + 1]
+            j = bisect_left(keys, child + _LAST, i, hi)
+            best += self._build_top(child, i, j) if j - i > self.scan_limit else self._rank(range(i, j))
+            i = j
+        best = self._top[prefix] = self._rank(best)
+        return best
+
+    def _place(self, position: int) -> Place:
+        row = self._rows[position]
+        return Place(row, self._names[row], self._lats[row], self._lons[row])
+
+    def _range(self, key: str):
+        lo = bisect_left(self._keys, key)
+        return lo, bisect_left(self._keys, key + _LAST, lo)
+
+    def get(self, place_id: int):
+        """Return the place with ``place_id``, or None."""
+        if 0 <= place_id < len(self._names):
+            return Place(place_id, self._names[place_id], self._lats[place_id], self._lons[place_id])
+        return None
+
+    def _resolve(self, text: str):
+        """Return the place ``text`` names, or None: an exact match (the most
+        popular one if several share the name) or the only name it starts."""
+        key = normalize(text)
+        if not key:
+            return None
+        lo, hi = self._range(key)
+        if lo < hi and (hi - lo == 1 or self._keys[lo] == key):
+            return self._place(lo)
+        return None
+
+    def _suggest(self, text: str) -> tuple:
+        """Return the most popular places whose name starts with ``text``."""
+        key = normalize(text)
+        if not key:
+            return ()
+        lo, hi = self._range(key)
+        positions = self._top[key] if hi - lo > self.scan_limit else self._rank(range(lo, hi))
+        return tuple(self._place(position) for position in positions)
+
+
+def load_gazetteer(path: str, **kwargs) -> Gazetteer:
+    """Load a gazetteer from a CSV file."""
+    names, lats, lons, weights = [], [], [], []
+    with open(path, encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        name, lat, lon = header.index('name'), header.index('latitude'), header.index('longitude')
+        weight = header.index('weight') if 'weight' in header else None
+        for row in reader:
+            names.append(row[name])
+            lats.append(float(row[lat]))
+            lons.append(float(row[lon]))
+            if weight is not None:
+                weights.append(float(row[weight] or 1))
+
+    gazetteer = Gazetteer(names, lats, lons, weights if weight is not None else None, **kwargs)
+    logger.info("Loaded %d places from %s", len(gazetteer), path)
+    return gazetteer
@@ -0,0 +1,233 @@
+"""Fares, trip times and surge pricing for every ride type.
+
+A trip's road distance is estimated from the straight line between the
+pickup's and destination's grid cells (``cell_km`` squares) times a detour
+factor, and remembered per pair of cells in an LRU cache, so a popular
+route, e.g. from a mall to a station, is worked out once however many
+riders ask for it. The cache holds the finished quotes for every vehicle
+type before surge, so a cached quote costs a lookup, plus one
+multiplication per type where fares are surging.
+
+``quote`` prices one trip for every vehicle type with plain arithmetic,
+which for a handful of types beats any array library. ``quote_batch``
+prices many trips at once; with NumPy installed it does the whole batch in
+a few array operations, otherwise it calls ``quote`` per trip. NumPy is
+optional and nothing else depends on it, so it is only imported by the
+first batch: the bot never prices in batches and starts without it.
+
+``SurgePricer`` keeps a multiplier per zone of the city from recent
+bookings and the free drivers there, recomputed on a timer so a quote only
+looks one up.
+"""
+import asyncio
+import logging
+import math
+from functools import lru_cache
+from typing import NamedTuple
+
+from dispatch import KM_PER_DEG_LAT, KM_PER_DEG_LON, KUALA_LUMPUR
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def numpy():
+    """The numpy module, or None if it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class VehicleType(NamedTuple):
+    key: str
+    name: str
+    emoji: str
+    # Fare = max(minimum, base + per_km * km + per_min * minutes) in ringgit,
+    # rounded to 10 sen and then multiplied by the surge (and rounded again)
+    base: float
+    per_km: float
+    per_min: float
+    minimum: float
+    speed_kmh: float
+
+
+VEHICLE_TYPES = (
+    VehicleType('bike', 'GrabBike', '🏍️', 1.00, 0.65, 0.10, 4.00, 30.0),
+    VehicleType('car', 'GrabCar', '🚗', 2.00, 1.00, 0.25, 6.00, 25.0),
+    VehicleType('plus', 'GrabCar Plus', '🚙', 3.00, 1.30, 0.30, 9.00, 25.0),
+    VehicleType('six', 'GrabCar 6-Seater', '🚐', 4.00, 1.60, 0.35, 12.00, 25.0),
+)
+
+
+class Quote(NamedTuple):
+    vehicle: VehicleType
+    fare: float
+    minutes: int
+    km: float
+
+
+def _round_fare(fare: float) -> float:
+    # To 10 sen, the way the NumPy batch does it, so both give the same fares
+    return round(fare * 10) / 10
+
+
+class FareEstimator:
+    """Prices trips for every type in ``vehicles``.
+
+    ``detour`` converts straight-line distance to road distance.
+    """
+
+    def __init__(self, vehicles=VEHICLE_TYPES, ref_lat: float = KUALA_LUMPUR[0], cell_km: float = 0.5,
+                 detour: float = 1.35, cache_size: int = 100_000):
+        self.vehicles = tuple(vehicles)
+        self.by_key = {vehicle.key: vehicle for vehicle in self.vehicles}
+        self.cell_km = cell_km
+        self.detour = detour
+        self._km_per_deg_lon = KM_PER_DEG_LON * math.cos(math.radians(ref_lat))
+        self.route = lru_cache(maxsize=cache_size)(self._route)
+        self._columns = None
+
+    def cell(self, lat: float, lon: float):
+        return (math.floor(lon * self._km_per_deg_lon / self.cell_km),
+                math.floor(lat * KM_PER_DEG_LAT / self.cell_km))
+
+    def _route(self, start, end) -> tuple:
+        """Return the quotes before surge for a trip between the centres of two cells."""
+        km = math.hypot(end[0] - start[0], end[1] - start[1]) * self.cell_km * self.detour
+        quotes = []
+        for vehicle in self.vehicles:
+            minutes = max(1, math.ceil(km / vehicle.speed_kmh * 60))
+            fare = max(vehicle.minimum, vehicle.base + vehicle.per_km * km + vehicle.per_min * minutes)
+            quotes.append(Quote(vehicle, _round_fare(fare), minutes, km))
+        return tuple(quotes)
+
+    def quote(self, pickup, destination, surge: float = 1.0) -> tuple:
+        """Return a ``Quote`` per vehicle type for a trip between two
+        ``(latitude, longitude)`` points, with fares multiplied by ``surge``."""
+        quotes = self.route(self.cell(*pickup), self.cell(*destination))
+        if surge == 1.0:
+            return quotes
+        return tuple(Quote(quote.vehicle, _round_fare(quote.fare * surge), quote.minutes, quote.km) for quote in quotes)
+
+    def quote_batch(self, pickups, destinations, surges=None):
+        """Price many trips at once. ``pickups`` and ``destinations`` are
+        sequences of ``(latitude, longitude)``; ``surges`` one multiplier per
+        trip. Returns ``(fares, minutes, km)``: fares and minutes with a row
+        per trip and a column per vehicle type. They are NumPy arrays, or
+        lists of lists without NumPy."""
+        np = numpy()
+        if np is None:
+            quotes = [
+                self.quote(pickup, destination, surge)
+                for pickup, destination, surge in zip(pickups, destinations, surges or [1.0] * len(pickups))
+            ]
+            return ([[quote.fare for quote in trip] for trip in quotes],
+                    [[quote.minutes for quote in trip] for trip in quotes],
+                    [trip[0].km for trip in quotes])
+
+        pickups = np.asarray(pickups, dtype=float)
+        destinations = np.asarray(destinations, dtype=float)
+        start_x = np.floor(pickups[:, 1] * self._km_per_deg_lon / self.cell_km)
+        start_y = np.floor(pickups[:, 0] * KM_PER_DEG_LAT / self.cell_km)
+        end_x = np.floor(destinations[:, 1] * self._km_per_deg_lon / self.cell_km)
+        end_y = np.floor(destinations[:, 0] * KM_PER_DEG_LAT / self.cell_km)
+        km = np.hypot(end_x - start_x, end_y - start_y) * self.cell_km * self.detour
+
+        if self._columns is None:
+            # One column per vehicle type, for broadcasting against a column of trips
+            self._columns = np.array([vehicle[3:] for vehicle in self.vehicles]).T
+        base, per_km, per_min, minimum, speed = self._columns
+        column = km[:, None]
+        minutes = np.maximum(1, np.ceil(column / speed * 60))
+        fares = np.rint(np.maximum(minimum, base + per_km * column + per_min * minutes) * 10) / 10
+        if surges is not None:
+            fares = np.rint(fares * np.asarray(surges, dtype=float)[:, None] * 10) / 10
+        return fares, minutes.astype(int), km
+
+
+class SurgePricer:
+    """Surge multipliers per square zone of ``zone_km``.
+
+    Every booking attempt counts as demand in its pickup's zone, decaying
+    with a half-life of ``half_life`` seconds. Every ``tick`` seconds each
+    zone's multiplier becomes ``1 + sensitivity * (demand / free drivers - 1)``,
+    kept between 1 and ``max_surge`` and rounded to 0.1.
+    """
+
+    def __init__(self, fleet, zone_km: float = 2.0, max_surge: float = 2.0, sensitivity: float = 0.5,
+                 half_life: float = 300.0, tick: float = 10.0):
+        self.fleet = fleet
+        self.zone_km = zone_km
+        self.max_surge = max_surge
+        self.sensitivity = sensitivity
+        self.tick = tick
+        self.half_life = half_life
+        self._decay = 0.5 ** (tick / half_life)
+        self._demand = {}
+        self._multipliers = {}
+        self._task = None
+
+    @property
+    def surging(self) -> int:
+        """Number of zones with a multiplier above 1."""
+        return len(self._multipliers)
+
+    def record(self, lat: float, lon: float) -> None:
+        """Count a booking attempt at a pickup."""
+        zone = self.fleet.zone(lat, lon, self.zone_km)
+        self._demand[zone] = self._demand.get(zone, 0.0) + 1.0
+
+    def multiplier(self, lat: float, lon: float) -> float:
+        """The current multiplier at a pickup."""
+        return self._multipliers.get(self.fleet.zone(lat, lon, self.zone_km), 1.0)
+
+    def demand(self) -> dict:
+        """Recent demand per zone, to carry over a restart with ``restore``."""
+        return dict(self._demand)
+
+    def restore(self, demand: dict, age: float = 0.0) -> None:
+        """Take over ``demand`` recorded ``age`` seconds ago, decayed for the
+        time since, and recompute the multipliers."""
+        decay = 0.5 ** (max(age, 0.0) / self.half_life)
+        for zone, value in demand.items():
+            self._demand[zone] = self._demand.get(zone, 0.0) + value * decay
+        self.update()
+
+    def update(self) -> None:
+        """Decay demand and recompute every zone's multiplier."""
+        supply = self.fleet.zone_counts(self.zone_km)
+        multipliers = {}
+        for zone, demand in list(self._demand.items()):
+            demand *= self._decay
+            if demand < 0.05:
+                del self._demand[zone]
+                continue
+            self._demand[zone] = demand
+            surge = 1 + self.sensitivity * (demand / max(supply.get(zone, 0), 1) - 1)
+            surge = round(min(self.max_surge, surge), 1)
+            if surge > 1:
+                multipliers[zone] = surge
+        self._multipliers = multipliers
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.update()
+            except Exception as e:
+                logger.error("Error updating surge pricing: %s", e, exc_info=True)
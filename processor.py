@@ -0,0 +1,105 @@
+"""Concurrent update processing that keeps each user's updates in order.
+
+``KeyedUpdateProcessor`` lets python-telegram-bot process updates from
+different users at the same time, up to ``max_concurrent_updates`` running
+at once, while updates from the same user (or chat, for updates without a
+user) run strictly one after another in arrival order. Conversations and
+wallet read-modify-writes therefore see the same sequence as in serial mode.
+
+Each busy key has a FIFO of waiters; the entry is removed as soon as the key
+goes idle, so memory stays proportional to the users active right now.
+"""
+import asyncio
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+# Updates queued behind a busy user do not count against the cap, so PTB's
+# own semaphore (taken before do_process_update) is effectively disabled
+_UNBOUNDED = 2 ** 31
+
+
+def update_key(update):
+    """Return the ordering key of an update: the user id, else the chat id."""
+    user = getattr(update, 'effective_user', None)
+    if user is not None:
+        return user.id
+    chat = getattr(update, 'effective_chat', None)
+    if chat is not None:
+        return chat.id
+    return None
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """Run updates concurrently across users and serially per user."""
+
+    __slots__ = ('_limit', '_running', '_busy', 'active')
+
+    def __init__(self, max_concurrent_updates: int):
+        # Set first: the base class validates it through the property
+        self._limit = max_concurrent_updates
+        super().__init__(_UNBOUNDED)
+        # The base class sizes its semaphore from the property, i.e. the cap
+        self._semaphore = asyncio.BoundedSemaphore(_UNBOUNDED)
+        self._running = None
+        # key -> futures of updates waiting for the key, in arrival order
+        self._busy = {}
+        self.active = 0
+
+    @property
+    def max_concurrent_updates(self) -> int:
+        return self._limit
+
+    @property
+    def busy_keys(self) -> int:
+        """Number of users with an update running or waiting."""
+        return len(self._busy)
+
+    async def initialize(self) -> None:
+        self._running = asyncio.Semaphore(self._limit)
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update, coroutine) -> None:
+        key = update_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        waiters = self._busy.get(key)
+        if waiters is None:
+            self._busy[key] = deque()
+        else:
+            turn = asyncio.get_running_loop().create_future()
+            waiters.append(turn)
+            try:
+                await turn
+            except asyncio.CancelledError:
+                if turn.done() and not turn.cancelled():
+                    # Handed the key just as we were cancelled: pass it on
+                    self._release(key)
+                else:
+                    waiters.remove(turn)
+                coroutine.close()
+                raise
+        try:
+            async with self._running:
+                self.active += 1
+                try:
+                    await coroutine
+                finally:
+                    self.active -= 1
+        finally:
+            self._release(key)
+
+    def _release(self, key) -> None:
+        """Hand ``key`` to its next waiter, or forget it when nobody waits."""
+        waiters = self._busy[key]
+        while waiters:
+            turn = waiters.popleft()
+            if not turn.done():
+                turn.set_result(None)
+                return
+        del self._busy[key]
@@ -0,0 +1,282 @@
+"""Promotion codes and automatic promotions, applied at checkout.
+
+Rules are read from a JSON file and compiled once: money is converted to
+sen, days and hours to numbers, and each rule's benefit to a small function
+of the order amount, so checking a rule at checkout is a few integer
+comparisons. Codes are looked up in a dict. Promotions that need no code
+are indexed by order type and weekday, and within those by benefit, most
+valuable first, so an order only looks at the rules that can apply to it
+and stops at the first one that cannot beat the best found.
+
+An order gets at most one promotion per benefit: a discount, free
+delivery and cashback can combine, two discounts cannot.
+
+Limits are counted per user in a ``uses`` dict (code -> redemptions) that
+the caller keeps with the user's data, and overall in the engine.
+``redeem`` checks and updates both without yielding to the event loop, so
+concurrent orders can never redeem a code more often than allowed; it
+checks again because the last redemption may have gone between showing a
+price and placing the order.
+
+JSON layout::
+
+    {"promotions": [{"code": "GRAB20", "title": "20% off on first 3 rides",
+                     "order_types": ["Ride"], "percent": 20, "max_discount": 10,
+                     "first_orders": 3}]}
+
+Benefits (exactly one): ``percent`` or ``amount`` off (ringgit, optionally
+capped by ``max_discount``), ``free_delivery``, or ``cashback_percent``
+(optionally capped by ``max_cashback``). Conditions (all optional):
+``order_types``, ``min_order`` (ringgit), ``days`` (``["fri", "sat",
+"sun"]``), ``hours`` (``["11:00", "14:00"]``, may wrap past midnight),
+``first_orders`` (only on the user's first N orders of the type),
+``per_user`` and ``total`` redemptions, and ``automatic`` (applies without
+entering the code). ``listed: false`` keeps a code off the promotions
+screen.
+"""
+import json
+import logging
+import math
+import time
+from typing import NamedTuple
+
+from wallet import to_minor
+
+logger = logging.getLogger(__name__)
+
+ORDER_TYPES = ('Ride', 'Food')
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+# Benefits, in the order they are listed on a receipt
+KINDS = ('discount', 'delivery', 'cashback')
+_BENEFITS = ('percent', 'amount', 'free_delivery', 'cashback_percent')
+_FIELDS = frozenset(_BENEFITS) | {
+    'code', 'title', 'order_types', 'min_order', 'days', 'hours', 'first_orders', 'per_user', 'total',
+    'automatic', 'listed', 'max_discount', 'max_cashback',
+}
+
+
+class Promotion:
+    """A compiled rule. Amounts are in sen and times in minutes of the day."""
+
+    __slots__ = ('code', 'title', 'kind', 'order_types', 'days', 'start', 'end', 'wraps', 'min_order',
+                 'first_orders', 'per_user', 'total', 'automatic', 'listed', 'ceiling', 'value')
+
+    def __init__(self, code: str, title: str, kind: str, value, ceiling: float, order_types=ORDER_TYPES,
+                 days=range(7), start: int = 0, end: int = 24 * 60, min_order: int = 0,
+                 first_orders: float = math.inf, per_user: float = math.inf, total: int = None,
+                 automatic: bool = False, listed: bool = True):
+        self.code = code
+        self.title = title
+        self.kind = kind
+        # value(amount, delivery fee) -> benefit in sen
+        self.value = value
+        # The most the promotion can be worth, for ranking promotions without an order
+        self.ceiling = ceiling
+        self.order_types = frozenset(order_types)
+        self.days = frozenset(days)
+        # A window like 22:00-02:00 is stored as its complement 02:00-22:00
+        self.wraps = end < start
+        self.start, self.end = (end, start) if self.wraps else (start, end)
+        self.min_order = min_order
+        self.first_orders = first_orders
+        self.per_user = per_user
+        self.total = total
+        self.automatic = automatic
+        self.listed = listed
+
+    def valid_days(self) -> str:
+        """Days the promotion runs, e.g. ``Fri-Sun``, or '' for every day."""
+        if len(self.days) == 7:
+            return ''
+        days = sorted(self.days)
+        if days == list(range(days[0], days[-1] + 1)) and len(days) > 2:
+            return f"{DAYS[days[0]].title()}-{DAYS[days[-1]].title()}"
+        return ', '.join(DAYS[day].title() for day in days)
+
+    def __repr__(self) -> str:
+        return f"Promotion({self.code!r}, {self.kind})"
+
+
+class Applied(NamedTuple):
+    promotion: Promotion
+    # Benefit in sen
+    value: int
+
+
+def _minutes(text: str) -> int:
+    hours, _, minutes = text.partition(':')
+    return int(hours) * 60 + int(minutes or 0)
+
+
+def compile_rule(rule: dict) -> Promotion:
+    """Compile one rule from the JSON layout. Raises ValueError if it is malformed."""
+    unknown = set(rule) - _FIELDS
+    if unknown:
+        raise ValueError(f"Promotion {rule.get('code')!r}: unknown fields {sorted(unknown)}")
+    benefits = [name for name in _BENEFITS if rule.get(name)]
+    if len(benefits) != 1:
+        raise ValueError(f"Promotion {rule.get('code')!r} needs exactly one of {', '.join(_BENEFITS)}")
+    benefit = benefits[0]
+
+    if benefit in ('percent', 'cashback_percent'):
+        kind, limit = ('discount', 'max_discount') if benefit == 'percent' else ('cashback', 'max_cashback')
+        percent = int(rule[benefit])
+        cap = to_minor(rule[limit]) if limit in rule else None
+        if cap is None:
+            value, ceiling = (lambda amount, fee: amount * percent // 100), math.inf
+        else:
+            value, ceiling = (lambda amount, fee: min(amount * percent // 100, cap)), cap
+    elif benefit == 'amount':
+        kind, off = 'discount', to_minor(rule['amount'])
+        value, ceiling = (lambda amount, fee: min(off, amount)), off
+    else:
+        # Every free delivery is worth the same fee, so the first eligible one will do
+        kind, value, ceiling = 'delivery', (lambda amount, fee: fee), 0
+
+    order_types = rule.get('order_types', ORDER_TYPES)
+    if set(order_types) - set(ORDER_TYPES):
+        raise ValueError(f"Promotion {rule['code']!r}: unknown order types {order_types}")
+    start, end = rule.get('hours', ('0:00', '24:00'))
+    return Promotion(
+        code=rule['code'].upper(),
+        title=rule['title'],
+        kind=kind,
+        value=value,
+        ceiling=ceiling,
+        order_types=order_types,
+        days=[DAYS.index(day.lower()[:3]) for day in rule.get('days', DAYS)],
+        start=_minutes(start),
+        end=_minutes(end),
+        min_order=to_minor(rule.get('min_order', 0)),
+        first_orders=rule.get('first_orders', math.inf),
+        per_user=rule.get('per_user', math.inf),
+        total=rule.get('total'),
+        automatic=bool(rule.get('automatic', False)),
+        listed=bool(rule.get('listed', True)),
+    )
+
+
+class PromotionEngine:
+    """Finds the best promotions for an order and counts redemptions.
+
+    With several worker processes each gets its share of every ``total``:
+    ``worker`` is ``(index, count)``.
+    """
+
+    def __init__(self, promotions, worker=(0, 1)):
+        self.promotions = tuple(promotions)
+        self._by_code = {}
+        for promotion in self.promotions:
+            if promotion.code in self._by_code:
+                raise ValueError(f"Duplicate promotion code {promotion.code}")
+            self._by_code[promotion.code] = promotion
+
+        # (order type, weekday) -> kind -> automatic promotions, most valuable first
+        automatic = {}
+        for promotion in sorted(self.promotions, key=lambda p: p.ceiling, reverse=True):
+            if promotion.automatic:
+                for order_type in promotion.order_types:
+                    for day in promotion.days:
+                        kinds = automatic.setdefault((order_type, day), {})
+                        kinds.setdefault(promotion.kind, []).append(promotion)
+        self._automatic = {key: {kind: tuple(found) for kind, found in kinds.items()}
+                           for key, kinds in automatic.items()}
+
+        index, count = worker
+        # code -> redemptions left in this process, for codes with a total
+        self._remaining = {
+            promotion.code: promotion.total // count + (index < promotion.total % count)
+            for promotion in self.promotions if promotion.total is not None
+        }
+        self.redeemed = 0
+
+    def __len__(self) -> int:
+        return len(self.promotions)
+
+    def get(self, code: str):
+        """Return the promotion with ``code`` (any case), or None."""
+        return self._by_code.get(code.strip().upper())
+
+    def listed(self, limit: int = 8) -> tuple:
+        """Promotions for the promotions screen."""
+        return tuple(promotion for promotion in self.promotions if promotion.listed)[:limit]
+
+    def remaining(self, code: str):
+        """Redemptions left of ``code`` in this process, or None if unlimited."""
+        return self._remaining.get(code.upper())
+
+    def restore(self, used: dict) -> None:
+        """Count redemptions made before a restart (code -> count)."""
+        for code, count in used.items():
+            if code in self._remaining:
+                self._remaining[code] = max(0, self._remaining[code] - count)
+
+    def _eligible(self, promotion: Promotion, amount: int, minute: int, uses: dict, placed: int) -> bool:
+        return (amount >= promotion.min_order
+                and (promotion.start <= minute < promotion.end) != promotion.wraps
+                and placed < promotion.first_orders
+                and uses.get(promotion.code, 0) < promotion.per_user
+                and self._remaining.get(promotion.code, 1) > 0)
+
+    def best(self, order_type: str, amount: int, fee: int = 0, codes=(), uses=None, placed: int = 0,
+             now: float = None) -> tuple:
+        """Return the most valuable ``Applied`` promotion of each kind for an
+        order of ``amount`` sen plus a delivery ``fee``, from the ``codes``
+        the user entered and the automatic promotions. ``uses`` is the
+        user's redemptions per code and ``placed`` how many orders of
+        ``order_type`` they placed before."""
+        moment = time.localtime(now)
+        day, minute = moment.tm_wday, moment.tm_hour * 60 + moment.tm_min
+        uses = {} if uses is None else uses
+        best = {}
+        for code in codes:
+            promotion = self._by_code.get(code)
+            if (promotion is not None and order_type in promotion.order_types and day in promotion.days
+                    and self._eligible(promotion, amount, minute, uses, placed)):
+                value = promotion.value(amount, fee)
+                current = best.get(promotion.kind)
+                if value > 0 and (current is None or value > current.value):
+                    best[promotion.kind] = Applied(promotion, value)
+        for kind, promotions in self._automatic.get((order_type, day), {}).items():
+            if kind == 'delivery' and not fee:
+                continue
+            current = best.get(kind)
+            highest = 0 if current is None else current.value
+            for promotion in promotions:
+                # The rest are worth no more than the best found
+                if current is not None and promotion.ceiling <= highest:
+                    break
+                value = promotion.value(amount, fee)
+                if value > highest and self._eligible(promotion, amount, minute, uses, placed):
+                    current, highest = Applied(promotion, value), value
+            if current is not None:
+                best[kind] = current
+        return tuple(best[kind] for kind in KINDS if kind in best)
+
+    def redeem(self, applied, uses: dict) -> tuple:
+        """Count the redemption of ``applied`` promotions against the user's
+        ``uses`` and the totals. Returns the ones redeemed: a promotion whose
+        limit was reached since ``best`` found it is dropped."""
+        redeemed = []
+        for found in applied:
+            code = found.promotion.code
+            if uses.get(code, 0) >= found.promotion.per_user:
+                continue
+            left = self._remaining.get(code)
+            if left is not None:
+                if left <= 0:
+                    continue
+                self._remaining[code] = left - 1
+            uses[code] = uses.get(code, 0) + 1
+            redeemed.append(found)
+        self.redeemed += len(redeemed)
+        return tuple(redeemed)
+
+
+def load_promotions(path: str, **kwargs) -> PromotionEngine:
+    """Load and compile the promotions in a JSON file."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    engine = PromotionEngine((compile_rule(rule) for rule in data['promotions']), **kwargs)
+    logger.info("Loaded %d promotions from %s", len(engine), path)
+    return engine
@@ -0,0 +1,601 @@
+"""Prebuilt keyboards and message templates.
+
+Static screens are built once at import time as immutable keyword arguments
+for ``reply_text`` / ``edit_message_text``; handlers send them with
+``**SCREEN`` and allocate nothing for static content. Screens with per-user
+fields (first name, balance, order details) are ``Template`` objects whose
+text is compiled once into a function that fills the fields in.
+
+Everything here is in English. ``locales.py`` builds the same screens,
+templates and texts, by name, for the other languages the bot speaks; the
+functions below take the ``Locale`` to build a screen in.
+"""
+import html
+import keyword
+import re
+import string
+from functools import lru_cache
+from types import MappingProxyType
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from wallet import format_amount
+
+
+def keyboard(*rows) -> InlineKeyboardMarkup:
+    """Build an inline keyboard from rows of ``(label, callback_data)`` pairs."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(label, callback_data=data) for label, data in row]
+        for row in rows
+    ])
+
+
+def screen(text: str, reply_markup=None, parse_mode='HTML'):
+    """Return read-only send/edit keyword arguments for a static screen."""
+    return MappingProxyType({'text': text, 'reply_markup': reply_markup, 'parse_mode': parse_mode})
+
+
+# Format specs compile_template puts in an f-string as they are, e.g. ``.1f``
+_PLAIN_SPEC = re.compile(r"[^{}'\"\\\n]*")
+
+
+def compile_template(text: str, reply_markup=None, parse_mode='HTML'):
+    """Compile ``text`` into a function of keyword arguments that returns
+    send/edit keyword arguments with its ``{name}`` fields filled in, as
+    ``text.format`` would but without parsing ``text`` on every call, so a
+    template costs what an inline f-string does. Other keyword arguments are
+    ignored. Texts with positional, attribute or nested fields fall back to
+    ``text.format``."""
+    literals = []
+    body = []
+    names = []
+    for literal, name, spec, conversion in string.Formatter().parse(text):
+        literals.append(literal)
+        body.append(literal.replace('{', '{{').replace('}', '}}'))
+        if name is None:
+            continue
+        if (not name.isidentifier() or name.startswith('_') or keyword.iskeyword(name)
+                or conversion not in (None, 'r', 's', 'a') or not _PLAIN_SPEC.fullmatch(spec)):
+            return lambda **fields: {'text': text.format(**fields), 'reply_markup': reply_markup,
+                                     'parse_mode': parse_mode}
+        if name not in names:
+            names.append(name)
+        body.append('{' + name + (f"!{conversion}" if conversion else '') + (f":{spec}" if spec else '') + '}')
+    if not names:
+        filled = ''.join(literals)
+        return lambda **_: {'text': filled, 'reply_markup': reply_markup, 'parse_mode': parse_mode}
+    namespace = {'_reply_markup': reply_markup, '_parse_mode': parse_mode}
+    exec(
+        f"def render(*, {', '.join(names)}, **_):\n"
+        f"    return {{'text': f{''.join(body)!r}, 'reply_markup': _reply_markup, 'parse_mode': _parse_mode}}\n",
+        namespace
+    )
+    return namespace['render']
+
+
+def field_names(text: str) -> frozenset:
+    """The names of the ``{name}`` fields in ``text``."""
+    return frozenset(name for _, name, _, _ in string.Formatter().parse(text) if name is not None)
+
+
+class Template:
+    """A screen whose text has per-user fields, e.g. ``{first_name}``.
+
+    ``render(**fields)`` returns send/edit keyword arguments with the fields
+    filled in.
+    """
+
+    __slots__ = ('text', 'reply_markup', 'parse_mode', 'render')
+
+    def __init__(self, text: str, reply_markup=None, parse_mode='HTML'):
+        self.text = text
+        self.reply_markup = reply_markup
+        self.parse_mode = parse_mode
+        self.render = compile_template(text, reply_markup, parse_mode)
+
+
+# Keyboards
+
+MAIN_MENU = keyboard(
+    [("🚗 Book a Ride", "book_ride"), ("🍔 Order Food", "order_food")],
+    [("📦 Track Order", "track_order"), ("💳 My Wallet", "my_wallet")],
+    [("🎁 Promotions", "promotions"), ("📞 Support", "support")],
+    [("ℹ️ About Grab", "about"), ("⚙️ Settings", "settings")]
+)
+BACK_TO_MENU = keyboard([("🔙 Back to Menu", "main_menu")])
+BACK = keyboard([("🔙 Back", "main_menu")])
+BACK_TO_WALLET = keyboard([("🔙 Back to Wallet", "my_wallet")])
+TRACK_ORDER_KEYBOARD = keyboard([("🔄 Refresh", "track_order"), ("🔙 Back", "main_menu")])
+ORDER_PLACED_KEYBOARD = keyboard([("📦 Track Order", "track_order"), ("🔙 Menu", "main_menu")])
+WALLET_KEYBOARD = keyboard(
+    [("💵 Top Up", "topup")],
+    [("📜 Transaction History", "history")],
+    [("🔙 Back", "main_menu")]
+)
+SETTINGS_KEYBOARD = keyboard([("🌐 Language", "language")], [("🔙 Back", "main_menu")])
+TOPUP_AMOUNTS = (20, 50, 100, 200)
+
+# The keyboards below are built per language: ``lang.label`` translates the
+# label of a button
+
+
+@lru_cache(maxsize=1024)
+def topup_keyboard(screen_id: int, lang) -> InlineKeyboardMarkup:
+    """Top-up amounts for one top-up screen; ``screen_id`` lets the bot
+    credit each screen only once however often its buttons are tapped."""
+    buttons = [(f"RM {amount}", f"topup_{amount}_{screen_id}") for amount in TOPUP_AMOUNTS]
+    return keyboard(buttons[:2], buttons[2:], [(lang.label("🔙 Back"), "my_wallet")])
+
+
+@lru_cache(maxsize=1024)
+def topup_confirm_keyboard(amount: int, screen_id: int, lang) -> InlineKeyboardMarkup:
+    """Confirm one top-up amount asked for in a message, or pick another."""
+    return keyboard([(lang.TOPUP_BUTTON.format(amount=amount), f"topup_{amount}_{screen_id}")],
+                    [(lang.label("💵 Other amounts"), "topup")], [(lang.label("🔙 Back"), "my_wallet")])
+
+
+@lru_cache(maxsize=256)
+def history_keyboard(page: int, has_next: bool, lang) -> InlineKeyboardMarkup:
+    """Paging buttons for the transaction history."""
+    row = []
+    if page > 0:
+        row.append((lang.label("◀️ Prev"), f"history_{page - 1}"))
+    if has_next:
+        row.append((lang.label("Next ▶️"), f"history_{page + 1}"))
+    return keyboard(*[r for r in (row, [(lang.label("🔙 Back to Wallet"), "my_wallet")]) if r])
+
+
+@lru_cache(maxsize=4096)
+def places_keyboard(action: str, places: tuple, lang, typed: bool = False) -> InlineKeyboardMarkup:
+    """One ``action_<place id>`` button per place; with ``typed`` a last
+    ``action`` button keeps the address as the user typed it."""
+    rows = [[(f"📍 {place.name}", f"{action}_{place.id}")] for place in places]
+    if typed:
+        rows.append([(lang.label("✏️ Use as typed"), action)])
+    return keyboard(*rows)
+
+
+@lru_cache(maxsize=4096)
+def rides_keyboard(labels: tuple) -> InlineKeyboardMarkup:
+    """One ``ride_<index>`` button per ride type, labelled with its quote."""
+    return keyboard(*[[(label, f"ride_{index}")] for index, label in enumerate(labels)])
+
+
+@lru_cache(maxsize=64)
+def languages_keyboard(languages: tuple, lang) -> InlineKeyboardMarkup:
+    """One ``language_<code>`` button per ``(code, name)`` language, each in its own language."""
+    return keyboard(*[[(name, f"language_{code}")] for code, name in languages],
+                    [(lang.label("🔙 Back"), "settings")])
+
+
+# Static screens
+
+MAIN_MENU_SCREEN = screen("📱 <b>Grab Main Menu</b>\n\nWhat would you like to do?", MAIN_MENU)
+
+BOOK_RIDE = screen(
+    "🚗 <b>Book a Ride</b>\n\n"
+    "Please share your pickup location.\n\n"
+    "You can send:\n"
+    "📍 Your current location (location button)\n"
+    "📝 Or type your address"
+)
+
+NO_ACTIVE_ORDERS = screen(
+    "📦 <b>No Active Orders</b>\n\n"
+    "You don't have any active orders right now.",
+    BACK_TO_MENU
+)
+
+
+SUPPORT = screen(
+    "📞 <b>Grab Support</b>\n\n"
+    "How can we help you today?\n\n"
+    "Common issues:\n"
+    "• Payment problems\n"
+    "• Order issues\n"
+    "• Account questions\n"
+    "• Refund requests\n\n"
+    "Please describe your issue:",
+    BACK
+)
+
+ABOUT = screen(
+    "ℹ️ <b>About Grab</b>\n\n"
+    "Grab is Southeast Asia's leading super-app, providing everyday services:\n\n"
+    "🚗 <b>Transport</b>\n"
+    "Safe and reliable rides\n\n"
+    "🍔 <b>Food Delivery</b>\n"
+    "Your favorite restaurants delivered\n\n"
+    "📦 <b>Logistics</b>\n"
+    "Send packages anywhere\n\n"
+    "💳 <b>Payments</b>\n"
+    "GrabPay wallet and more\n\n"
+    "Available in 8 countries across Southeast Asia!",
+    BACK_TO_MENU
+)
+
+SETTINGS = screen(
+    "⚙️ <b>Settings</b>\n\n"
+    "Language: English\n"
+    "Notifications: On\n"
+    "Payment Method: GrabPay\n"
+    "Preferred Vehicle: GrabCar\n\n"
+    "More settings coming soon!",
+    SETTINGS_KEYBOARD
+)
+
+LANGUAGES = "🌐 <b>Language</b>\n\nChoose the language the bot speaks to you in:"
+
+
+def languages_screen(languages: tuple, lang):
+    """Offer the ``(code, name)`` languages to choose from."""
+    return screen(lang.LANGUAGES, languages_keyboard(languages, lang))
+
+
+HELP = screen(
+    "🤖 <b>Grab Bot Commands</b>\n\n"
+    "/start - Start the bot\n"
+    "/menu - Show main menu\n"
+    "/help - Show this help\n"
+    "/cancel - Cancel current operation\n\n"
+    "💡 <b>Tips:</b>\n"
+    "• Use inline buttons for quick actions\n"
+    "• Track your orders anytime\n"
+    "• Check promotions for great deals!\n\n"
+    "Need help? Contact support via the menu!",
+    MAIN_MENU
+)
+
+START_FALLBACK = screen("Welcome to Grab! Use /menu to see options.", MAIN_MENU, parse_mode=None)
+CANCELLED = screen("Operation cancelled. Use /menu to see options.", MAIN_MENU, parse_mode=None)
+ERROR = screen("Sorry, something went wrong. Please try again or use /menu.", MAIN_MENU, parse_mode=None)
+
+# Templates with per-user fields
+
+WELCOME = Template(
+    "👋 <b>Welcome to Grab, {first_name}!</b>\n\n"
+    "Your everyday everything app.\n\n"
+    "🚗 <b>Ride</b> - Book a car or bike\n"
+    "🍔 <b>Food</b> - Order from restaurants\n"
+    "📦 <b>Deliveries</b> - Send packages\n"
+    "💳 <b>Payments</b> - GrabPay wallet\n\n"
+    "What would you like to do today?",
+    MAIN_MENU
+)
+
+TRACK_ORDER = Template(
+    "📦 <b>Track Your Order</b>\n\n"
+    "Order ID: {order_id}\n"
+    "Type: {order_type}\n"
+    "Status: {status_emoji} {status}\n"
+    "Estimated time: {eta}\n\n"
+    "{note}",
+    TRACK_ORDER_KEYBOARD
+)
+
+TRACK_NOTES = {
+    'Preparing': "Your {order} is being prepared.",
+    'On the way': "Your {order} is on the way!",
+    'Delivered': "Your {order} is complete.",
+}
+# Order types and statuses as shown to the user
+ORDER_TYPES = {'Food': 'Food', 'Ride': 'Ride'}
+STATUSES = {'Preparing': 'Preparing', 'On the way': 'On the way', 'Delivered': 'Delivered'}
+
+ORDER_UPDATE = Template("📦 <b>Order Update</b>\n\n{updates}", ORDER_PLACED_KEYBOARD)
+
+# (order type, status) -> line pushed to the user when an order reaches it
+ORDER_UPDATE_LINES = {
+    ('Food', 'On the way'): "🚗 Your food order <b>{order_id}</b> from {restaurant} is on the way! ETA {eta}.",
+    ('Food', 'Delivered'): "✅ Your food order <b>{order_id}</b> has been delivered. Enjoy your meal!",
+    ('Ride', 'Delivered'): "✅ Your ride <b>{order_id}</b> has arrived at {destination}. Thanks for riding with Grab!",
+}
+
+WALLET = Template(
+    "💳 <b>GrabPay Wallet</b>\n\n"
+    "Balance: <b>{balance}</b>\n\n"
+    "Recent transactions:\n"
+    "{recent}\n\n"
+    "💡 Tip: Top up your wallet for faster checkout!",
+    WALLET_KEYBOARD
+)
+
+TOPUP_DONE = Template(
+    "✅ <b>Top Up Successful!</b>\n\n"
+    "Amount: {amount}\n"
+    "New Balance: {balance}\n\n"
+    "Thank you for using GrabPay!",
+    BACK_TO_WALLET
+)
+
+NO_TRANSACTIONS = "No transactions yet."
+TOPUP = "💵 <b>Top Up Wallet</b>\n\nSelect amount:"
+TOPUP_CONFIRM = "💵 <b>Top Up Wallet</b>\n\nTop up RM {amount}?"
+TOPUP_BUTTON = "✅ Top up RM {amount}"
+HISTORY = "📜 <b>Transaction History</b>"
+HISTORY_PAGE = "📜 <b>Transaction History</b> (page {page})"
+
+
+def topup_screen(screen_id: int, lang) -> dict:
+    """Return the top-up amounts screen."""
+    return {'text': lang.TOPUP, 'reply_markup': topup_keyboard(screen_id, lang), 'parse_mode': 'HTML'}
+
+
+def topup_confirm_screen(amount: int, screen_id: int, lang) -> dict:
+    """Return the screen confirming a top-up of ``amount``."""
+    return {'text': lang.TOPUP_CONFIRM.format(amount=amount),
+            'reply_markup': topup_confirm_keyboard(amount, screen_id, lang), 'parse_mode': 'HTML'}
+
+
+def history_screen(lines, page: int, has_next: bool, lang) -> dict:
+    """Return one page of the transaction history."""
+    title = lang.HISTORY_PAGE.format(page=page + 1) if page > 0 or has_next else lang.HISTORY
+    body = '\n'.join(f"• {line}" for line in lines) or lang.NO_TRANSACTIONS
+    return {'text': f"{title}\n\n{body}", 'reply_markup': history_keyboard(page, has_next, lang),
+            'parse_mode': 'HTML'}
+
+RESTAURANTS = "🍔 <b>Order Food</b>\n\nSelect a restaurant:"
+MENU = "🍔 <b>{restaurant}</b>\n\nSelect an item:"
+MENU_PAGE = "🍔 <b>{restaurant}</b>\n\nSelect an item: (page {page}/{pages})"
+
+ORDER_PLACED = Template(
+    "✅ <b>Order Placed!</b>\n\n"
+    "Order ID: <b>{order_id}</b>\n"
+    "Restaurant: {restaurant}\n"
+    "Item: {item} ({price})\n"
+    "Delivery: {delivery}\n"
+    "{promos}"
+    "Total: <b>{total}</b>\n"
+    "Status: 👨‍🍳 Preparing\n"
+    "Estimated delivery: {eta}\n\n"
+    "You can track your order anytime!",
+    ORDER_PLACED_KEYBOARD
+)
+
+RIDE_PICKUP = Template(
+    "📍 Pickup: {pickup}\n\n"
+    "Now please share your destination.\n"
+    "Type your destination address:",
+    parse_mode=None
+)
+
+RIDE_BOOKED = Template(
+    "🚗 <b>Ride Booked!</b>\n\n"
+    "Order ID: <b>{order_id}</b>\n"
+    "Pickup: {pickup}\n"
+    "Destination: {destination}\n"
+    "Driver: {driver}\n"
+    "Vehicle: {vehicle}\n"
+    "Fare: {fare}\n"
+    "{promos}"
+    "Status: 🚗 On the way\n"
+    "ETA: {eta}\n"
+    "Trip time: {trip}\n\n"
+    "Your driver is on the way!",
+    MAIN_MENU
+)
+
+RIDE_OPTIONS = Template(
+    "🚗 <b>Choose Your Ride</b>\n\n"
+    "Pickup: {pickup}\n"
+    "Destination: {destination}\n"
+    "{trip}{surge}\n\n"
+    "Fares are estimates. Pick a ride type:"
+)
+
+NO_DRIVERS = Template(
+    "😔 <b>No Drivers Nearby</b>\n\n"
+    "All {vehicle} drivers near your pickup are busy right now.\n"
+    "Tap a ride type to try again, or /cancel."
+)
+
+
+# Parts of the ride screens
+DISTANCE = "Distance: about {km:.1f} km"
+DISTANCE_UNKNOWN = "Distance: unknown, fares are metered"
+SURGE = "⚡ High demand nearby: fares x{surge:.1f}"
+SURGE_FARE = "{fare} (x{surge:.1f} surge)"
+METERED = "Metered"
+DRIVER_AWAY = "{minutes} min away"
+NO_DRIVER_NEARBY = "no drivers nearby"
+TRIP_TIME = "about {minutes} min"
+
+
+def ride_option_label(vehicle, fare: str, away: str) -> str:
+    """Button label for one ride type, e.g. ``🚗 GrabCar · RM 15.10 · 3 min away``."""
+    return f"{vehicle.emoji} {vehicle.name} · {fare} · {away}"
+
+
+def ride_options_screen(pickup: str, destination: str, km, surge: float, labels: tuple, lang) -> dict:
+    """Quotes for every ride type; ``km`` is None if the destination is not on the map."""
+    rendered = lang.RIDE_OPTIONS.render(
+        pickup=pickup,
+        destination=destination,
+        trip=lang.DISTANCE.format(km=km) if km is not None else lang.DISTANCE_UNKNOWN,
+        surge="\n" + lang.SURGE.format(surge=surge) if surge > 1 else ""
+    )
+    rendered['reply_markup'] = rides_keyboard(labels)
+    return rendered
+
+
+def no_drivers_screen(vehicle, labels: tuple, lang) -> dict:
+    """Offer the ride types again when no ``vehicle`` driver is free."""
+    rendered = lang.NO_DRIVERS.render(vehicle=vehicle.name)
+    rendered['reply_markup'] = rides_keyboard(labels)
+    return rendered
+
+
+PLACE_SUGGESTIONS = Template(
+    "🔎 {field}: {typed}\n\n"
+    "Did you mean one of these places?",
+    parse_mode=None
+)
+# Field names in PLACE_SUGGESTIONS, by action
+PLACE_FIELDS = {'pickup': 'Pickup', 'dropoff': 'Destination'}
+RIDE_TO = "🏁 To: {destination}"
+RECENT_PLACES = "Or tap a recent place:"
+
+
+def format_location(latitude: float, longitude: float) -> str:
+    """Label for a shared location."""
+    return f"📍 {latitude:.5f}, {longitude:.5f}"
+
+
+def book_ride_screen(recent: tuple, lang, destination: str = None):
+    """Ask for the pickup, offering the user's recent places; ``destination``
+    is one already given (HTML-escaped)."""
+    if not recent and destination is None:
+        return lang.BOOK_RIDE
+    text = lang.BOOK_RIDE['text']
+    if destination is not None:
+        text = text.replace("\n\n", "\n\n" + lang.RIDE_TO.format(destination=destination) + "\n\n", 1)
+    if recent:
+        text += "\n\n" + lang.RECENT_PLACES
+    return {'text': text, 'reply_markup': places_keyboard('pickup', recent, lang) if recent else None,
+            'parse_mode': 'HTML'}
+
+
+def ride_pickup_screen(pickup: str, recent: tuple, lang) -> dict:
+    """Confirm the pickup and ask for the destination, offering recent places."""
+    rendered = lang.RIDE_PICKUP.render(pickup=pickup)
+    if recent:
+        rendered['reply_markup'] = places_keyboard('dropoff', recent, lang)
+    return rendered
+
+
+def place_suggestions_screen(action: str, typed: str, places: tuple, lang) -> dict:
+    """Places matching a typed pickup (``action='pickup'``) or destination (``'dropoff'``)."""
+    rendered = lang.PLACE_SUGGESTIONS.render(field=lang.PLACE_FIELDS[action], typed=typed)
+    rendered['reply_markup'] = places_keyboard(action, places, lang, True)
+    return rendered
+
+
+PROMOTIONS = "🎁 <b>Promotions & Deals</b>\n\n🔥 <b>Hot Deals:</b>"
+PROMOTIONS_TIP = "💡 Send a code here to add it; the best ones are applied at checkout!"
+PROMOTION_VALID = "Valid: {days}"
+PROMOTION_AUTOMATIC = "Applied automatically"
+PROMOTION_CODE = "Code: {code}"
+
+
+def promotions_screen(promotions, lang) -> dict:
+    """The promotions screen, listing ``promotions`` (compiled rules)."""
+    lines = []
+    for promotion in promotions:
+        when = promotion.valid_days()
+        lines.append(f"• {html.escape(promotion.title)}\n   "
+                     + (lang.PROMOTION_VALID.format(days=when) if promotion.automatic and when else
+                        lang.PROMOTION_AUTOMATIC if promotion.automatic else
+                        lang.PROMOTION_CODE.format(code=promotion.code)))
+    return screen(
+        f"{lang.PROMOTIONS}\n\n" + '\n\n'.join(lines) + f"\n\n{lang.PROMOTIONS_TIP}",
+        lang.keyboard(BACK_TO_MENU)
+    )
+
+
+PROMO_ADDED = Template(
+    "🎟️ <b>{code}</b> added: {title}\n\n"
+    "It is applied at checkout whenever your order qualifies.",
+    MAIN_MENU
+)
+
+
+# Receipt line of each kind of promotion
+PROMO_LINES = {
+    'discount': "🎟️ {code}: -{value}",
+    'delivery': "🎟️ {code}: free delivery",
+    'cashback': "🎁 {code}: {value} cashback to GrabPay",
+}
+
+
+def promo_lines(applied, lang) -> str:
+    """Receipt lines for the promotions applied to an order, each ending in a newline."""
+    return ''.join(
+        lang.PROMO_LINES[found.promotion.kind].format(code=found.promotion.code, value=format_amount(found.value))
+        + "\n"
+        for found in applied
+    )
+
+
+SUPPORT_RECEIVED = Template(
+    "📞 <b>Support Request Received</b>\n\n"
+    "Thank you for contacting Grab Support.\n\n"
+    "Your issue: {issue}\n\n"
+    "Our team will get back to you within 24 hours.\n"
+    "Reference ID: {reference_id}\n\n"
+    "For urgent matters, call: 1300-GRAB",
+    MAIN_MENU
+)
+TICKET_RESOLVED = Template(
+    "📞 <b>Support Request Resolved</b>\n\n"
+    "Your request {reference_id} has been resolved. If you still need help, "
+    "just tell us what is wrong.",
+    MAIN_MENU
+)
+TICKETS = Template(
+    "🎫 <b>{title}</b>\n\n{tickets}\n\n"
+    "Search: <code>/tickets words</code>, <code>/tickets #REFERENCE</code> or "
+    "<code>/tickets user:ID</code>\n"
+    "Close: <code>/close_ticket REFERENCE</code>"
+)
+TICKET_CLOSED = Template("✅ Ticket #{reference_id} closed and the user told.", parse_mode=None)
+TICKET_NOT_OPEN = Template("There is no open ticket #{reference_id}.", parse_mode=None)
+
+
+def tickets_screen(title: str, tickets) -> dict:
+    """Tickets for an agent, one summary each."""
+    found = '\n\n'.join(html.escape(ticket.describe()) for ticket in tickets)
+    return TICKETS.render(title=html.escape(title), tickets=found or "No tickets found.")
+
+
+GREETINGS = {
+    'hi': Template("Hi {first_name}! How can I help you today?", MAIN_MENU, parse_mode=None),
+    'hello': Template("Hello {first_name}! What would you like to do?", MAIN_MENU, parse_mode=None),
+    'thanks': Template("You're welcome! Anything else I can help with?", MAIN_MENU, parse_mode=None),
+    'bye': Template("Goodbye! Have a great day! 🚗", MAIN_MENU, parse_mode=None)
+}
+DEFAULT_REPLY = Template(
+    "Hi {first_name}! I'm here to help. Use /menu to see all available services.",
+    MAIN_MENU,
+    parse_mode=None
+)
+
+BROADCAST_USAGE = Template(
+    "📣 <b>Broadcast</b>\n\n"
+    "Send <code>/broadcast your message</code> to send a message to every user. "
+    "Formatting is kept.\n\n{running}"
+)
+BROADCAST_STARTED = Template("📣 Broadcast #{id} started. You will get a message when it is done.", parse_mode=None)
+BROADCAST_DONE = Template(
+    "📣 <b>Broadcast #{id} done</b>\n\n"
+    "Sent: {sent}\n"
+    "Pruned (blocked the bot): {pruned}\n"
+    "Failed: {failed}"
+)
+
+
+def broadcast_usage(running) -> dict:
+    """The /broadcast help, with the progress of the broadcasts being sent."""
+    lines = [f"#{broadcast.id}: {broadcast.sent} sent, {broadcast.pruned} pruned, {broadcast.failed} failed"
+             for broadcast in running]
+    return BROADCAST_USAGE.render(running='\n'.join(lines) or "No broadcast is being sent.")
+
+
+STATUS_EMOJI = {
+    'Preparing': '👨‍🍳',
+    'On the way': '🚗',
+    'Delivered': '✅'
+}
+
+# What a message catalog translates, by name: screens, templates, texts and
+# dicts of them. The keyboards of screens and templates are translated one
+# button label at a time
+MESSAGES = (
+    'MAIN_MENU_SCREEN', 'BOOK_RIDE', 'NO_ACTIVE_ORDERS', 'SUPPORT', 'ABOUT', 'SETTINGS', 'LANGUAGES', 'HELP',
+    'START_FALLBACK', 'CANCELLED', 'ERROR', 'WELCOME', 'TRACK_ORDER', 'TRACK_NOTES', 'ORDER_TYPES', 'STATUSES',
+    'ORDER_UPDATE', 'ORDER_UPDATE_LINES', 'WALLET', 'TOPUP_DONE', 'NO_TRANSACTIONS', 'TOPUP', 'TOPUP_CONFIRM',
+    'TOPUP_BUTTON', 'HISTORY', 'HISTORY_PAGE', 'RESTAURANTS', 'MENU', 'MENU_PAGE', 'ORDER_PLACED', 'RIDE_PICKUP',
+    'RIDE_BOOKED', 'RIDE_OPTIONS', 'NO_DRIVERS', 'DISTANCE', 'DISTANCE_UNKNOWN', 'SURGE', 'SURGE_FARE', 'METERED',
+    'DRIVER_AWAY', 'NO_DRIVER_NEARBY', 'TRIP_TIME', 'PLACE_SUGGESTIONS', 'PLACE_FIELDS', 'RIDE_TO', 'RECENT_PLACES',
+    'PROMOTIONS', 'PROMOTIONS_TIP', 'PROMOTION_VALID', 'PROMOTION_AUTOMATIC', 'PROMOTION_CODE', 'PROMO_ADDED',
+    'PROMO_LINES', 'SUPPORT_RECEIVED', 'TICKET_RESOLVED', 'GREETINGS', 'DEFAULT_REPLY',
+)
@@ -0,0 +1,111 @@
+"""Table-driven router for inline button callbacks.
+
+Callback data is parsed once into an action name plus typed arguments, e.g.
+``"food_2_1"`` -> ``CallbackAction('food', (2, 1))``, and dispatched through
+a dict to a small per-action handler. Exact names such as ``"main_menu"`` are
+looked up first; otherwise the text before the first ``_`` selects a prefix
+route and the rest is split into arguments. Parsing is cached, so the
+ConversationHandler patterns and the dispatch share one parse per
+distinct callback string.
+"""
+import logging
+import time
+from typing import NamedTuple
+
+from metrics import ACTION_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackAction(NamedTuple):
+    name: str
+    args: tuple
+
+
+class CallbackRouter:
+    """Map callback data to per-action handlers."""
+
+    def __init__(self, cache_size: int = 4096):
+        # name -> handler for data that matches exactly
+        self._exact = {}
+        # prefix -> (handler, argument types) for "prefix_arg1_arg2" data
+        self._prefixed = {}
+        # callback data -> (handler, action) or None
+        self._cache = {}
+        self.cache_size = cache_size
+
+    def action(self, name: str, *arg_types):
+        """Register the decorated handler for ``name``.
+
+        Without ``arg_types`` the callback data must equal ``name``. With
+        them it must be ``name_arg1_arg2...``, and each argument is converted
+        with the matching type before the handler is called as
+        ``handler(update, context, *args)``.
+        """
+        def decorator(handler):
+            if arg_types:
+                self._prefixed[name] = (handler, arg_types)
+            else:
+                self._exact[name] = handler
+            self._cache.clear()
+            return handler
+        return decorator
+
+    def _match(self, data: str):
+        handler = self._exact.get(data)
+        if handler is not None:
+            return handler, CallbackAction(data, ())
+        prefix, _, rest = data.partition('_')
+        route = self._prefixed.get(prefix)
+        if route is None or not rest:
+            return None
+        handler, arg_types = route
+        parts = rest.split('_')
+        if len(parts) != len(arg_types):
+            return None
+        try:
+            return handler, CallbackAction(prefix, tuple(t(p) for t, p in zip(arg_types, parts)))
+        except ValueError:
+            return None
+
+    def resolve(self, data: str):
+        """Return ``(handler, action)`` for ``data``, or None if nothing matches."""
+        try:
+            return self._cache[data]
+        except KeyError:
+            route = self._match(data)
+            if len(self._cache) < self.cache_size:
+                self._cache[data] = route
+            return route
+
+    def parse(self, data: str):
+        """Return the ``CallbackAction`` for ``data``, or None."""
+        route = self.resolve(data)
+        return route[1] if route is not None else None
+
+    def pattern(self, *names):
+        """Return a CallbackQueryHandler pattern matching the given actions."""
+        names = frozenset(names)
+        cache = self._cache
+        resolve = self.resolve
+
+        def matches(data) -> bool:
+            if not isinstance(data, str):
+                return False
+            route = cache[data] if data in cache else resolve(data)
+            return route is not None and route[1].name in names
+        return matches
+
+    async def dispatch(self, update, context):
+        """Call the handler for the update's callback data and return its result."""
+        data = update.callback_query.data
+        route = self.resolve(data)
+        if route is None:
+            logger.warning("No route for callback data: %s", data)
+            return None
+        handler, action = route
+        start = time.perf_counter()
+        try:
+            return await handler(update, context, *action.args)
+        finally:
+            ACTION_LATENCY.observe(time.perf_counter() - start, action.name)
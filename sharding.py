@@ -0,0 +1,554 @@
+"""Sharded deployment: one ingress process in front of N worker processes.
+
+The ingress receives updates (long polling or webhook) and forwards each one,
+still as raw JSON, to the worker that owns its user. Owners are picked by
+consistent hashing on the user id (the chat id for updates without a user),
+so a user's updates are always handled, in order, by the same worker and
+their conversation state stays in that worker's memory. Each worker runs the
+normal handler graph and talks to the Bot API itself; workers share the
+SQLite database.
+
+Ingress and workers talk over Unix sockets in frames of a 1-byte type and a
+4-byte length followed by the payload:
+
+    U  an update, as JSON
+    R  rebalance: the JSON list of workers in the new ring. The worker
+       finishes its queued updates, saves and forgets the users it no longer
+       owns, and answers A
+    A  acknowledges R
+    C  the new ring is in use; the worker adopts the active orders of the
+       users it gained
+
+While a rebalance is in progress the ingress holds new updates back, so a
+user who moves between workers is never handled by both.
+"""
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import signal
+import struct
+import tempfile
+from collections import Counter
+from http import HTTPStatus
+
+import httpx
+from telegram import Update
+
+from webhook import WebhookServer
+
+logger = logging.getLogger(__name__)
+
+FRAME = struct.Struct('!cI')
+UPDATE, REBALANCE, ACK, COMMIT = b'U', b'R', b'A', b'C'
+
+# Virtual points per worker; ingress and workers must agree on it. With 160
+# the busiest of 8 workers gets about 15% more users than the average
+REPLICAS = 160
+
+
+def write_frame(writer: asyncio.StreamWriter, kind: bytes, payload: bytes = b'') -> None:
+    writer.write(FRAME.pack(kind, len(payload)) + payload)
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    """Read one frame. Returns ``(kind, payload)``; raises ``asyncio.IncompleteReadError`` at EOF."""
+    kind, length = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return kind, await reader.readexactly(length) if length else b''
+
+
+def _hash(key: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hash ring with ``replicas`` virtual points per node.
+
+    Adding or removing a node only moves the keys between it and its
+    neighbours on the ring, about 1/N of them.
+    """
+
+    def __init__(self, nodes=(), replicas: int = REPLICAS):
+        self.replicas = replicas
+        self._points = []
+        self._owners = []
+        self._nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node) -> bool:
+        return node in self._nodes
+
+    @property
+    def nodes(self) -> list:
+        return sorted(self._nodes)
+
+    def add(self, node: str) -> None:
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key):
+        """Return the node owning ``key``, or None for an empty ring."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(str(key)))
+        return self._owners[index % len(self._owners)]
+
+
+def routing_key(update: dict):
+    """Return the id an update is routed by: its user, else its chat, else None."""
+    for name, value in update.items():
+        if name == 'update_id' or not isinstance(value, dict):
+            continue
+        user = value.get('from') or value.get('user')
+        if user:
+            return user['id']
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+    return None
+
+
+class WorkerServer:
+    """Worker side: feeds updates from the ingress to ``application``.
+
+    On a rebalance ``release`` is awaited with an ``owns(user_id)`` predicate
+    for the new ring, after every queued update has been processed; once the
+    ring is in use ``adopt`` is awaited with the same predicate.
+    """
+
+    def __init__(self, application, path: str, name: str, release=None, adopt=None):
+        self.application = application
+        self.path = path
+        self.name = name
+        self.release = release
+        self.adopt = adopt
+        self.updates = 0
+        self._server = None
+        self._connections = set()
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_connection, self.path)
+        logger.info("Worker %s listening on %s", self.name, self.path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Stop taking frames before the application shuts down
+            for writer in self._connections:
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def owner(self, members):
+        """Return ``owns(user_id)`` for a ring of ``members``."""
+        ring = HashRing(members)
+        return lambda user_id: ring.node_for(user_id) == self.name
+
+    async def _handle_connection(self, reader, writer) -> None:
+        bot = self.application.bot
+        update_queue = self.application.update_queue
+        self._connections.add(writer)
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind == UPDATE:
+                    try:
+                        update = Update.de_json(json.loads(payload), bot)
+                    except (ValueError, TypeError, KeyError):
+                        logger.warning("Received malformed update from the ingress")
+                        continue
+                    self.updates += 1
+                    update_queue.put_nowait(update)
+                elif kind == REBALANCE:
+                    await update_queue.join()
+                    await self._call(self.release, json.loads(payload))
+                    write_frame(writer, ACK)
+                    await writer.drain()
+                elif kind == COMMIT:
+                    await self._call(self.adopt, json.loads(payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _call(self, callback, members) -> None:
+        if callback is None:
+            return
+        try:
+            await callback(self.owner(members))
+        except Exception as e:
+            logger.error("Error handing over users: %s", e, exc_info=True)
+
+
+async def run_worker(application, server: WorkerServer) -> None:
+    """Run ``application`` behind ``server`` until SIGTERM.
+
+    SIGINT is ignored: on Ctrl-C the ingress stops first, hands every
+    worker its last updates and then terminates them.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+        loop.add_signal_handler(signal.SIGINT, lambda: None)
+    except NotImplementedError:
+        pass
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        try:
+            await stop.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+class Ingress:
+    """Routes updates to worker connections by consistent hashing."""
+
+    def __init__(self, handoff_timeout: float = 30.0, connect_timeout: float = 30.0):
+        self.handoff_timeout = handoff_timeout
+        self.connect_timeout = connect_timeout
+        self.ring = HashRing()
+        self.dispatched = Counter()
+        self._writers = {}
+        self._acks = {}
+        self._lock = asyncio.Lock()
+        # Set while updates may be sent: there are workers and no rebalance is running
+        self._open = asyncio.Event()
+
+    @property
+    def workers(self) -> list:
+        return self.ring.nodes
+
+    async def dispatch(self, update: dict, raw: bytes = None) -> None:
+        """Send an update to the worker owning its user, waiting out rebalances."""
+        if raw is None:
+            raw = json.dumps(update, separators=(',', ':')).encode()
+        key = routing_key(update)
+        while True:
+            await self._open.wait()
+            name = self.ring.node_for(key)
+            writer = self._writers[name]
+            try:
+                write_frame(writer, UPDATE, raw)
+                await writer.drain()
+            except ConnectionError:
+                self.lost(name)
+                continue
+            self.dispatched[name] += 1
+            return
+
+    async def add_worker(self, name: str, path: str, process=None) -> bool:
+        """Connect to a starting worker and move its share of users to it.
+        Returns False if it did not start listening."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.connect_timeout
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+                break
+            except (FileNotFoundError, ConnectionError):
+                if loop.time() > deadline or (process is not None and process.returncode is not None):
+                    logger.error("Worker %s did not start", name)
+                    return False
+                await asyncio.sleep(0.1)
+        self._writers[name] = writer
+        asyncio.create_task(self._watch(name, reader))
+        await self._rebalance(self.ring.nodes + [name])
+        logger.info("Worker %s joined; workers: %s", name, ', '.join(self.ring.nodes))
+        return True
+
+    async def remove_worker(self, name: str) -> None:
+        """Move a worker's users to the others, then disconnect it."""
+        if name not in self.ring:
+            return
+        await self._rebalance([node for node in self.ring.nodes if node != name])
+        writer = self._writers.pop(name, None)
+        if writer is not None:
+            writer.close()
+        logger.info("Worker %s left; workers: %s", name, ', '.join(self.ring.nodes))
+
+    async def drain(self) -> None:
+        """Wait until every worker has processed the updates sent so far and saved its state."""
+        if self.ring:
+            await self._rebalance(self.ring.nodes)
+
+    async def close(self) -> None:
+        await self.drain()
+        self._open.clear()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        self.ring = HashRing()
+
+    def lost(self, name: str) -> None:
+        """Drop a worker that exited or whose connection broke; the others take over its users."""
+        writer = self._writers.pop(name, None)
+        if writer is None:
+            return
+        writer.close()
+        ack = self._acks.pop(name, None)
+        if ack is not None and not ack.done():
+            ack.set_result(None)
+        if self._lock.locked():
+            # The rebalance in progress installs a ring without it
+            return
+        logger.warning("Worker %s lost; workers: %s", name, ', '.join(n for n in self.ring.nodes if n != name))
+        self._install(HashRing([node for node in self.ring.nodes if node != name]))
+
+    async def _watch(self, name: str, reader) -> None:
+        try:
+            while True:
+                kind, _ = await read_frame(reader)
+                ack = self._acks.pop(name, None) if kind == ACK else None
+                if ack is not None and not ack.done():
+                    ack.set_result(None)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        self.lost(name)
+
+    async def _rebalance(self, members: list) -> None:
+        async with self._lock:
+            self._open.clear()
+            payload = json.dumps(members).encode()
+            loop = asyncio.get_running_loop()
+            acks = []
+            for name, writer in list(self._writers.items()):
+                ack = self._acks[name] = loop.create_future()
+                acks.append(ack)
+                try:
+                    write_frame(writer, REBALANCE, payload)
+                except ConnectionError:
+                    ack.set_result(None)
+            if acks:
+                _, pending = await asyncio.wait(acks, timeout=self.handoff_timeout)
+                if pending:
+                    logger.warning("%d workers did not finish the handoff in time", len(pending))
+            # Workers lost during the handoff are left out
+            self._install(HashRing([name for name in members if name in self._writers]))
+
+    def _install(self, ring: HashRing) -> None:
+        self.ring = ring
+        payload = json.dumps(ring.nodes).encode()
+        for name in ring.nodes:
+            try:
+                write_frame(self._writers[name], COMMIT, payload)
+            except ConnectionError:
+                pass
+        if ring:
+            self._open.set()
+        else:
+            self._open.clear()
+
+
+class WorkerPool:
+    """Starts worker processes, restarts crashed ones and resizes the pool.
+
+    Workers are started as ``command`` with ``WORKER_NAME`` and
+    ``WORKER_SOCKET`` set, plus the variables returned by ``env(index)``.
+    A restarted worker keeps its name and so gets its old users back.
+    """
+
+    def __init__(self, ingress: Ingress, command: list, size: int, env=None, restart_delay: float = 1.0):
+        self.ingress = ingress
+        self.command = command
+        self.size = size
+        self.env = env
+        self.restart_delay = restart_delay
+        self.directory = tempfile.mkdtemp(prefix='grab-workers-')
+        self._processes = {}
+        self._retiring = set()
+        self._stopping = False
+
+    def __len__(self) -> int:
+        return len(self._processes)
+
+    async def start(self) -> None:
+        for index in range(self.size):
+            await self._spawn(index)
+
+    async def grow(self) -> None:
+        index = next(i for i in range(len(self._processes) + 1) if f"w{i}" not in self._processes)
+        await self._spawn(index)
+
+    async def shrink(self) -> None:
+        """Retire the newest worker, after handing its users to the others."""
+        if len(self._processes) <= 1:
+            logger.warning("Not removing the last worker")
+            return
+        name = max(self._processes, key=lambda n: int(n[1:]))
+        self._retiring.add(name)
+        await self.ingress.remove_worker(name)
+        process = self._processes.pop(name)
+        await self._terminate(process)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        await self.ingress.close()
+        await asyncio.gather(*(self._terminate(process) for process in self._processes.values()))
+        self._processes.clear()
+
+    async def _spawn(self, index: int) -> None:
+        name = f"w{index}"
+        path = os.path.join(self.directory, f"{name}.sock")
+        env = dict(os.environ, WORKER_NAME=name, WORKER_SOCKET=path)
+        if self.env is not None:
+            env.update(self.env(index))
+        process = await asyncio.create_subprocess_exec(*self.command, env=env)
+        self._processes[name] = process
+        asyncio.create_task(self._monitor(name, index, process))
+        if not await self.ingress.add_worker(name, path, process):
+            await self._terminate(process)
+
+    async def _monitor(self, name: str, index: int, process) -> None:
+        code = await process.wait()
+        if self._stopping or name in self._retiring or self._processes.get(name) is not process:
+            self._retiring.discard(name)
+            return
+        logger.warning("Worker %s exited with code %s; restarting", name, code)
+        self.ingress.lost(name)
+        del self._processes[name]
+        await asyncio.sleep(self.restart_delay)
+        if not self._stopping:
+            await self._spawn(index)
+
+    @staticmethod
+    async def _terminate(process) -> None:
+        if process.returncode is None:
+            process.terminate()
+        await process.wait()
+
+
+class IngressWebhookServer(WebhookServer):
+    """Webhook server that forwards each update's raw body to its worker."""
+
+    def __init__(self, ingress: Ingress, **kwargs):
+        super().__init__(None, **kwargs)
+        self.ingress = ingress
+
+    async def handle_update(self, body: bytes) -> HTTPStatus:
+        try:
+            update = json.loads(body)
+        except ValueError:
+            update = None
+        if not isinstance(update, dict):
+            logger.warning("Received malformed webhook update")
+            return HTTPStatus.BAD_REQUEST
+        await self.ingress.dispatch(update, body)
+        return HTTPStatus.OK
+
+
+async def poll_updates(ingress: Ingress, url: str, timeout: int = 30, allowed_updates=None) -> None:
+    """Long-poll ``url`` (the bot's ``getUpdates`` endpoint) and dispatch every update.
+
+    Updates stay plain JSON; they are only parsed into ``Update`` objects in
+    the workers. When cancelled, the offset of the last update dispatched
+    is confirmed to Telegram, as PTB's Updater does, so the next start does
+    not get the updates of the last batch again.
+    """
+    params = {'timeout': timeout, 'offset': 0}
+    if allowed_updates is not None:
+        params['allowed_updates'] = allowed_updates
+    async with httpx.AsyncClient(timeout=timeout + 10) as client:
+        try:
+            while True:
+                try:
+                    response = await client.post(url, json=params)
+                    result = response.json()
+                except (httpx.HTTPError, ValueError) as e:
+                    logger.warning("Error fetching updates: %s", e)
+                    await asyncio.sleep(1)
+                    continue
+                if not result.get('ok'):
+                    logger.warning("Error fetching updates: %s", result.get('description'))
+                    await asyncio.sleep(1)
+                    continue
+                for update in result['result']:
+                    await ingress.dispatch(update)
+                    params['offset'] = update['update_id'] + 1
+        except asyncio.CancelledError:
+            if params['offset']:
+                try:
+                    await client.post(url, json={'offset': params['offset'], 'timeout': 0, 'limit': 1})
+                except httpx.HTTPError as e:
+                    logger.warning("Error confirming the last updates: %s", e)
+            raise
+
+
+async def run_ingress(pool: WorkerPool, bot, server: IngressWebhookServer = None, webhook_url: str = None,
+                      allowed_updates=None, drop_pending_updates: bool = False) -> None:
+    """Start the workers and feed them updates until SIGINT/SIGTERM.
+
+    Updates come from ``server`` if given (webhook mode), otherwise from
+    long polling. SIGUSR1 adds a worker and SIGUSR2 removes one.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    handlers = {
+        signal.SIGINT: stop.set,
+        signal.SIGTERM: stop.set,
+        signal.SIGUSR1: lambda: loop.create_task(pool.grow()),
+        signal.SIGUSR2: lambda: loop.create_task(pool.shrink()),
+    }
+    for sig, handler in handlers.items():
+        try:
+            loop.add_signal_handler(sig, handler)
+        except NotImplementedError:
+            pass
+
+    await pool.start()
+    poller = None
+    async with bot:
+        if server is not None:
+            await server.start()
+            await bot.set_webhook(
+                url=webhook_url, secret_token=server.secret_token,
+                allowed_updates=allowed_updates, drop_pending_updates=drop_pending_updates
+            )
+        else:
+            await bot.delete_webhook(drop_pending_updates=drop_pending_updates)
+            poller = asyncio.create_task(poll_updates(
+                pool.ingress, f"{bot.base_url}/getUpdates", allowed_updates=allowed_updates
+            ))
+        try:
+            await stop.wait()
+        finally:
+            if poller is not None:
+                poller.cancel()
+                # Let it confirm the updates it dispatched
+                await asyncio.gather(poller, return_exceptions=True)
+            if server is not None:
+                await server.stop()
+            await pool.stop()
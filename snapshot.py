@@ -0,0 +1,54 @@
+"""Warm in-memory state saved on shutdown and read back on boot.
+
+State the bot otherwise rebuilds on every start (the simulated fleet's
+drivers and where they are, recent demand for surge pricing) is pickled to
+a file when the process stops, and read and unpickled when it starts
+again, so a restart carries on where the last process left off instead
+of regenerating it.
+
+A snapshot is written to a temporary file and renamed over the old one, so
+a crash while writing leaves the previous snapshot in place. Each snapshot
+carries a ``key`` describing the configuration it was taken under (e.g.
+the fleet size and the worker's share of it); one taken under another
+configuration, from another version of this module, or unreadable for any
+reason is ignored and the state is built from scratch as usual.
+"""
+import logging
+import os
+import pickle
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of a snapshot changes
+VERSION = 1
+
+
+def save_snapshot(path: str, key, state: dict) -> None:
+    """Write ``state`` to ``path``, tagged with ``key``."""
+    tmp_path = f"{path}.tmp"
+    began = time.perf_counter()
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((VERSION, key, time.time(), state), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    logger.info("Saved snapshot %s in %.1f ms", path, (time.perf_counter() - began) * 1e3)
+
+
+def load_snapshot(path: str, key):
+    """Return ``(state, saved_at)`` from the snapshot at ``path``, or None
+    if there is none or it was taken under another ``key``."""
+    began = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            version, saved_key, saved_at, state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+        return None
+    if version != VERSION or saved_key != key:
+        logger.info("Ignoring snapshot %s taken under another configuration", path)
+        return None
+    logger.info("Loaded snapshot %s from %.0f s ago in %.1f ms",
+                path, time.time() - saved_at, (time.perf_counter() - began) * 1e3)
+    return state, saved_at
@@ -0,0 +1,558 @@
+"""Pluggable storage for user data and orders.
+
+``Storage`` keeps everything in memory (the original behaviour).
+``SQLiteStorage`` adds durability: writes are queued and flushed in batched
+transactions on a short interval from a dedicated thread, so the async
+handlers never block on disk. Reads go through the in-memory caches and only
+hit the database on the first access for a user.
+
+Wallets are kept in a ``wallet.Ledger``. SQLite appends every transaction to
+a ``ledger`` table indexed by user and stores periodic balance snapshots, so
+a wallet is loaded from its snapshot plus the transactions after it.
+
+Promotion redemptions are counted per code and worker process, so the
+limits on a code's total redemptions survive a restart.
+
+Every user who sends the bot an update is remembered as a contact, and
+contacts are read back in ascending id order, a chunk at a time, for
+broadcasts (see ``broadcast.py``). A broadcast's progress is its cursor
+plus the recipients delivered beyond it; SQLite drops the deliveries the
+cursor has passed, so they never number more than a chunk.
+
+Several processes can share one SQLite database as long as each user is
+served by one process at a time (see ``sharding.py``): ledger sequence
+numbers are assigned by the database, and ``forget()`` drops the users a
+process hands over so their next owner reads them fresh.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from broadcast import Broadcast
+from order_store import DELIVERED, Order, OrderStore
+from wallet import OPENING_BALANCE, Ledger, Transaction, to_minor
+
+logger = logging.getLogger(__name__)
+
+
+class Storage:
+    """In-memory storage. Nothing survives a restart."""
+
+    def __init__(self, orders: OrderStore):
+        self.orders = orders
+        self.users = {}
+        self.ledger = Ledger()
+        # Contact ids in ascending order, and those who blocked the bot
+        self._contacts = []
+        self._known = set()
+        self._pruned = set()
+        self.broadcasts = {}
+        # broadcast id -> recipients delivered beyond its cursor
+        self._deliveries = {}
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def flush(self, durable: bool = False) -> None:
+        pass
+
+    def cached_users(self) -> set:
+        """Return the ids of the users with anything cached in memory."""
+        return set(self.users) | set(self.ledger) | set(self.orders.user_ids())
+
+    def forget(self, user_ids) -> None:
+        """Drop the users from the in-memory caches. Call ``flush()`` first."""
+        for user_id in user_ids:
+            self.users.pop(user_id, None)
+            self.ledger.forget(user_id)
+            self.orders.forget_user(user_id)
+
+    async def active_orders(self) -> list:
+        """Return the orders not yet delivered, including ones only in storage."""
+        return [order for order in self.orders if order.status_code < DELIVERED]
+
+    async def get_user(self, user_id):
+        """Return the user's data dict, or None if the user is unknown."""
+        return self.users.get(user_id)
+
+    async def update_user(self, user_id, data: dict, durable: bool = False) -> None:
+        """Store the user's data. With ``durable`` the write is committed before returning."""
+        self.users[user_id] = data
+
+    async def latest_order(self, user_id):
+        return self.orders.latest_for_user(user_id)
+
+    def add_order(self, order: Order) -> Order:
+        return self.orders.add(order)
+
+    def save_order(self, order: Order) -> None:
+        """Record a change to an existing order."""
+
+    async def get_balance(self, user_id) -> int:
+        """Return the user's wallet balance in sen, opening the wallet on first use."""
+        balance = self.ledger.balance(user_id)
+        if balance is None:
+            # Wallets from before the ledger kept a float balance in the user record
+            user = await self.get_user(user_id)
+            legacy = user.get('wallet_balance') if user else None
+            opening = to_minor(legacy) if legacy is not None else OPENING_BALANCE
+            tx, _ = self.ledger.record(user_id, 'opening', opening)
+            await self._save_transaction(tx)
+            balance = self.ledger.balance(user_id)
+        return balance
+
+    async def record_transaction(self, user_id, kind: str, amount: int, key: str = None, durable: bool = False):
+        """Apply a wallet transaction of ``amount`` sen. Returns ``(transaction, created)``;
+        a transaction whose ``key`` was already recorded is not applied again."""
+        await self.get_balance(user_id)
+        tx, created = self.ledger.record(user_id, kind, amount, key)
+        if created:
+            await self._save_transaction(tx, durable)
+        return tx, created
+
+    async def transactions(self, user_id, offset: int = 0, limit: int = 10):
+        """Return up to ``limit`` of the user's transactions, newest first."""
+        await self.get_balance(user_id)
+        return self.ledger.history(user_id, offset, limit)
+
+    async def _save_transaction(self, tx: Transaction, durable: bool = False) -> None:
+        pass
+
+    def record_redemption(self, code: str, worker: int = 0) -> None:
+        """Count one redemption of a promotion code by worker ``worker``."""
+
+    async def redemptions(self, worker: int = 0) -> dict:
+        """Return code -> redemptions counted for worker ``worker``."""
+        return {}
+
+    def remember_user(self, user_id) -> None:
+        """Add the user to the contacts broadcasts are sent to. A pruned user
+        who writes again is no longer pruned."""
+        self._pruned.discard(user_id)
+        if user_id not in self._known:
+            self._known.add(user_id)
+            bisect.insort(self._contacts, user_id)
+
+    def prune_user(self, user_id) -> None:
+        """Leave out a user who blocked the bot from broadcasts."""
+        self._pruned.add(user_id)
+
+    async def recipients(self, after: int, limit: int) -> list:
+        """Return up to ``limit`` contact ids above ``after`` that are not pruned, in ascending order."""
+        found = []
+        start = bisect.bisect_right(self._contacts, after)
+        for user_id in self._contacts[start:start + limit + len(self._pruned)]:
+            if user_id not in self._pruned:
+                found.append(user_id)
+                if len(found) == limit:
+                    break
+        return found
+
+    async def create_broadcast(self, text: str, admin=None, worker: int = 0) -> Broadcast:
+        broadcast = Broadcast(len(self.broadcasts) + 1, text, admin, worker)
+        self.broadcasts[broadcast.id] = broadcast
+        return broadcast
+
+    def save_broadcast(self, broadcast: Broadcast) -> None:
+        """Record a broadcast's progress."""
+        delivered = self._deliveries.get(broadcast.id)
+        if delivered:
+            self._deliveries[broadcast.id] = {user_id for user_id in delivered if user_id > broadcast.cursor}
+
+    async def unfinished_broadcasts(self, worker: int = 0) -> list:
+        """Return the broadcasts of worker ``worker`` that have not finished."""
+        return [broadcast for broadcast in self.broadcasts.values()
+                if broadcast.finished_at is None and broadcast.worker == worker]
+
+    def record_delivery(self, broadcast_id, user_id) -> None:
+        """Record that a broadcast reached (or pruned) a recipient."""
+        self._deliveries.setdefault(broadcast_id, set()).add(user_id)
+
+    async def deliveries(self, broadcast_id, after: int, upto: int) -> set:
+        """Return the recipients with ids in ``(after, upto]`` the broadcast was delivered to."""
+        return {user_id for user_id in self._deliveries.get(broadcast_id, ()) if after < user_id <= upto}
+
+
+class SQLiteStorage(Storage):
+    """SQLite (WAL mode) storage with write-behind batching."""
+
+    def __init__(self, orders: OrderStore, path: str, flush_interval: float = 0.05):
+        super().__init__(orders)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self._conn = None
+        self._flush_task = None
+        # One flush at a time, so a batch put back after a failed write is
+        # ahead of the next one and in the balances it snapshots
+        self._flush_lock = asyncio.Lock()
+        self._pending_users = {}
+        self._pending_orders = {}
+        self._pending_transactions = []
+        # (code, worker) -> redemptions not yet written
+        self._pending_redemptions = {}
+        # user_id -> 1 if pruned, else 0
+        self._pending_contacts = {}
+        # broadcast id -> row, and (broadcast id, user_id) deliveries
+        self._pending_broadcasts = {}
+        self._pending_deliveries = []
+        # Users whose row / latest order / wallet has already been read from disk
+        self._loaded_users = set()
+        self._loaded_orders = set()
+        self._loaded_wallets = set()
+        # History is paged from the ledger table, not kept in memory
+        self.ledger = Ledger(keep_history=False)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open(self) -> None:
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)')
+        columns = ', '.join(Order.__slots__)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS orders ({columns}, PRIMARY KEY (id))')
+        # Order fields added since the table was created
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(orders)')}
+        for name in Order.__slots__:
+            if name not in existing:
+                conn.execute(f'ALTER TABLE orders ADD COLUMN {name}')
+        conn.execute('CREATE INDEX IF NOT EXISTS orders_user ON orders (user_id, created_at)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS ledger (seq INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, '
+            'kind TEXT NOT NULL, amount INTEGER NOT NULL, created_at REAL NOT NULL, key TEXT UNIQUE)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ledger_user ON ledger (user_id, seq)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS wallet_snapshots '
+            '(user_id INTEGER PRIMARY KEY, balance INTEGER NOT NULL, seq INTEGER NOT NULL)'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS promo_redemptions '
+            '(code TEXT NOT NULL, worker INTEGER NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (code, worker))'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS contacts (user_id INTEGER PRIMARY KEY, pruned INTEGER NOT NULL DEFAULT 0)'
+        )
+        # id is the rowid, so the database numbers broadcasts
+        conn.execute(f"CREATE TABLE IF NOT EXISTS broadcasts (id INTEGER PRIMARY KEY, {', '.join(Broadcast.__slots__[1:])})")
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS broadcast_deliveries (broadcast_id INTEGER NOT NULL, '
+            'user_id INTEGER NOT NULL, PRIMARY KEY (broadcast_id, user_id)) WITHOUT ROWID'
+        )
+        conn.commit()
+        self._conn = conn
+
+    def _write_batch(self, users: dict, orders: dict, transactions: list, snapshots: list,
+                     redemptions: dict, contacts: dict, broadcasts: dict, deliveries: list,
+                     durable: bool) -> None:
+        conn = self._conn
+        conn.execute(f"PRAGMA synchronous={'FULL' if durable else 'NORMAL'}")
+        with conn:
+            if users:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO users (user_id, data) VALUES (?, ?)',
+                    [(user_id, json.dumps(data)) for user_id, data in users.items()]
+                )
+            if orders:
+                placeholders = ', '.join('?' * len(Order.__slots__))
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO orders ({', '.join(Order.__slots__)}) VALUES ({placeholders})",
+                    [tuple(getattr(o, name) for name in Order.__slots__) for o in orders.values()]
+                )
+            if transactions:
+                # The database numbers the rows, so processes sharing it never collide
+                conn.executemany(
+                    'INSERT INTO ledger (user_id, kind, amount, created_at, key) VALUES (?, ?, ?, ?, ?)',
+                    [(tx.user_id, tx.kind, tx.amount, tx.created_at, tx.key) for tx in transactions]
+                )
+            if snapshots:
+                # The balance covers every row of the user written so far, this batch included
+                conn.executemany(
+                    'INSERT OR REPLACE INTO wallet_snapshots '
+                    'SELECT ?, ?, MAX(seq) FROM ledger WHERE user_id = ?',
+                    [(user_id, balance, user_id) for user_id, balance, _ in snapshots]
+                )
+            if redemptions:
+                conn.executemany(
+                    'INSERT INTO promo_redemptions (code, worker, count) VALUES (?, ?, ?) '
+                    'ON CONFLICT (code, worker) DO UPDATE SET count = count + excluded.count',
+                    [(code, worker, count) for (code, worker), count in redemptions.items()]
+                )
+            if contacts:
+                conn.executemany(
+                    'INSERT INTO contacts (user_id, pruned) VALUES (?, ?) '
+                    'ON CONFLICT (user_id) DO UPDATE SET pruned = excluded.pruned',
+                    list(contacts.items())
+                )
+            if deliveries:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO broadcast_deliveries (broadcast_id, user_id) VALUES (?, ?)', deliveries
+                )
+            if broadcasts:
+                placeholders = ', '.join('?' * len(Broadcast.__slots__))
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO broadcasts ({', '.join(Broadcast.__slots__)}) VALUES ({placeholders})",
+                    list(broadcasts.values())
+                )
+                # Recipients up to the cursor are done with
+                conn.executemany(
+                    'DELETE FROM broadcast_deliveries WHERE broadcast_id = ? AND user_id <= ?',
+                    [(row[0], row[Broadcast.__slots__.index('cursor')]) for row in broadcasts.values()]
+                )
+
+    def _read_user(self, user_id):
+        row = self._conn.execute('SELECT data FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _read_latest_order(self, user_id):
+        cursor = self._conn.execute(
+            'SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC LIMIT 1', (user_id,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return Order.from_dict(dict(zip((c[0] for c in cursor.description), row)))
+
+    def _read_wallet(self, user_id):
+        """Return ``(balance, transactions since the snapshot)``, or None for no wallet."""
+        snapshot = self._conn.execute(
+            'SELECT balance, seq FROM wallet_snapshots WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        balance, seq = snapshot if snapshot else (0, 0)
+        total, count = self._conn.execute(
+            'SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM ledger WHERE user_id = ? AND seq > ?', (user_id, seq)
+        ).fetchone()
+        if snapshot is None and count == 0:
+            return None
+        return balance + total, count
+
+    def _read_active_orders(self):
+        cursor = self._conn.execute('SELECT * FROM orders WHERE status_code < ?', (DELIVERED,))
+        names = [c[0] for c in cursor.description]
+        return [Order.from_dict(dict(zip(names, row))) for row in cursor]
+
+    def _read_transaction_key(self, key: str):
+        row = self._conn.execute('SELECT * FROM ledger WHERE key = ?', (key,)).fetchone()
+        return Transaction(*row) if row else None
+
+    def _read_redemptions(self, worker: int) -> dict:
+        return dict(self._conn.execute('SELECT code, count FROM promo_redemptions WHERE worker = ?', (worker,)))
+
+    def _read_recipients(self, after: int, limit: int) -> list:
+        return [row[0] for row in self._conn.execute(
+            'SELECT user_id FROM contacts WHERE user_id > ? AND pruned = 0 ORDER BY user_id LIMIT ?', (after, limit)
+        )]
+
+    def _read_deliveries(self, broadcast_id, after: int, upto: int) -> set:
+        return {row[0] for row in self._conn.execute(
+            'SELECT user_id FROM broadcast_deliveries WHERE broadcast_id = ? AND user_id > ? AND user_id <= ?',
+            (broadcast_id, after, upto)
+        )}
+
+    def _insert_broadcast(self, broadcast: Broadcast) -> int:
+        names = [name for name in Broadcast.__slots__ if name != 'id']
+        with self._conn:
+            cursor = self._conn.execute(
+                f"INSERT INTO broadcasts ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                [getattr(broadcast, name) for name in names]
+            )
+        return cursor.lastrowid
+
+    def _read_unfinished_broadcasts(self, worker: int) -> list:
+        cursor = self._conn.execute('SELECT * FROM broadcasts WHERE finished_at IS NULL AND worker = ?', (worker,))
+        names = [c[0] for c in cursor.description]
+        return [Broadcast.from_dict(dict(zip(names, row))) for row in cursor]
+
+    def _read_transactions(self, user_id, offset: int, limit: int):
+        rows = self._conn.execute(
+            'SELECT * FROM ledger WHERE user_id = ? ORDER BY seq DESC LIMIT ? OFFSET ?', (user_id, limit, offset)
+        ).fetchall()
+        return [Transaction(*row) for row in rows]
+
+    async def start(self) -> None:
+        await self._run(self._open)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info("SQLite storage opened at %s", self.path)
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Error flushing storage: %s", e, exc_info=True)
+
+    async def flush(self, durable: bool = False) -> None:
+        """Write all pending changes in one transaction."""
+        async with self._flush_lock:
+            await self._flush(durable)
+
+    async def _flush(self, durable: bool) -> None:
+        if not (self._pending_users or self._pending_orders or self._pending_transactions
+                or self._pending_redemptions or self._pending_contacts or self._pending_broadcasts
+                or self._pending_deliveries):
+            return
+        users, self._pending_users = self._pending_users, {}
+        orders, self._pending_orders = self._pending_orders, {}
+        transactions, self._pending_transactions = self._pending_transactions, []
+        redemptions, self._pending_redemptions = self._pending_redemptions, {}
+        contacts, self._pending_contacts = self._pending_contacts, {}
+        broadcasts, self._pending_broadcasts = self._pending_broadcasts, {}
+        deliveries, self._pending_deliveries = self._pending_deliveries, []
+        snapshots = self.ledger.due_snapshots() if transactions else []
+        try:
+            await self._run(self._write_batch, users, orders, transactions, snapshots, redemptions, contacts,
+                            broadcasts, deliveries, durable)
+        except Exception:
+            # Rolled back: put the batch back for the next flush, under anything changed since
+            self._pending_users = {**users, **self._pending_users}
+            self._pending_orders = {**orders, **self._pending_orders}
+            self._pending_transactions = transactions + self._pending_transactions
+            for key, count in redemptions.items():
+                self._pending_redemptions[key] = self._pending_redemptions.get(key, 0) + count
+            self._pending_contacts = {**contacts, **self._pending_contacts}
+            self._pending_broadcasts = {**broadcasts, **self._pending_broadcasts}
+            self._pending_deliveries = deliveries + self._pending_deliveries
+            raise
+        self.ledger.snapshots_saved(snapshots)
+
+    async def get_user(self, user_id):
+        if user_id not in self._loaded_users:
+            data = await self._run(self._read_user, user_id)
+            self._loaded_users.add(user_id)
+            if data is not None and user_id not in self.users:
+                self.users[user_id] = data
+        return self.users.get(user_id)
+
+    async def update_user(self, user_id, data: dict, durable: bool = False) -> None:
+        self.users[user_id] = data
+        self._loaded_users.add(user_id)
+        self._pending_users[user_id] = data
+        if durable:
+            await self.flush(durable=True)
+
+    async def latest_order(self, user_id):
+        if user_id not in self._loaded_orders:
+            order = await self._run(self._read_latest_order, user_id)
+            self._loaded_orders.add(user_id)
+            if order is not None and order.id not in self.orders:
+                self.orders.add(order)
+        return self.orders.latest_for_user(user_id)
+
+    def add_order(self, order: Order) -> Order:
+        self.orders.add(order)
+        self._loaded_orders.add(order.user_id)
+        self._pending_orders[order.id] = order
+        return order
+
+    def save_order(self, order: Order) -> None:
+        self._pending_orders[order.id] = order
+
+    def forget(self, user_ids) -> None:
+        super().forget(user_ids)
+        for user_id in user_ids:
+            self._loaded_users.discard(user_id)
+            self._loaded_orders.discard(user_id)
+            self._loaded_wallets.discard(user_id)
+
+    def cached_users(self) -> set:
+        return super().cached_users() | self._loaded_users | self._loaded_orders | self._loaded_wallets
+
+    async def active_orders(self) -> list:
+        await self.flush()
+        stored = await self._run(self._read_active_orders)
+        return [self.orders.get(order.id) or order for order in stored]
+
+    async def get_balance(self, user_id) -> int:
+        if user_id not in self._loaded_wallets:
+            wallet = await self._run(self._read_wallet, user_id)
+            self._loaded_wallets.add(user_id)
+            if wallet is not None and user_id not in self.ledger:
+                self.ledger.restore(user_id, *wallet)
+        return await super().get_balance(user_id)
+
+    async def record_transaction(self, user_id, kind: str, amount: int, key: str = None, durable: bool = False):
+        if key is not None and self.ledger.find(key) is None:
+            # The key may have been recorded before a restart
+            tx = await self._run(self._read_transaction_key, key)
+            if tx is not None:
+                return tx, False
+        return await super().record_transaction(user_id, kind, amount, key, durable)
+
+    async def transactions(self, user_id, offset: int = 0, limit: int = 10):
+        await self.get_balance(user_id)
+        if self._pending_transactions:
+            await self.flush()
+        return await self._run(self._read_transactions, user_id, offset, limit)
+
+    async def _save_transaction(self, tx: Transaction, durable: bool = False) -> None:
+        self._pending_transactions.append(tx)
+        if durable:
+            await self.flush(durable=True)
+
+    def record_redemption(self, code: str, worker: int = 0) -> None:
+        key = (code, worker)
+        self._pending_redemptions[key] = self._pending_redemptions.get(key, 0) + 1
+
+    async def redemptions(self, worker: int = 0) -> dict:
+        await self.flush()
+        return await self._run(self._read_redemptions, worker)
+
+    def remember_user(self, user_id) -> None:
+        # Written once per process, which also clears a pruned flag set before a restart
+        if user_id not in self._known:
+            self._known.add(user_id)
+            self._pending_contacts[user_id] = 0
+
+    def prune_user(self, user_id) -> None:
+        self._known.discard(user_id)
+        self._pending_contacts[user_id] = 1
+
+    async def recipients(self, after: int, limit: int) -> list:
+        await self.flush()
+        return await self._run(self._read_recipients, after, limit)
+
+    async def create_broadcast(self, text: str, admin=None, worker: int = 0) -> Broadcast:
+        broadcast = Broadcast(None, text, admin, worker)
+        broadcast.id = await self._run(self._insert_broadcast, broadcast)
+        return broadcast
+
+    def save_broadcast(self, broadcast: Broadcast) -> None:
+        self._pending_broadcasts[broadcast.id] = tuple(getattr(broadcast, name) for name in Broadcast.__slots__)
+
+    async def unfinished_broadcasts(self, worker: int = 0) -> list:
+        return await self._run(self._read_unfinished_broadcasts, worker)
+
+    def record_delivery(self, broadcast_id, user_id) -> None:
+        self._pending_deliveries.append((broadcast_id, user_id))
+
+    async def deliveries(self, broadcast_id, after: int, upto: int) -> set:
+        await self.flush()
+        return await self._run(self._read_deliveries, broadcast_id, after, upto)
+
+
+def create_storage(backend: str, orders: OrderStore, path: str = 'grab.db') -> Storage:
+    """Build the storage backend named by ``backend`` ('memory' or 'sqlite')."""
+    if backend == 'memory':
+        return Storage(orders)
+    if backend == 'sqlite':
+        return SQLiteStorage(orders, path)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,376 @@
+"""Support tickets: batched ingestion, full-text search and export.
+
+Every support request becomes a ``Ticket`` with the user, their latest
+order and an open/closed status. ``add`` only queues the ticket, so a burst
+of requests costs the conversation handler an append each; queued tickets
+are stored every ``flush_interval`` seconds in one batch, and before any
+lookup, so a lookup always sees them: it also waits for a batch that is
+still being written. A batch that fails to store is queued again.
+
+``TicketStore`` keeps tickets in memory with an inverted index: each word
+maps to the ascending sequence numbers of the tickets containing it. A
+search intersects the lists from the newest end, a block of the shortest
+list at a time with the same range of the others, and stops once it has
+``limit`` matches. ``SQLiteTicketStore`` keeps them in a
+``tickets`` table with an FTS5 index over the text, written from a
+background thread. Both look tickets up by reference ID and by user
+through an index, and split words the same way (letters and digits).
+
+``find`` takes what an agent types: a reference ID (``#3F9A0C12B7E4``),
+``user:123``, or words that must all appear. ``export_jsonl`` streams the
+tickets of a database as JSON lines for offline analysis::
+
+    python tickets.py grab.db > tickets.jsonl
+"""
+import asyncio
+import bisect
+import json
+import logging
+import re
+import sqlite3
+import sys
+import time
+import uuid
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+OPEN, CLOSED = 'open', 'closed'
+
+# Letters and digits, as SQLite's unicode61 tokenizer splits text
+_WORDS = re.compile(r'[^\W_]+')
+_REFERENCE = re.compile(r'#?([0-9a-fA-F]{12})')
+_USER = re.compile(r'user:(\d+)', re.IGNORECASE)
+
+
+def new_reference() -> str:
+    """A reference ID for a new ticket, e.g. ``3F9A0C12B7E4``."""
+    return uuid.uuid4().hex[:12].upper()
+
+
+def words(text: str) -> list:
+    """The distinct lower-case words of ``text``, in order."""
+    return list(dict.fromkeys(_WORDS.findall(text.lower())))
+
+
+class Ticket:
+    """A support request."""
+
+    __slots__ = ('id', 'user_id', 'text', 'order_id', 'status', 'created_at', 'closed_at', 'closed_by')
+
+    def __init__(self, id: str, user_id: int, text: str, order_id: str = None, status: str = OPEN,
+                 created_at: float = None, closed_at: float = None, closed_by: int = None):
+        self.id = id
+        self.user_id = user_id
+        self.text = text
+        # The user's latest order when they asked for help
+        self.order_id = order_id
+        self.status = status
+        self.created_at = time.time() if created_at is None else created_at
+        self.closed_at = closed_at
+        # The agent who closed it
+        self.closed_by = closed_by
+
+    def describe(self, width: int = 80) -> str:
+        """Two-line summary for the agent screens."""
+        when = time.strftime('%d %b %H:%M', time.localtime(self.created_at))
+        order = f" · order {self.order_id}" if self.order_id else ""
+        text = self.text if len(self.text) <= width else self.text[:width - 1] + "…"
+        return f"#{self.id} · {self.status} · {when} · user {self.user_id}{order}\n{text}"
+
+    def to_dict(self) -> dict:
+        """Return the ticket as a plain dict (for persistence and export)."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Ticket':
+        ticket = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(ticket, name, data.get(name))
+        return ticket
+
+    def __repr__(self) -> str:
+        return f"Ticket(id={self.id!r}, user_id={self.user_id}, status={self.status!r})"
+
+
+class TicketStore:
+    """Tickets in memory, indexed by reference ID, user and word. Nothing
+    survives a restart."""
+
+    def __init__(self, flush_interval: float = 0.05):
+        self.flush_interval = flush_interval
+        self._pending = []
+        # Resolved once the batch being stored is written
+        self._storing = None
+        self._flush_task = None
+        self.added = 0
+        # Tickets by sequence number, oldest first
+        self._tickets = []
+        self._by_id = {}
+        # user_id / word -> ascending sequence numbers
+        self._by_user = {}
+        self._postings = {}
+        # Sequence numbers of open tickets, oldest first
+        self._open = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, ticket: Ticket) -> Ticket:
+        """Queue a new ticket; it is stored with the next batch."""
+        self._pending.append(ticket)
+        self.added += 1
+        return ticket
+
+    async def start(self) -> None:
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Error storing tickets: %s", e, exc_info=True)
+
+    async def flush(self) -> None:
+        """Store the queued tickets in one batch, once any batch being
+        stored has been written."""
+        while self._storing is not None:
+            await asyncio.shield(self._storing)
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._storing = asyncio.get_running_loop().create_future()
+        try:
+            await self._store(batch)
+        except Exception:
+            # Stored with the next batch, ahead of the tickets queued since
+            self._pending = batch + self._pending
+            raise
+        finally:
+            storing, self._storing = self._storing, None
+            storing.set_result(None)
+
+    async def _store(self, batch: list) -> None:
+        for ticket in batch:
+            seq = len(self._tickets)
+            self._tickets.append(ticket)
+            self._by_id[ticket.id] = seq
+            self._by_user.setdefault(ticket.user_id, array('L')).append(seq)
+            for word in words(ticket.text):
+                self._postings.setdefault(word, array('L')).append(seq)
+            if ticket.status == OPEN:
+                self._open[seq] = None
+
+    async def get(self, ticket_id: str):
+        """Return the ticket with ``ticket_id``, or None."""
+        await self.flush()
+        seq = self._by_id.get(ticket_id.upper())
+        return None if seq is None else self._tickets[seq]
+
+    async def for_user(self, user_id: int, limit: int = 10) -> list:
+        """The user's tickets, newest first."""
+        await self.flush()
+        return [self._tickets[seq] for seq in reversed(self._by_user.get(user_id, ())[-limit:])]
+
+    async def recent(self, limit: int = 10) -> list:
+        """The open tickets, newest first."""
+        await self.flush()
+        found = []
+        for seq in reversed(self._open):
+            found.append(self._tickets[seq])
+            if len(found) == limit:
+                break
+        return found
+
+    async def search(self, terms, limit: int = 10) -> list:
+        """The tickets containing every word of ``terms``, newest first."""
+        await self.flush()
+        postings = sorted((self._postings.get(word, ()) for word in terms), key=len)
+        if not postings or not postings[0]:
+            return []
+        shortest, others = postings[0], postings[1:]
+        if not others:
+            return [self._tickets[seq] for seq in reversed(shortest[-limit:])]
+        found = []
+        # Newest first, a growing block of the shortest list at a time,
+        # intersected with the same range of the others
+        end, block = len(shortest), limit * 8
+        while end and len(found) < limit:
+            start = max(0, end - block)
+            matches = set(shortest[start:end])
+            first, last = shortest[start], shortest[end - 1]
+            for other in others:
+                matches.intersection_update(
+                    other[bisect.bisect_left(other, first):bisect.bisect_right(other, last)]
+                )
+            found.extend(sorted(matches, reverse=True)[:limit - len(found)])
+            end, block = start, block * 4
+        return [self._tickets[seq] for seq in found]
+
+    async def close_ticket(self, ticket_id: str, agent: int = None):
+        """Close an open ticket. Returns it, or None if there is no open
+        ticket with ``ticket_id``."""
+        await self.flush()
+        seq = self._by_id.get(ticket_id.upper())
+        if seq is None or self._tickets[seq].status != OPEN:
+            return None
+        ticket = self._tickets[seq]
+        ticket.status, ticket.closed_at, ticket.closed_by = CLOSED, time.time(), agent
+        del self._open[seq]
+        return ticket
+
+    async def find(self, query: str, limit: int = 10) -> list:
+        """Tickets for an agent's query: a reference ID, ``user:<id>`` or words."""
+        query = query.strip()
+        reference = _REFERENCE.fullmatch(query)
+        if reference:
+            ticket = await self.get(reference.group(1))
+            return [ticket] if ticket else []
+        user = _USER.fullmatch(query)
+        if user:
+            return await self.for_user(int(user.group(1)), limit)
+        terms = words(query)
+        return await self.search(terms, limit) if terms else []
+
+
+class SQLiteTicketStore(TicketStore):
+    """Tickets in SQLite, searched through an FTS5 index of their text."""
+
+    def __init__(self, path: str, flush_interval: float = 0.05):
+        super().__init__(flush_interval)
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tickets')
+        self._conn = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open_db(self) -> None:
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        # seq orders the tickets and is the rowid the text index refers to
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS tickets (seq INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, '
+            'user_id INTEGER NOT NULL, text TEXT NOT NULL, order_id TEXT, status TEXT NOT NULL, '
+            'created_at REAL NOT NULL, closed_at REAL, closed_by INTEGER)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS tickets_user ON tickets (user_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status)')
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS tickets_text USING fts5(text, content='tickets', content_rowid='seq')"
+        )
+        conn.commit()
+        self._conn = conn
+
+    def _write(self, batch: list) -> None:
+        conn = self._conn
+        names = Ticket.__slots__
+        insert = f"INSERT INTO tickets ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+        with conn:
+            for ticket in batch:
+                seq = conn.execute(insert, [getattr(ticket, name) for name in names]).lastrowid
+                conn.execute('INSERT INTO tickets_text (rowid, text) VALUES (?, ?)', (seq, ticket.text))
+
+    def _select(self, where: str, args, limit: int = None) -> list:
+        sql = f"SELECT {', '.join('t.' + name for name in Ticket.__slots__)} FROM {where}"
+        rows = self._conn.execute(sql + (' LIMIT ?' if limit else ''), (*args, limit) if limit else args)
+        return [Ticket(*row) for row in rows]
+
+    def _close(self, ticket_id: str, closed_at: float, agent) -> bool:
+        with self._conn:
+            return self._conn.execute(
+                'UPDATE tickets SET status = ?, closed_at = ?, closed_by = ? WHERE id = ? AND status = ?',
+                (CLOSED, closed_at, agent, ticket_id, OPEN)
+            ).rowcount == 1
+
+    async def start(self) -> None:
+        await self._run(self._open_db)
+        await super().start()
+        logger.info("Ticket store opened at %s", self.path)
+
+    async def close(self) -> None:
+        await super().close()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    async def _store(self, batch: list) -> None:
+        await self._run(self._write, batch)
+
+    async def get(self, ticket_id: str):
+        await self.flush()
+        found = await self._run(self._select, 'tickets t WHERE t.id = ?', (ticket_id.upper(),))
+        return found[0] if found else None
+
+    async def for_user(self, user_id: int, limit: int = 10) -> list:
+        await self.flush()
+        return await self._run(self._select, 'tickets t WHERE t.user_id = ? ORDER BY t.seq DESC', (user_id,), limit)
+
+    async def recent(self, limit: int = 10) -> list:
+        await self.flush()
+        return await self._run(self._select, 'tickets t WHERE t.status = ? ORDER BY t.seq DESC', (OPEN,), limit)
+
+    async def search(self, terms, limit: int = 10) -> list:
+        await self.flush()
+        if not terms:
+            return []
+        # Quoted, so words are never read as FTS5 operators
+        match = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+        return await self._run(
+            self._select,
+            'tickets_text JOIN tickets t ON t.seq = tickets_text.rowid '
+            'WHERE tickets_text MATCH ? ORDER BY tickets_text.rowid DESC',
+            (match,), limit
+        )
+
+    async def close_ticket(self, ticket_id: str, agent: int = None):
+        await self.flush()
+        if not await self._run(self._close, ticket_id.upper(), time.time(), agent):
+            return None
+        return await self.get(ticket_id)
+
+
+def create_ticket_store(backend: str, path: str = 'grab.db') -> TicketStore:
+    """Build the ticket store for the storage backend named by ``backend``."""
+    if backend == 'memory':
+        return TicketStore()
+    if backend == 'sqlite':
+        return SQLiteTicketStore(path)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def export_jsonl(path: str, out, batch_size: int = 10_000) -> int:
+    """Write every ticket in the database at ``path`` to ``out`` as one JSON
+    object per line, oldest first, reading ``batch_size`` rows at a time.
+    Returns the number of tickets."""
+    conn = sqlite3.connect(path)
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(Ticket.__slots__)} FROM tickets ORDER BY seq")
+        count = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return count
+            out.write(''.join(json.dumps(dict(zip(Ticket.__slots__, row)), ensure_ascii=False) + '\n'
+                              for row in rows))
+            count += len(rows)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python tickets.py DATABASE_PATH > tickets.jsonl")
+    export_jsonl(sys.argv[1], sys.stdout)
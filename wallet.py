@@ -0,0 +1,155 @@
+"""GrabPay wallet ledger.
+
+Every balance change is an immutable ``Transaction`` appended to a log, with
+amounts in integer sen so sums are exact. ``Ledger`` keeps, per user, a
+cached balance (O(1) lookups however long the history) and an index of the
+user's transactions for paginated history. A transaction may carry an
+idempotency key, e.g. the callback query id of the button that caused it;
+recording the same key twice returns the first transaction instead of
+applying it again.
+
+Every ``snapshot_every`` transactions a user's balance is due for a
+snapshot, which the SQLite backend stores next to the log so that a balance
+is recovered from its latest snapshot plus the few transactions after it.
+"""
+import time
+from collections import OrderedDict
+
+# New wallets start with RM 50.00
+OPENING_BALANCE = 5000
+SNAPSHOT_EVERY = 100
+
+KIND_LABELS = {
+    'opening': 'Opening balance',
+    'topup': 'Top-up',
+    'ride': 'Ride booking',
+    'food': 'Food order',
+    'cashback': 'Promotion cashback',
+}
+
+
+def to_minor(amount) -> int:
+    """Convert ringgit to sen."""
+    return round(amount * 100)
+
+
+def format_amount(minor: int, sign: bool = False) -> str:
+    """Format sen as ringgit, e.g. ``RM 12.50``; with ``sign``, ``+RM 12.50``."""
+    prefix = '-' if minor < 0 else '+' if sign and minor > 0 else ''
+    minor = abs(minor)
+    return f"{prefix}RM {minor // 100}.{minor % 100:02d}"
+
+
+class Transaction:
+    """One ledger entry. ``amount`` is in sen, negative for payments."""
+
+    __slots__ = ('seq', 'user_id', 'kind', 'amount', 'created_at', 'key')
+
+    def __init__(self, seq: int, user_id: int, kind: str, amount: int, created_at: float = None, key: str = None):
+        self.seq = seq
+        self.user_id = user_id
+        self.kind = kind
+        self.amount = amount
+        self.created_at = time.time() if created_at is None else created_at
+        self.key = key
+
+    def describe(self) -> str:
+        """One-line summary for the wallet screens."""
+        when = time.strftime('%d %b %H:%M', time.localtime(self.created_at))
+        label = KIND_LABELS.get(self.kind, self.kind.title())
+        return f"{when} · {label} {format_amount(self.amount, sign=True)}"
+
+    def __repr__(self) -> str:
+        return f"Transaction({self.seq}, user={self.user_id}, {self.kind}, {self.amount})"
+
+
+class Ledger:
+    """Balances, per-user transaction index and idempotency keys.
+
+    With ``keep_history=False`` only balances are kept in memory and the
+    history lives in the storage backend.
+    """
+
+    def __init__(self, keep_history: bool = True, snapshot_every: int = SNAPSHOT_EVERY,
+                 key_cache_size: int = 100_000):
+        self.keep_history = keep_history
+        self.snapshot_every = snapshot_every
+        self.key_cache_size = key_cache_size
+        self.seq = 0
+        self._balances = {}
+        # user_id -> transactions, oldest first
+        self._history = {}
+        # user_id -> transactions recorded since the last snapshot
+        self._since_snapshot = {}
+        self._last_seq = {}
+        # idempotency key -> transaction, most recent last
+        self._keys = OrderedDict()
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._balances
+
+    def __iter__(self):
+        return iter(self._balances)
+
+    def balance(self, user_id):
+        """Return the user's balance in sen, or None for an unknown wallet."""
+        return self._balances.get(user_id)
+
+    def restore(self, user_id, balance: int, since_snapshot: int = 0) -> None:
+        """Load a balance read back from storage."""
+        self._balances[user_id] = balance
+        self._since_snapshot[user_id] = since_snapshot
+
+    def forget(self, user_id) -> None:
+        """Drop the user's wallet from memory; it is read back from storage when next used."""
+        for index in (self._balances, self._history, self._since_snapshot, self._last_seq):
+            index.pop(user_id, None)
+
+    def find(self, key: str):
+        """Return the transaction recorded with ``key``, if still remembered."""
+        return self._keys.get(key)
+
+    def record(self, user_id, kind: str, amount: int, key: str = None, now: float = None):
+        """Append a transaction. Returns ``(transaction, created)``; ``created``
+        is False if ``key`` was already recorded."""
+        if key is not None:
+            existing = self._keys.get(key)
+            if existing is not None:
+                return existing, False
+        self.seq += 1
+        tx = Transaction(self.seq, user_id, kind, amount, now, key)
+        self._balances[user_id] = self._balances.get(user_id, 0) + amount
+        self._last_seq[user_id] = tx.seq
+        self._since_snapshot[user_id] = self._since_snapshot.get(user_id, 0) + 1
+        if self.keep_history:
+            self._history.setdefault(user_id, []).append(tx)
+        if key is not None:
+            self._keys[key] = tx
+            if len(self._keys) > self.key_cache_size:
+                self._keys.popitem(last=False)
+        return tx, True
+
+    def history(self, user_id, offset: int = 0, limit: int = 10):
+        """Return up to ``limit`` transactions, newest first, skipping ``offset``."""
+        entries = self._history.get(user_id, ())
+        end = len(entries) - offset
+        if end <= 0:
+            return []
+        return entries[max(0, end - limit):end][::-1]
+
+    def due_snapshots(self):
+        """Return ``(user_id, balance, count)`` for wallets due a snapshot,
+        ``count`` being the transactions since the last one. Call
+        ``snapshots_saved`` once they are stored."""
+        return [
+            (user_id, self._balances[user_id], count)
+            for user_id, count in self._since_snapshot.items()
+            if count >= self.snapshot_every and user_id in self._last_seq
+        ]
+
+    def snapshots_saved(self, snapshots) -> None:
+        """Count the wallets in ``snapshots`` (from ``due_snapshots``) from
+        their snapshot again, keeping the transactions recorded since."""
+        for user_id, _, count in snapshots:
+            if user_id in self._since_snapshot:
+                self._since_snapshot[user_id] -= count
@@ -0,0 +1,187 @@
+"""Webhook serving mode.
+
+A small asyncio HTTP/1.1 server that receives updates from Telegram and puts
+them straight onto the application's update queue. It checks the
+``X-Telegram-Bot-Api-Secret-Token`` header, rejects oversized bodies and keeps
+connections alive between requests.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from http import HTTPStatus
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Request line and headers must fit in this many bytes
+MAX_HEADER_SIZE = 16 * 1024
+
+
+class HTTPError(Exception):
+    """Raised while reading a request that cannot be served."""
+
+    def __init__(self, status: HTTPStatus):
+        super().__init__(status.phrase)
+        self.status = status
+
+
+async def read_request(reader: asyncio.StreamReader, max_body_size: int):
+    """Read one HTTP/1.x request. Returns (method, path, headers, body, keep_alive).
+
+    Raises ``asyncio.IncompleteReadError`` when the client closed the
+    connection and ``HTTPError`` for requests that must be rejected.
+    """
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.LimitOverrunError:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, path, version = lines[0].split(' ', 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST)
+
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+        keep_alive = connection != 'close'
+    else:
+        keep_alive = connection == 'keep-alive'
+
+    if 'transfer-encoding' in headers:
+        raise HTTPError(HTTPStatus.LENGTH_REQUIRED)
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST)
+    if length < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST)
+    if length > max_body_size:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    body = await reader.readexactly(length) if length else b''
+    return method, path.split('?', 1)[0], headers, body, keep_alive
+
+
+def write_response(writer: asyncio.StreamWriter, status: HTTPStatus, body: bytes = b'',
+                   keep_alive: bool = True, content_type: str = 'application/json') -> None:
+    """Write an HTTP/1.1 response with a fixed Content-Length."""
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+
+
+class WebhookServer:
+    """Serve Telegram webhook requests for ``application``."""
+
+    def __init__(self, application, listen: str = '0.0.0.0', port: int = 8443,
+                 url_path: str = '/telegram', secret_token: str = None,
+                 max_body_size: int = 1024 * 1024, keepalive_timeout: float = 75.0):
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.url_path = url_path
+        self.secret_token = secret_token
+        self.max_body_size = max_body_size
+        self.keepalive_timeout = keepalive_timeout
+        self._server = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.listen, self.port, limit=MAX_HEADER_SIZE
+        )
+        logger.info("Webhook server listening on %s:%s%s", self.listen, self.port, self.url_path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader, writer) -> None:
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(
+                        read_request(reader, self.max_body_size), self.keepalive_timeout
+                    )
+                except HTTPError as e:
+                    write_response(writer, e.status, keep_alive=False)
+                    await writer.drain()
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                method, path, headers, body, keep_alive = request
+                status = await self._handle_request(method, path, headers, body)
+                write_response(writer, status, keep_alive=keep_alive)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, method, path, headers, body) -> HTTPStatus:
+        if path != self.url_path:
+            return HTTPStatus.NOT_FOUND
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED
+        if self.secret_token is not None:
+            token = headers.get('x-telegram-bot-api-secret-token', '')
+            if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+                return HTTPStatus.FORBIDDEN
+        return await self.handle_update(body)
+
+    async def handle_update(self, body: bytes) -> HTTPStatus:
+        """Queue the update in ``body`` for the application."""
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError):
+            logger.warning("Received malformed webhook update")
+            return HTTPStatus.BAD_REQUEST
+        await self.application.update_queue.put(update)
+        return HTTPStatus.OK
+
+
+async def run_webhook(application, server: WebhookServer, webhook_url: str, **set_webhook_kwargs) -> None:
+    """Run ``application`` behind ``server`` until SIGINT/SIGTERM.
+
+    Mirrors the startup and shutdown sequence of ``Application.run_polling``,
+    including the ``post_init``, ``post_stop`` and ``post_shutdown`` callbacks.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        await application.bot.set_webhook(
+            url=webhook_url, secret_token=server.secret_token, **set_webhook_kwargs
+        )
+        try:
+            await stop.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)